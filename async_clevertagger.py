@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# asyncio interface to clevertagger (Python >= 3.7)
+#
+# usage example:
+#
+#    import asyncio
+#    from async_clevertagger import AsyncClevertagger
+#
+#    async def main():
+#        async with AsyncClevertagger() as tagger:
+#            for sentence in await tagger.tag(['Das ist ein Test .', 'Das auch .']):
+#                print(sentence + '\n')
+#
+#    asyncio.run(main())
+
+import os
+import pty
+import tty
+import asyncio
+
+import extract_features
+import crf
+from clevertagger import decode, format_output, root_directory, CRF_MODEL
+from config import CRF_BACKEND, CRF_BACKEND_EXEC, SMOR_ENCODING
+
+
+class AsyncClevertagger(object):
+    """Persistent tagger for use with asyncio. Talks to the SMOR daemon with asyncio streams,
+    and to the CRF tool through asyncio subprocess pipes, so tagging never blocks the event loop.
+
+    Concurrent calls to tag() are coalesced: a single worker collects all pending sentences into a batch
+    (up to max_batch sentences), sends all new words of the batch to SMOR in one request,
+    and tags identical sentences only once.
+    """
+
+    def __init__(self, backend=CRF_BACKEND, model=CRF_MODEL, max_batch=1000):
+
+        if backend not in ('wapiti', 'python'):
+            raise ValueError('unsupported value \'{0}\' for option \'CRF_BACKEND\''.format(backend))
+
+        self.backend = backend
+        self.model = model
+        self.max_batch = max_batch
+
+        self.smor = None
+        self.tagger = None
+        self._queue = None
+        self._worker = None
+        # futures of the batch that the worker is tagging
+        self._in_flight = []
+
+
+    async def start(self):
+        """start SMOR daemon, CRF tool, and batching worker"""
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            # startup of the SMOR daemon and loading of the model are blocking; keep them off the event loop
+            self.smor = await loop.run_in_executor(None, extract_features.SMORAnalyzer)
+
+            if self.backend == 'python':
+                self.tagger = await loop.run_in_executor(None, crf.CRFModel, self.model)
+            else:
+                # Wapiti only flushes its output on a terminal, so its stdout is connected to a pty
+                master, slave = pty.openpty()
+                tty.setraw(slave)
+                try:
+                    self.tagger = await asyncio.create_subprocess_exec(CRF_BACKEND_EXEC, 'label', '-m', self.model, '-l',
+                                                                       stdin=asyncio.subprocess.PIPE, stdout=slave,
+                                                                       stderr=asyncio.subprocess.DEVNULL, cwd=root_directory)
+                except BaseException:
+                    os.close(master)
+                    raise
+                finally:
+                    os.close(slave)
+                self._tagger_out = asyncio.StreamReader()
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(self._tagger_out), os.fdopen(master, 'rb', 0))
+        except BaseException:
+            # __aexit__ is not called if startup fails; do not leave the SMOR daemon running
+            await self.close()
+            raise
+
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._work())
+
+        return self
+
+
+    async def tag(self, text, nbestsents=1, nbesttags=1):
+        """tag some text. Input must be list of tokenized sentences. Options as for Clevertagger.tag()."""
+
+        if nbesttags > 1 and nbestsents > 1:
+            raise ValueError('nbesttags and nbestsents are mutually exclusive')
+        if (nbesttags > 1 or nbestsents > 1) and self.backend != 'python':
+            raise ValueError('n-best tagging is only supported by the in-process decoder (backend=\'python\')')
+        if self._queue is None:
+            raise RuntimeError('AsyncClevertagger is not running; call start() first (or use \'async with\')')
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for sentence in text:
+            words = tuple(sentence.split())
+            if not words:
+                continue
+            future = loop.create_future()
+            self._queue.put_nowait((words, (nbestsents, nbesttags), future))
+            futures.append(future)
+
+        return list(await asyncio.gather(*futures))
+
+
+    async def close(self):
+        """stop worker, CRF tool and SMOR daemon. Pending calls of tag() raise RuntimeError."""
+
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.wait([self._worker])
+            self._worker = None
+        if self._queue is not None:
+            futures = self._in_flight
+            while not self._queue.empty():
+                futures.append(self._queue.get_nowait()[2])
+            error = RuntimeError('AsyncClevertagger was closed')
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            self._in_flight = []
+            self._queue = None
+        if self.backend == 'wapiti' and self.tagger is not None:
+            self.tagger.stdin.close()
+            self.tagger.terminate()
+            await self.tagger.wait()
+        if self.smor is not None:
+            self.smor.terminate()
+            self.smor = None
+
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+    async def _work(self):
+        """collect pending sentences into batches and tag them"""
+
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # identical sentences (with identical options) are only tagged once
+            pending = {}
+            for words, options, future in batch:
+                if not future.cancelled():
+                    pending.setdefault((words, options), []).append(future)
+            self._in_flight = [future for futures in pending.values() for future in futures]
+
+            try:
+                results = await self._tag_batch(list(pending))
+            except Exception as e:
+                for futures in pending.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                self._in_flight = []
+                continue
+
+            for key, result in zip(pending, results):
+                for future in pending[key]:
+                    if not future.done():
+                        future.set_result(result)
+            self._in_flight = []
+
+
+    async def _tag_batch(self, items):
+        """tag list of (words, options) items"""
+
+        todo = self.smor.new_words(word for words, options in items for word in words)
+        if todo:
+            self.smor.convert(await self._smor_client(todo))
+
+        if self.backend == 'python':
+            def decode_batch():
+                return [format_output(words, decode(self.tagger, [self.smor.feature_columns(word) for word in words], *options), *options)
+                        for words, options in items]
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, decode_batch)
+
+        preprocessed = [''.join(self.smor.create_features(word) for word in words) for words, options in items]
+        tags = await self._wapiti(preprocessed)
+        return [format_output(words, sentence_tags) for (words, options), sentence_tags in zip(items, tags)]
+
+
+    async def _smor_client(self, words):
+        """asyncio version of SMORAnalyzer.client()"""
+
+        reader, writer = await asyncio.open_connection('localhost', self.smor.PORT)
+        writer.write('\n'.join(words).encode(SMOR_ENCODING))
+        await writer.drain()
+        writer.write_eof()
+        analyses = await reader.read()
+        writer.close()
+        return analyses
+
+
+    async def _wapiti(self, sentences):
+        """send sentences to Wapiti and read the output concurrently, so neither side blocks on a full pipe.
+        Returns list of tags for each sentence (Wapiti only outputs labels)."""
+
+        async def send():
+            for sentence in sentences:
+                self.tagger.stdin.write((sentence + '\n').encode('UTF-8'))
+                await self.tagger.stdin.drain()
+
+        async def receive():
+            tags = []
+            for sentence in sentences:
+                sentence_tags = []
+                while True:
+                    line = await self._tagger_out.readline()
+                    if not line:
+                        raise RuntimeError('{0} terminated unexpectedly'.format(CRF_BACKEND_EXEC))
+                    line = line.decode('UTF-8').strip()
+                    if not line:
+                        break
+                    sentence_tags.append(line)
+                tags.append(sentence_tags)
+            return tags
+
+        sent, received = await asyncio.gather(send(), receive())
+        return received
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Compare CPU time of text and bytes-native feature extraction and postprocessing (extract_features.py, postprocess.py)
+# on the synthetic corpus of corpus.py. SMOR is not needed: the lexicon is filled with the tags of the corpus' canned analyses.
+#
+# usage: python benchmarks/bytes_pipeline.py [TOKENS]
+
+from __future__ import unicode_literals, print_function, division
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract_features
+import postprocess
+import corpus
+
+
+def canned_tags(data):
+    """dict word -> set of POS tags for all words of corpus.Corpus data, converted from its SMOR analyses like SMORAnalyzer does"""
+    morph = extract_features.SMORAnalyzer(port=0)
+    morph.convert(''.join(data.smor_output()).encode('UTF-8'))
+    return dict((word, morph.posset[word]) for word in data.analyses)
+
+
+def synthetic_corpus(n_tokens):
+    """UTF-8 input lines of the synthetic corpus (one token per line, empty line after each sentence) and canned analyses"""
+    data = corpus.generate(n_tokens)
+    return [line.encode('UTF-8') for line in data.tokenized()], canned_tags(data)
+
+
+def analyzer(analyses):
+    morph = extract_features.MorphAnalyzer()
+    for word, tags in analyses.items():
+        morph.posset[word] = tags
+    return morph
+
+
+def cpu_time(function):
+    start = time.process_time() if hasattr(time, 'process_time') else time.clock()
+    result = function()
+    return (time.process_time() if hasattr(time, 'process_time') else time.clock()) - start, result
+
+
+def main(n_tokens):
+
+    lines, analyses = synthetic_corpus(n_tokens)
+
+    morph = analyzer(analyses)
+    text_time, text_features = cpu_time(lambda: ''.join(morph.create_features(line.decode('UTF-8')) for line in lines).encode('UTF-8'))
+
+    morph = analyzer(analyses)
+    bytes_time, bytes_features = cpu_time(lambda: b''.join(morph.create_features_bytes(line) for line in lines))
+
+    assert text_features == bytes_features
+
+    # CRF output: feature columns and tag
+    crf_output = [line[:-1] + b'\tNN\n' if line.strip() else line for line in bytes_features.splitlines(True)]
+    text_post_time, text_output = cpu_time(lambda: '\n'.join(postprocess.postprocess((line.decode('UTF-8') for line in crf_output), 1)).encode('UTF-8'))
+    bytes_post_time, bytes_output = cpu_time(lambda: b'\n'.join(postprocess.postprocess_bytes(crf_output, 1)))
+
+    assert text_output == bytes_output
+
+    print('stage\ttext (s)\tbytes (s)\tspeedup')
+    print('create_features\t{0:.3f}\t{1:.3f}\t{2:.2f}x'.format(text_time, bytes_time, text_time/bytes_time))
+    print('postprocess\t{0:.3f}\t{1:.3f}\t{2:.2f}x'.format(text_post_time, bytes_post_time, text_post_time/bytes_post_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
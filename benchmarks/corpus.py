@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Deterministic synthetic German-like corpus for the benchmark suite (suite.py): sentences built from simple phrase
+# patterns (noun phrases, prepositional phrases, modal and auxiliary constructions, subordinate clauses) with gold STTS tags,
+# and for each word type the analyses that SMOR would give (lines like 'Haus<+NN><Neut><Nom><Sg>'), which are served by
+# the stand-in daemon fake_smor.py. Open-class words are made from German syllables (with umlauts and ß) and have
+# Zipf-like frequencies; some words are ambiguous (e.g. infinitive/finite verb), and some are unknown to the analyzer.
+# The same seed always gives the same corpus.
+#
+# usage: python benchmarks/corpus.py [TOKENS] > FILE   (writes the gold standard: one token and its tag per line)
+
+from __future__ import unicode_literals, print_function, division
+import io
+import sys
+import random
+
+ONSETS = ['b', 'br', 'd', 'f', 'fl', 'g', 'gr', 'h', 'k', 'kl', 'l', 'm', 'n', 'p', 'pf', 'r', 's', 'sch', 'schw', 'sp', 'st',
+          'str', 't', 'tr', 'w', 'z', 'zw']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ä', 'ö', 'ü', 'ei', 'au', 'eu', 'ie']
+CODAS = ['', '', 'b', 'ch', 'd', 'f', 'g', 'k', 'l', 'm', 'n', 'nd', 'ng', 'r', 'rt', 's', 'ß', 'sch', 'st', 't', 'tz']
+
+# closed classes: word, gold tag and SMOR analyses
+CLOSED = {
+    'ART': [('der', ['die<+ART><Def><Masc><Nom><Sg>', 'die<+ART><Def><Fem><Dat><Sg>']), ('die', ['die<+ART><Def><Fem><Nom><Sg>']),
+            ('das', ['die<+ART><Def><Neut><Nom><Sg>', 'die<+REL><subst><Neut><Nom><Sg>']), ('den', ['die<+ART><Def><Masc><Acc><Sg>']),
+            ('dem', ['die<+ART><Def><Masc><Dat><Sg>']), ('des', ['die<+ART><Def><Masc><Gen><Sg>']),
+            ('ein', ['eine<+ART><Indef><Masc><Nom><Sg>']), ('eine', ['eine<+ART><Indef><Fem><Nom><Sg>']),
+            ('einen', ['eine<+ART><Indef><Masc><Acc><Sg>']), ('einem', ['eine<+ART><Indef><Masc><Dat><Sg>'])],
+    'APPR': [('in', ['in<+PREP><Dat>']), ('mit', ['mit<+PREP><Dat>', 'mit<+VPART>']), ('auf', ['auf<+PREP><Acc>', 'auf<+VPART>']),
+             ('für', ['für<+PREP><Acc>']), ('von', ['von<+PREP><Dat>']), ('nach', ['nach<+PREP><Dat>']), ('bei', ['bei<+PREP><Dat>']),
+             ('über', ['über<+PREP><Acc>']), ('unter', ['unter<+PREP><Dat>'])],
+    'APPRART': [('im', ['in<+PREP/ART><Neut><Dat><Sg>']), ('zum', ['zu<+PREP/ART><Neut><Dat><Sg>']),
+                ('zur', ['zu<+PREP/ART><Fem><Dat><Sg>']), ('vom', ['von<+PREP/ART><Neut><Dat><Sg>']), ('am', ['an<+PREP/ART><Neut><Dat><Sg>'])],
+    'KON': [('und', ['und<+KONJ><Kon>']), ('oder', ['oder<+KONJ><Kon>']), ('aber', ['aber<+KONJ><Kon>', 'aber<+ADV>'])],
+    'KOUS': [('dass', ['dass<+KONJ><Sub>']), ('weil', ['weil<+KONJ><Sub>']), ('wenn', ['wenn<+KONJ><Sub>']), ('ob', ['ob<+KONJ><Sub>'])],
+    'PPER': [('er', ['er<+PPRO><Pers><3><Sg><Masc><Nom>']), ('sie', ['sie<+PPRO><Pers><3><Sg><Fem><Nom>', 'sie<+PPRO><Pers><3><Pl><NoGend><Nom>']),
+             ('es', ['es<+PPRO><Pers><3><Sg><Neut><Nom>']), ('wir', ['wir<+PPRO><Pers><1><Pl><NoGend><Nom>']),
+             ('ich', ['ich<+PPRO><Pers><1><Sg><NoGend><Nom>'])],
+    'VAFIN': [('ist', ['sein<+V><3><Sg><Pres><Ind>']), ('sind', ['sein<+V><3><Pl><Pres><Ind>']), ('war', ['sein<+V><3><Sg><Past><Ind>']),
+              ('hat', ['haben<+V><3><Sg><Pres><Ind>']), ('wird', ['werden<+V><3><Sg><Pres><Ind>'])],
+    'VMFIN': [('kann', ['können<+V><3><Sg><Pres><Ind>']), ('muss', ['müssen<+V><3><Sg><Pres><Ind>']), ('will', ['wollen<+V><3><Sg><Pres><Ind>']),
+              ('soll', ['sollen<+V><3><Sg><Pres><Ind>'])],
+    'ADV': [('auch', ['auch<+ADV>']), ('nur', ['nur<+ADV>']), ('noch', ['noch<+ADV>']), ('sehr', ['sehr<+ADV>']), ('heute', ['heute<+ADV>']),
+            ('dort', ['dort<+ADV>']), ('z.B.', ['z.B.<+ADV>'])],
+    'PTKNEG': [('nicht', ['nicht<+PTCL><Neg>'])],
+    'CARD': [('zwei', ['zwei<+CARD>']), ('drei', ['drei<+CARD>']), ('1990', []), ('12', []), ('2014', [])],
+}
+
+PUNCTUATION = {'.': ['.<+PUNCT><Norm>'], '?': ['?<+PUNCT><Norm>'], '!': ['!<+PUNCT><Norm>'], ',': [',<+PUNCT><Comma>'],
+               '"': ['"<+PUNCT><Left>', '"<+PUNCT><Right>']}
+
+# suffixes of open-class words
+NOUN_SUFFIXES = ['ung', 'heit', 'keit', 'schaft', 'er', 'chen', 'e', '', '', 'ling']
+NAME_SUFFIXES = ['mann', 'er', 'berg', 'ingen', 'hausen', '', 'i']
+ADJECTIVE_SUFFIXES = ['ig', 'lich', 'isch', 'sam', '']
+ADJECTIVE_ENDINGS = ['e', 'en', 'er', 'es', 'em']
+
+
+class Corpus(object):
+    """sentences (lists of (word, tag) pairs) and analyses (dict word -> list of SMOR analyses; empty for unknown words)"""
+
+    def __init__(self, sentences, analyses):
+        self.sentences = sentences
+        self.analyses = analyses
+
+    @property
+    def n_tokens(self):
+        return sum(len(sentence) for sentence in self.sentences)
+
+    def tokenized(self):
+        """text lines of clevertagger input: one token per line, empty line after each sentence"""
+        for sentence in self.sentences:
+            for word, tag in sentence:
+                yield word + '\n'
+            yield '\n'
+
+    def gold(self):
+        """text lines of gold standard (format of sample_training_file.txt)"""
+        for sentence in self.sentences:
+            for word, tag in sentence:
+                yield '{0}\t{1}\n'.format(word, tag)
+            yield '\n'
+
+    def raw(self, rng, width=80):
+        """text lines of running text (for the sentence splitter): detokenized sentences, wrapped at width characters,
+        and an empty line after paragraphs of 3-15 sentences"""
+        words = []
+        n_sentences = 0
+        paragraph_length = rng.randint(3, 15)
+        for i, sentence in enumerate(self.sentences):
+            words.extend(detokenize([word for word, tag in sentence]))
+            n_sentences += 1
+            if n_sentences >= paragraph_length or i == len(self.sentences) - 1:
+                line = ''
+                for word in words:
+                    if line and len(line) + len(word) >= width:
+                        yield line + '\n'
+                        line = ''
+                    line += (' ' if line else '') + word
+                yield line + '\n\n'
+                words = []
+                n_sentences = 0
+                paragraph_length = rng.randint(3, 15)
+
+    def smor_output(self):
+        """output of fst-infl2-daemon for all word types, in order of first occurrence ('> word', then analyses or 'no result for word')"""
+        seen = set()
+        for sentence in self.sentences:
+            for word, tag in sentence:
+                if word not in seen:
+                    seen.add(word)
+                    yield '> {0}\n'.format(word)
+                    for analysis in self.analyses[word]:
+                        yield analysis + '\n'
+                    if not self.analyses[word]:
+                        yield 'no result for {0}\n'.format(word)
+
+
+def detokenize(words):
+    """words of sentence with punctuation attached to the preceding (or, for opening quotes, the following) word"""
+    result = []
+    quote_open = False
+    attach = False
+    for word in words:
+        if word in ('.', ',', '?', '!') and result:
+            result[-1] += word
+        elif word == '"' and quote_open and result:
+            result[-1] += word
+            quote_open = False
+        elif word == '"':
+            quote_open = True
+            attach = True
+            result.append(word)
+            continue
+        elif attach:
+            result[-1] += word
+        else:
+            result.append(word)
+        attach = False
+    return result
+
+
+class Generator(object):
+
+    def __init__(self, vocabulary=20000, seed=1):
+        self.rng = random.Random(seed)
+        self.analyses = {}
+        for tag, entries in sorted(CLOSED.items()):
+            for word, analyses in entries:
+                self.analyses[word] = analyses
+        for word, analyses in PUNCTUATION.items():
+            self.analyses[word] = analyses
+        # open-class words by tag, most frequent first
+        self.open = {}
+        self.open['NN'] = self.make_words(vocabulary, self.noun)
+        self.open['NE'] = self.make_words(vocabulary//4, self.name)
+        self.open['ADJA'] = self.make_words(vocabulary//3, self.adjective)
+        self.open['ADJD'] = self.make_words(vocabulary//6, self.adverbial_adjective)
+        self.open['VVFIN'] = self.make_words(vocabulary//3, self.finite_verb)
+        self.open['VVINF'] = self.make_words(vocabulary//4, self.infinitive)
+        self.open['VVPP'] = self.make_words(vocabulary//4, self.participle)
+
+    def stem(self, syllables=None):
+        rng = self.rng
+        if syllables is None:
+            syllables = rng.choice([1, 1, 2, 2, 2, 3])
+        return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for i in range(syllables))
+
+    def make_words(self, n, make):
+        """list of n distinct words made by make() (which adds their analyses); about 5% of them are unknown to SMOR"""
+        words = []
+        while len(words) < n:
+            word, analyses = make()
+            if word in self.analyses or word.lower() in self.analyses or len(word) < 2:
+                continue
+            self.analyses[word] = analyses if self.rng.random() > 0.05 else []
+            words.append(word)
+        return words
+
+    def noun(self):
+        stem = self.stem()
+        if self.rng.random() < 0.2:
+            # compound
+            stem += self.stem(1)
+        word = (stem + self.rng.choice(NOUN_SUFFIXES)).capitalize()
+        analyses = ['{0}<+NN><{1}><Nom><Sg>'.format(word, self.rng.choice(['Masc', 'Fem', 'Neut']))]
+        if self.rng.random() < 0.1:
+            analyses.append('{0}<+NPROP><Masc><Nom><Sg>'.format(word))
+        return word, analyses
+
+    def name(self):
+        word = (self.stem(self.rng.choice([1, 2])) + self.rng.choice(NAME_SUFFIXES)).capitalize()
+        # many names are not in the lexicon of the analyzer
+        if self.rng.random() < 0.4:
+            return word, []
+        return word, ['{0}<+NPROP><Masc><Nom><Sg>'.format(word)]
+
+    def adjective(self):
+        lemma = self.stem(self.rng.choice([1, 2])) + self.rng.choice(ADJECTIVE_SUFFIXES)
+        word = lemma + self.rng.choice(ADJECTIVE_ENDINGS)
+        return word, ['{0}<+ADJ><Pos><Fem><Nom><Sg><Wk>'.format(lemma), '{0}<+ADJ><Pos><Masc><Nom><Sg><St>'.format(lemma)]
+
+    def adverbial_adjective(self):
+        lemma = self.stem(self.rng.choice([1, 2])) + self.rng.choice(['ig', 'lich', 'isch'])
+        return lemma, ['{0}<+ADJ><Pos><Pred>'.format(lemma), '{0}<+ADJ><Pos><Adv>'.format(lemma)]
+
+    def finite_verb(self):
+        stem = self.stem(self.rng.choice([1, 1, 2]))
+        ending = self.rng.choice(['t', 'en', 'te'])
+        person = {'t': '<3><Sg><Pres><Ind>', 'en': '<3><Pl><Pres><Ind>', 'te': '<3><Sg><Past><Ind>'}[ending]
+        analyses = ['{0}en<+V>{1}'.format(stem, person)]
+        if ending == 'en':
+            analyses.append('{0}en<+V><Inf>'.format(stem))
+        return stem + ending, analyses
+
+    def infinitive(self):
+        stem = self.stem(self.rng.choice([1, 1, 2]))
+        return stem + 'en', ['{0}en<+V><Inf>'.format(stem), '{0}en<+V><1><Pl><Pres><Ind>'.format(stem)]
+
+    def participle(self):
+        stem = self.stem(1)
+        return 'ge' + stem + 't', ['{0}en<+V><PPast>'.format(stem)]
+
+    def closed(self, tag):
+        return self.rng.choice(CLOSED[tag])[0]
+
+    def open_word(self, tag):
+        """open-class word with Zipf-like frequency (half of the occurrences are of the 30 most frequent words)"""
+        words = self.open[tag]
+        return words[int(30*(self.rng.paretovariate(1.0) - 1)) % len(words)]
+
+    def noun_phrase(self):
+        rng = self.rng
+        r = rng.random()
+        if r < 0.15:
+            return [(self.closed('PPER'), 'PPER')]
+        if r < 0.25:
+            return [(self.open_word('NE'), 'NE')]
+        phrase = [(self.closed('ART'), 'ART')]
+        if rng.random() < 0.1:
+            phrase = [(self.closed('CARD'), 'CARD')]
+        while rng.random() < 0.35:
+            phrase.append((self.open_word('ADJA'), 'ADJA'))
+        phrase.append((self.open_word('NN'), 'NN'))
+        if rng.random() < 0.1:
+            phrase.append((self.open_word('NE'), 'NE'))
+        return phrase
+
+    def prepositional_phrase(self):
+        if self.rng.random() < 0.3:
+            phrase = [(self.closed('APPRART'), 'APPRART')]
+            if self.rng.random() < 0.3:
+                phrase.append((self.open_word('ADJA'), 'ADJA'))
+            return phrase + [(self.open_word('NN'), 'NN')]
+        return [(self.closed('APPR'), 'APPR')] + self.noun_phrase()
+
+    def adverbs(self):
+        words = []
+        if self.rng.random() < 0.3:
+            words.append((self.closed('ADV'), 'ADV'))
+        if self.rng.random() < 0.15:
+            words.append(('nicht', 'PTKNEG'))
+        if self.rng.random() < 0.15:
+            words.append((self.open_word('ADJD'), 'ADJD'))
+        return words
+
+    def clause(self):
+        rng = self.rng
+        r = rng.random()
+        subject = self.noun_phrase()
+        middle = self.adverbs()
+        if rng.random() < 0.5:
+            middle += self.noun_phrase()
+        if rng.random() < 0.5:
+            middle += self.prepositional_phrase()
+        if r < 0.5:
+            return subject + [(self.open_word('VVFIN'), 'VVFIN')] + middle
+        if r < 0.75:
+            return subject + [(self.closed('VMFIN'), 'VMFIN')] + middle + [(self.open_word('VVINF'), 'VVINF')]
+        return subject + [(self.closed('VAFIN'), 'VAFIN')] + middle + [(self.open_word('VVPP'), 'VVPP')]
+
+    def subordinate_clause(self):
+        return [(self.closed('KOUS'), 'KOUS')] + self.noun_phrase() + self.adverbs() + self.prepositional_phrase() + [(self.open_word('VVFIN'), 'VVFIN')]
+
+    def sentence(self):
+        rng = self.rng
+        sentence = self.clause()
+        r = rng.random()
+        if r < 0.15:
+            sentence += [(',', '$,')] + self.subordinate_clause()
+        elif r < 0.25:
+            sentence += [(',', '$,'), (self.closed('KON'), 'KON')] + self.clause()
+        if rng.random() < 0.05:
+            sentence = [('"', '$(')] + sentence + [('"', '$(')]
+        sentence.append(rng.choice([('.', '$.')]*8 + [('?', '$.'), ('!', '$.')]))
+
+        # sentence-initial words are capitalized; SMOR marks their analyses with <CAP>
+        word, tag = sentence[0]
+        if word[0].islower():
+            capitalized = word[0].upper() + word[1:]
+            if capitalized not in self.analyses:
+                self.analyses[capitalized] = ['<CAP>' + analysis for analysis in self.analyses[word]]
+            sentence[0] = (capitalized, tag)
+        return sentence
+
+
+def generate(n_tokens, vocabulary=20000, seed=1):
+    """Corpus with at least n_tokens tokens"""
+    generator = Generator(vocabulary, seed)
+    sentences = []
+    n = 0
+    while n < n_tokens:
+        sentence = generator.sentence()
+        sentences.append(sentence)
+        n += len(sentence)
+    return Corpus(sentences, generator.analyses)
+
+
+def write_lines(path, lines):
+    with io.open(path, 'w', encoding='UTF-8') as fobj:
+        fobj.writelines(lines)
+
+
+def write_analyses(path, analyses):
+    """analyses in the format of the 'model' of fake_smor.py: word, tab, analysis (one line per analysis; an unknown word has none)"""
+    with io.open(path, 'w', encoding='UTF-8') as fobj:
+        for word in sorted(analyses):
+            for analysis in analyses[word]:
+                fobj.write('{0}\t{1}\n'.format(word, analysis))
+
+
+if __name__ == '__main__':
+
+    if sys.version_info < (3, 0):
+        import codecs
+        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
+    corpus = generate(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+    sys.stdout.writelines(corpus.gold())
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Wall time of CRF training with crf_train.py (1, 2, 4, ... worker processes) and, if it is installed, wapiti train --nthread,
+# for a fixed number of iterations on the synthetic corpus of corpus.py with its gold tags (features created with canned analyses instead of SMOR).
+#
+# usage: python benchmarks/crf_train.py [TOKENS] [ITERATIONS] [MAX_THREADS]
+
+from __future__ import unicode_literals, print_function, division
+import os
+import io
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crf
+import crf_train
+import corpus
+from bytes_pipeline import canned_tags
+from io_buffers import CannedAnalyzer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def training_file(n_tokens, path, seed=1):
+    """write feature file of the synthetic corpus with gold tags"""
+
+    data = corpus.generate(n_tokens, seed=seed)
+    gold = ''.join(data.gold()).encode('UTF-8')
+    with io.open(path, 'wb') as fobj_out:
+        CannedAnalyzer(canned_tags(data)).main_bytes(io.BytesIO(gold), fobj_out)
+
+
+def accuracy(model_path, features_path):
+    model = crf.CRFModel(model_path)
+    with io.open(features_path, encoding='UTF-8') as fobj:
+        sequences = [[line.split() for line in lines] for lines in crf.read_sequences(fobj)]
+    correct, total, seconds = crf.evaluate(model, sequences)
+    return correct/total
+
+
+def main(n_tokens, iterations, max_threads):
+
+    directory = tempfile.mkdtemp()
+    try:
+        features = os.path.join(directory, 'features')
+        model = os.path.join(directory, 'model')
+        training_file(n_tokens, features)
+        patterns = crf_train.read_patterns(os.path.join(ROOT, 'crf_config'))
+
+        threads = [1]
+        while threads[-1]*2 <= max_threads:
+            threads.append(threads[-1]*2)
+
+        results = []
+        for n in threads:
+            start = time.time()
+            optimizer = crf_train.train([features], patterns, model, nthread=n, maxiter=iterations)
+            results.append(('crf_train.py', n, time.time() - start, optimizer.iteration, accuracy(model, features)))
+
+        wapiti = shutil.which('wapiti') if hasattr(shutil, 'which') else None
+        for n in threads if wapiti else []:
+            start = time.time()
+            subprocess.check_call([wapiti, 'train', '-p', os.path.join(ROOT, 'crf_config'), '--nthread', str(n), '--maxiter', str(iterations),
+                                   features, model])
+            results.append(('wapiti', n, time.time() - start, iterations, accuracy(model, features)))
+
+        print('trainer\tthreads\tseconds\titerations\ttraining accuracy')
+        for trainer, n, seconds, n_iterations, training_accuracy in results:
+            print('{0}\t{1}\t{2:.2f}\t{3}\t{4:.4f}'.format(trainer, n, seconds, n_iterations, training_accuracy))
+        if not wapiti:
+            print('(wapiti not found in PATH; no comparison)')
+
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+         int(sys.argv[3]) if len(sys.argv) > 3 else multiprocessing.cpu_count())
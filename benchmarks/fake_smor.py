@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Stand-in for fst-infl2-daemon (SFST) that serves canned analyses, for benchmarks without SMOR.
+# It is started like the real daemon (SFST_BIN PORT SMOR_MODEL), but the 'model' is a text file with one analysis per line
+# (word, tab, analysis; see corpus.write_analyses). It speaks the same protocol: after binding the port, it writes
+# 'listening to the socket ...' to stderr (or 'ERROR on binding' if the port is busy); each client sends words separated
+# by newlines and shuts down its side of the connection, and receives '> word' followed by the analyses of the word
+# (or 'no result for word') for each of them. Connections are served one after another, like in the real daemon.
+#
+# usage: python benchmarks/fake_smor.py PORT ANALYSES_FILE
+
+from __future__ import unicode_literals
+import io
+import sys
+import socket
+from collections import defaultdict
+
+
+def load(path):
+    """dict word -> list of analyses"""
+    analyses = defaultdict(list)
+    with io.open(path, encoding='UTF-8') as fobj:
+        for line in fobj:
+            word, analysis = line.rstrip('\n').split('\t', 1)
+            analyses[word].append(analysis)
+    return analyses
+
+
+def respond(analyses, request):
+    """response of the daemon to request (UTF-8 bytes)"""
+    lines = []
+    for word in request.decode('UTF-8').split('\n'):
+        if not word:
+            continue
+        lines.append('> ' + word)
+        if word in analyses:
+            lines.extend(analyses[word])
+        else:
+            lines.append('no result for ' + word)
+    return ('\n'.join(lines) + '\n').encode('UTF-8')
+
+
+def serve(port, analyses):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        server.bind(('localhost', port))
+    except socket.error:
+        sys.stderr.write('ERROR on binding')
+        sys.stderr.flush()
+        sys.exit(1)
+    server.listen(5)
+    sys.stderr.write('listening to the socket ...')
+    sys.stderr.flush()
+
+    while True:
+        connection, address = server.accept()
+        chunks = []
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+        connection.sendall(respond(analyses, b''.join(chunks)))
+        connection.close()
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) != 3:
+        sys.stderr.write('usage: {0} PORT ANALYSES_FILE\n'.format(sys.argv[0]))
+        sys.exit(1)
+    analyses = load(sys.argv[2])
+    serve(int(sys.argv[1]), dict(analyses))
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Stand-in for 'wapiti label' that labels feature files (output of extract_features.py) without a trained model, for benchmarks.
+# Each token gets the first of its candidate tags from the morphological analysis (columns 5-14), or NE/NN (capitalized words)
+# and ADV (other words) if it has none. Input and output are like those of Wapiti: without -l, each input line is repeated
+# with the label as last column; with -l, only the label is written; an empty line follows each sequence.
+# The messages at startup ('* Load model', '* Label sequences') are written to stderr, where Clevertagger waits for them.
+# The model file (-m) must exist, but is not read. N-best output (-n, -p, -s) is not supported.
+#
+# usage: python benchmarks/fake_wapiti.py label -m MODEL [-l]
+
+from __future__ import unicode_literals
+import os
+import sys
+import argparse
+
+
+def label(columns):
+    """label of a token (list of feature columns as bytes)"""
+    for tag in columns[4:14]:
+        if tag != b'ZZZ':
+            return tag
+    if columns[2] == b'uc':
+        return b'NE' if len(columns[0]) < 6 else b'NN'
+    return b'ADV'
+
+
+def main(labels_only):
+
+    fobj_in = getattr(sys.stdin, 'buffer', sys.stdin)
+    fobj_out = getattr(sys.stdout, 'buffer', sys.stdout)
+    # with a terminal (pexpect in Clevertagger), each sequence is written as soon as it is labeled
+    interactive = os.isatty(fobj_out.fileno())
+
+    for line in iter(fobj_in.readline, b''):
+        columns = line.split()
+        if not columns:
+            fobj_out.write(b'\n')
+            if interactive:
+                fobj_out.flush()
+            continue
+        tag = label(columns)
+        if labels_only:
+            fobj_out.write(tag + b'\n')
+        else:
+            fobj_out.write(line.rstrip(b'\r\n') + b'\t' + tag + b'\n')
+    fobj_out.flush()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Stand-in for wapiti label (benchmarks only).')
+    parser.add_argument('mode', choices=['label'])
+    parser.add_argument('-m', '--model', required=True)
+    parser.add_argument('-l', '--label', action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        sys.stderr.write('error: cannot open model file {0}\n'.format(args.model))
+        sys.exit(1)
+    sys.stderr.write('* Load model\n* Label sequences\n')
+    sys.stderr.flush()
+    main(args.label)
@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Throughput (tokens/s) of extract_features.py and postprocess.py with the old code and I/O (copies of the baseline
+# implementations, text streams with default buffers, one write() call per token) and with large binary buffers and batched writes.
+# The outputs of the old and new code are compared.
+# Input is the synthetic corpus of corpus.py; SMOR is replaced by canned analyses, so only feature creation and I/O are measured.
+#
+# usage: python benchmarks/io_buffers.py [TOKENS] [BUFFER_SIZE]
+
+from __future__ import unicode_literals, print_function, division
+import os
+import io
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract_features
+import postprocess
+from bytes_pipeline import synthetic_corpus
+
+
+class CannedAnalyzer(extract_features.SMORAnalyzer):
+    """SMORAnalyzer without SMOR daemon: analyses are looked up in a dictionary"""
+
+    def __init__(self, analyses):
+        extract_features.MorphAnalyzer.__init__(self)
+        self.analyses = analyses
+        self.lexicon = None
+
+    def analyze(self, lines):
+        for word in self.new_words(lines):
+            self.posset[word].update(self.analyses.get(word, ()))
+
+    def terminate(self):
+        pass
+
+
+# The old implementations are copied from the baseline version of extract_features.py and postprocess.py,
+# so that the old rows do not pick up later changes of the same functions (e.g. the 1-best fast path of postprocess()).
+
+def old_create_features(morph, line):
+    """MorphAnalyzer.create_features() of the baseline version"""
+
+    truth = ''
+    pos = []
+    linelist = line.split()
+
+    if not linelist:
+        return '\n'
+
+    word = linelist[0]
+
+    if len(linelist) > 1:
+        truth = linelist[1]
+
+    if word[0].isupper():
+        feature_upper = 'uc'
+    else:
+        feature_upper = 'lc'
+
+    if morph.alphnum.search(word[0]):
+        feature_alnum = 'y'
+    else:
+        feature_alnum = 'n'
+
+    if word in morph.posset:
+        pos = morph.posset[word]
+    for alternative in extract_features.spelling_variations(word):
+        if alternative in morph.posset:
+            pos = morph.posset[alternative].union(pos)
+
+    pos = sorted(pos)+['ZZZ']*10
+    posstring = '\t'.join(pos[:10])
+
+    outstring = ("{w}\t{wlower}\t{upper}\t{alnum}\t{pos}".format(w=word, wlower=word.lower(), upper=feature_upper, pos=posstring, alnum=feature_alnum))
+
+    if truth:
+        outstring += '\t'+truth
+
+    return outstring+'\n'
+
+
+def old_postprocess(lines):
+    """1-best loop of the baseline version of postprocess.py"""
+
+    for line in lines:
+
+        linelist = line.split()
+
+        if not linelist:
+            yield ''
+            continue
+
+        if line.startswith('#') and len(linelist) == 3:
+            yield "{0}{1} {2}".format(linelist[0], linelist[1], linelist[2])
+            continue
+
+        yield "{0}\t{1}".format(linelist[0], linelist[postprocess.tag_position])
+
+
+def extract_old(analyses, path_in, path_out):
+    """feature extraction as before: text streams with default buffers, one write() per token"""
+    morph = CannedAnalyzer(analyses)
+    with io.open(path_in, encoding='UTF-8') as fobj_in, io.open(path_out, 'w', encoding='UTF-8') as fobj_out:
+        buf = []
+        for i, line in enumerate(fobj_in):
+            buf.append(line)
+            if i and not i % 10000:
+                morph.analyze(buf)
+                for line in buf:
+                    fobj_out.write(old_create_features(morph, line))
+                buf = []
+        morph.analyze(buf)
+        for line in buf:
+            fobj_out.write(old_create_features(morph, line))
+
+
+def extract_new(analyses, path_in, path_out, buffer_size, text=False):
+    """feature extraction as in extract_features.py: large binary buffers, one write() per batch"""
+    morph = CannedAnalyzer(analyses)
+    with io.open(path_in, 'rb', buffering=buffer_size) as fobj_in, io.open(path_out, 'wb', buffering=buffer_size) as fobj_out:
+        if text:
+            morph.main(io.TextIOWrapper(fobj_in, encoding='UTF-8'), io.TextIOWrapper(fobj_out, encoding='UTF-8'))
+        else:
+            morph.main_bytes(fobj_in, fobj_out)
+
+
+def postprocess_old(path_in, path_out):
+    """postprocessing as before: text streams, one write() per line"""
+    with io.open(path_in, encoding='UTF-8') as fobj_in, io.open(path_out, 'w', encoding='UTF-8') as fobj_out:
+        for line in old_postprocess(fobj_in):
+            fobj_out.write(line + '\n')
+
+
+def postprocess_new(path_in, path_out, buffer_size):
+    """postprocessing as in postprocess.py: large binary buffers, batched writes"""
+    with io.open(path_in, 'rb', buffering=buffer_size) as fobj_in, io.open(path_out, 'wb', buffering=buffer_size) as fobj_out:
+        postprocess.write_lines(postprocess.postprocess_bytes(fobj_in, 1), fobj_out)
+
+
+def timed(function, *args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+def main(n_tokens, buffer_size):
+
+    directory = tempfile.mkdtemp()
+    try:
+        corpus = os.path.join(directory, 'corpus')
+        features = os.path.join(directory, 'features')
+        crf_output = os.path.join(directory, 'crf_output')
+        output = os.path.join(directory, 'output')
+
+        lines, analyses = synthetic_corpus(n_tokens)
+        with open(corpus, 'wb') as fobj:
+            fobj.writelines(lines)
+        n_tokens = sum(1 for line in lines if line.strip())
+        del lines
+
+        def same_output(path, other):
+            with open(path, 'rb') as fobj, open(other, 'rb') as fobj_other:
+                assert fobj.read() == fobj_other.read(), 'old and new implementation give different output'
+
+        results = [('extract_features', 'old (text, per-token writes)', timed(extract_old, analyses, corpus, features))]
+        for mode, text in [('new --text', True), ('new bytes', False)]:
+            results.append(('extract_features', '{0} ({1} byte buffers)'.format(mode, buffer_size), timed(extract_new, analyses, corpus, output, buffer_size, text)))
+            same_output(features, output)
+
+        with open(features, 'rb') as fobj_in, open(crf_output, 'wb') as fobj_out:
+            for line in fobj_in:
+                fobj_out.write(line[:-1] + b'\tNN\n' if line.strip() else line)
+
+        results.append(('postprocess', 'old (text, per-line writes)', timed(postprocess_old, crf_output, features)))
+        results.append(('postprocess', 'new ({0} byte buffers)'.format(buffer_size), timed(postprocess_new, crf_output, output, buffer_size)))
+        same_output(features, output)
+
+        print('script\tmode\tseconds\ttokens/s')
+        for script, mode, seconds in results:
+            print('{0}\t{1}\t{2:.2f}\t{3:.0f}'.format(script, mode, seconds, n_tokens/seconds))
+
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1048576)
@@ -0,0 +1,594 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# End-to-end benchmark suite that runs without SMOR and Wapiti: a synthetic German-like corpus (corpus.py) is analyzed by
+# a stand-in fst-infl2-daemon with canned analyses (fake_smor.py) and labeled by a stand-in CRF tool (fake_wapiti.py).
+# Each stage runs in new processes (--processes), and is measured in throughput (tokens/s; for get_true_pos analyses/s,
+# for SMORAnalyzer.convert and smor_getpos.py words/s), latency per call (p50/p99; one call is a sentence, a batch or a paragraph
+# for library functions, and a whole run for scripts) and peak RSS of the process (for scripts: of the largest subprocess).
+# Results are written as JSON (--json), so that runs of different versions can be compared (check out another version and
+# run this script with --root, or keep the JSON files of earlier runs).
+#
+# The tree under test (--root; default: this repository) is copied to a temporary directory, with a config.py that points to
+# the stand-ins (SFST_BIN, SMOR_MODEL, PORT, CRF_BACKEND_EXEC, CRF_MODEL); the config of the tree itself is not changed.
+#
+# Regression check: --save-baseline FILE stores the results of the hot paths (BASELINE_STAGES); --baseline FILE runs the same
+# stages on the same corpus, prints the change of each metric, and exits with status 1 if any of them is worse than its tolerance
+# (--tolerance [METRIC=]PERCENT) after --confirm further runs of the stage. Baselines are only comparable on the same machine
+# and Python version, and the tolerances must be larger than the differences between runs of the same version on that machine.
+#
+# usage: python benchmarks/suite.py [--tokens N] [--repeat N] [--stage NAME ...] [--root DIR] [--json FILE]
+#        python benchmarks/suite.py --save-baseline baseline.json
+#        python benchmarks/suite.py --baseline baseline.json [--tolerance PERCENT] [--tolerance METRIC=PERCENT ...]
+
+from __future__ import unicode_literals, print_function, division
+import os
+import io
+import re
+import sys
+import json
+import random
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+from math import ceil
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarks_directory)
+import corpus
+import fake_wapiti
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# items per call of the batched library functions
+BATCH_SIZE = 1000
+
+CONFIG = """
+# benchmark suite: stand-ins for SMOR and Wapiti
+SFST_BIN = {sfst_bin!r}
+SMOR_MODEL = {smor_model!r}
+SMOR_ENCODING = 'UTF-8'
+PORT = {port!r}
+CRF_BACKEND = 'wapiti'
+CRF_BACKEND_EXEC = {crf_exec!r}
+CRF_MODEL = {crf_model!r}
+"""
+
+
+class Work(object):
+    """files of a benchmark run in directory path: the copy of the tree under test, stand-ins, corpus and derived inputs"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tree = os.path.join(path, 'tree')
+
+    def __getattr__(self, name):
+        # work.tokens, work.gold, ... are paths of files in the work directory
+        if name in ('tokens', 'gold', 'raw', 'smor_output', 'analyses', 'model', 'fake_smor', 'fake_wapiti'):
+            return os.path.join(self.path, name)
+        raise AttributeError(name)
+
+
+def free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('localhost', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def install_script(source, target):
+    """copy stand-in script to target, with the running Python interpreter in the #! line, and make it executable"""
+    with io.open(source, encoding='UTF-8') as fobj:
+        lines = fobj.readlines()
+    lines[0] = '#!{0}\n'.format(sys.executable)
+    with io.open(target, 'w', encoding='UTF-8') as fobj:
+        fobj.writelines(lines)
+    os.chmod(target, 0o755)
+
+
+def prepare(work, root, n_tokens, seed):
+    """generate corpus and stand-in data in work directory, and copy tree under test (root) with a config for the stand-ins"""
+
+    data = corpus.generate(n_tokens, seed=seed)
+    corpus.write_lines(work.tokens, data.tokenized())
+    corpus.write_lines(work.gold, data.gold())
+    corpus.write_lines(work.raw, data.raw(random.Random(seed)))
+    corpus.write_lines(work.smor_output, data.smor_output())
+    corpus.write_analyses(work.analyses, data.analyses)
+    with io.open(work.model, 'w', encoding='UTF-8') as fobj:
+        fobj.write('stand-in model (not read by fake_wapiti.py)\n')
+
+    install_script(os.path.join(benchmarks_directory, 'fake_smor.py'), work.fake_smor)
+    install_script(os.path.join(benchmarks_directory, 'fake_wapiti.py'), work.fake_wapiti)
+
+    os.mkdir(work.tree)
+    for name in os.listdir(root):
+        if name.endswith('.py') and name != 'config.py':
+            shutil.copy2(os.path.join(root, name), work.tree)
+    shutil.copytree(os.path.join(root, 'preprocess'), os.path.join(work.tree, 'preprocess'), ignore=shutil.ignore_patterns('*.pyc', '__pycache__'))
+    with io.open(os.path.join(root, 'config.py'), encoding='UTF-8') as fobj:
+        config = fobj.read()
+    config += CONFIG.format(sfst_bin=str(work.fake_smor), smor_model=str(work.analyses), port=free_port(),
+                            crf_exec=str(work.fake_wapiti), crf_model=str(work.model))
+    with io.open(os.path.join(work.tree, 'config.py'), 'w', encoding='UTF-8') as fobj:
+        fobj.write(config)
+
+    return data.n_tokens
+
+
+def version(root):
+    """git description of tree under test (None if it is not a git checkout)"""
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=root, stderr=subprocess.STDOUT).decode('UTF-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, p):
+    """p-th percentile of sorted list values (nearest rank, as in evaluate.py)"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, int(ceil(p/100*len(values))))) - 1]
+
+
+def read_sentences(path):
+    """list of sentences (lists of UTF-8 lines, without the empty line) of file in one-token-per-line format"""
+    sentences = []
+    sentence = []
+    with io.open(path, 'rb') as fobj:
+        for line in fobj:
+            if line.strip():
+                sentence.append(line)
+            elif sentence:
+                sentences.append(sentence)
+                sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+def smor_responses(work):
+    """output of the daemon for the corpus (UTF-8), split into responses of BATCH_SIZE words, and the number of words"""
+    responses = []
+    with io.open(work.smor_output, 'rb') as fobj:
+        chunks = re.split(b'\n(?=> )', fobj.read())
+    for i in range(0, len(chunks), BATCH_SIZE):
+        responses.append(b'\n'.join(chunks[i:i+BATCH_SIZE]) + b'\n')
+    return responses, len(chunks)
+
+
+# Stages: each function prepares the input of one repetition in the process that runs the stage (this is not timed),
+# and returns the number of items (tokens, analyses or words), the list of calls that are timed, and a clean-up function (or None).
+
+def stage_create_features(work):
+    import extract_features
+    responses, n_words = smor_responses(work)
+    morph = extract_features.SMORAnalyzer(port=0)
+    for response in responses:
+        morph.convert(response)
+    sentences = [[line.decode('UTF-8') for line in sentence] for sentence in read_sentences(work.tokens)]
+
+    def call(sentence):
+        return lambda: ''.join(morph.create_features(line) for line in sentence)
+
+    return sum(len(sentence) for sentence in sentences), [call(sentence) for sentence in sentences], None
+
+
+def stage_get_true_pos(work):
+    from smor_getpos import get_true_pos
+    re_mainclass = re.compile(r'<\+(.*?)>')
+    with io.open(work.smor_output, encoding='UTF-8') as fobj:
+        lines = [line.rstrip('\n') for line in fobj if not line.startswith('>') and not line.startswith('no result')]
+
+    def call(batch):
+        return lambda: [get_true_pos(re_mainclass.search(line).group(1), line) for line in batch]
+
+    return len(lines), [call(lines[i:i+BATCH_SIZE]) for i in range(0, len(lines), BATCH_SIZE)], None
+
+
+def stage_smor_convert(work):
+    import extract_features
+    responses, n_words = smor_responses(work)
+    morph = extract_features.SMORAnalyzer(port=0)
+    return n_words, [lambda response=response: morph.convert(response) for response in responses], None
+
+
+def stage_postprocess(work):
+    import extract_features
+    import postprocess
+    responses, n_words = smor_responses(work)
+    morph = extract_features.SMORAnalyzer(port=0)
+    for response in responses:
+        morph.convert(response)
+    # output of the CRF tool: features and label
+    sentences = []
+    for sentence in read_sentences(work.tokens):
+        lines = []
+        for line in sentence:
+            features = morph.create_features_bytes(line)
+            lines.append(features[:-1] + b'\t' + fake_wapiti.label(features.split()) + b'\n')
+        sentences.append(lines + [b'\n'])
+
+    def call(sentence):
+        return lambda: list(postprocess.postprocess_bytes(sentence, 1))
+
+    return sum(len(sentence) - 1 for sentence in sentences), [call(sentence) for sentence in sentences], None
+
+
+def stage_sentence_splitter(work):
+    splitter = load_sentence_splitter(work)
+    tokenizer = splitter.PunktSentenceTokenizer()
+    for name in ('collocations', 'ortho_context', 'abbrev_types', 'sent_starters'):
+        setattr(tokenizer._params, name, getattr(splitter.punkt_data_german, name))
+    with io.open(work.raw, encoding='UTF-8') as fobj:
+        paragraphs = [paragraph + '\n' for paragraph in fobj.read().split('\n\n') if paragraph.strip()]
+
+    def call(paragraph):
+        def tokenize():
+            # tokenize_fobj() writes to sys.stdout
+            stdout = sys.stdout
+            sys.stdout = io.StringIO()
+            try:
+                tokenizer.tokenize_fobj(io.StringIO(paragraph), sys.stdout)
+            finally:
+                sys.stdout = stdout
+        return tokenize
+
+    return sum(len(paragraph.split()) for paragraph in paragraphs), [call(paragraph) for paragraph in paragraphs], None
+
+
+def load_sentence_splitter(work):
+    """module preprocess/sentence_splitter (a script without .py suffix)"""
+    path = os.path.join(work.tree, 'preprocess', 'sentence_splitter')
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        from importlib.machinery import SourceFileLoader
+        return SourceFileLoader('sentence_splitter', path).load_module()
+    except ImportError:
+        import imp
+        return imp.load_source('sentence_splitter', path)
+
+
+def stage_tag(work):
+    import clevertagger
+    tagger = clevertagger.Clevertagger(backend='wapiti', model=work.model)
+    sentences = [' '.join(line.decode('UTF-8').strip() for line in sentence) for sentence in read_sentences(work.tokens)]
+
+    def cleanup():
+        tagger.tagger.close()
+        tagger.smor.terminate()
+
+    return sum(len(sentence.split()) for sentence in sentences), [lambda sentence=sentence: tagger.tag([sentence]) for sentence in sentences], cleanup
+
+
+def script(work, command, input_path):
+    """call that runs command (list; relative paths are relative to the tree under test) with input_path as stdin"""
+    command = [os.path.join(work.tree, part) if part.endswith('.py') else part for part in command]
+
+    def run():
+        with io.open(input_path, 'rb') as fobj_in, io.open(os.devnull, 'wb') as fobj_out:
+            subprocess.check_call(command, stdin=fobj_in, stdout=fobj_out, cwd=work.tree)
+    return run
+
+
+def stage_smor_getpos(work):
+    responses, n_words = smor_responses(work)
+    return n_words, [script(work, [sys.executable, 'smor_getpos.py'], work.smor_output)], None
+
+
+def stage_extract_features(work):
+    return count_tokens(work.tokens), [script(work, [sys.executable, 'extract_features.py'], work.tokens)], None
+
+
+def stage_cli(work):
+    return count_tokens(work.tokens), [script(work, [sys.executable, 'clevertagger.py'], work.tokens)], None
+
+
+def count_tokens(path):
+    with io.open(path, 'rb') as fobj:
+        return sum(1 for line in fobj if line.strip())
+
+
+# name: (function, unit of items, subprocess stage)
+STAGES = OrderedDict([
+    ('get_true_pos', (stage_get_true_pos, 'analyses', False)),
+    ('SMORAnalyzer.convert', (stage_smor_convert, 'words', False)),
+    ('smor_getpos', (stage_smor_getpos, 'words', True)),
+    ('create_features', (stage_create_features, 'tokens', False)),
+    ('extract_features', (stage_extract_features, 'tokens', True)),
+    ('postprocess', (stage_postprocess, 'tokens', False)),
+    ('PunktSentenceTokenizer.tokenize_fobj', (stage_sentence_splitter, 'tokens', False)),
+    ('Clevertagger.tag', (stage_tag, 'tokens', False)),
+    ('cli', (stage_cli, 'tokens', True)),
+])
+
+
+def peak_rss_kb(children):
+    """peak resident set size (KB) of this process, or of its largest (terminated) subprocess"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB on Linux
+    return rss//1024 if sys.platform == 'darwin' else rss
+
+
+def run_stage(name, work, repeat):
+    """run stage repeat times in this process; return its measurements.
+    Every repetition makes the same calls; the latency of each call is its minimum over all repetitions (so that short disturbances
+    by other processes are left out), and throughput is computed from the sum of these latencies."""
+
+    function, unit, subprocess_stage = STAGES[name]
+    sys.path[0:0] = [work.tree, benchmarks_directory]
+
+    latencies = None
+    for i in range(repeat):
+        n_items, calls, cleanup = function(work)
+        times = []
+        for call in calls:
+            start = timer()
+            call()
+            times.append(timer() - start)
+        if cleanup is not None:
+            cleanup()
+        latencies = times if latencies is None else [min(a, b) for a, b in zip(latencies, times)]
+
+    seconds = sum(latencies)
+    latencies.sort()
+    return OrderedDict([
+        ('unit', unit),
+        ('items', n_items),
+        ('calls', len(calls)),
+        ('seconds', seconds),
+        ('tokens_per_second', n_items/seconds if seconds else 0.0),
+        ('latency_ms', OrderedDict((key, 1000*percentile(latencies, p)) for key, p in (('p50', 50), ('p99', 99), ('max', 100)))),
+        ('peak_rss_kb', peak_rss_kb(subprocess_stage)),
+    ])
+
+
+def best_of(entry, other):
+    """combine measurements of a stage in two processes: the best value of each metric (an error is kept)"""
+    if 'error' in entry:
+        return entry
+    if 'error' in other:
+        return other
+    entry['seconds'] = min(entry['seconds'], other['seconds'])
+    entry['tokens_per_second'] = max(entry['tokens_per_second'], other['tokens_per_second'])
+    for key in entry['latency_ms']:
+        entry['latency_ms'][key] = min(entry['latency_ms'][key], other['latency_ms'][key])
+    if entry['peak_rss_kb'] is not None:
+        entry['peak_rss_kb'] = min(entry['peak_rss_kb'], other['peak_rss_kb'])
+    return entry
+
+
+def run_suite(root, stages, n_tokens=100000, seed=1, repeat=3, processes=3, work_directory=None, log=None):
+    """benchmark tree under test (root) on a synthetic corpus; return results (dict).
+    Each stage runs in processes new Python processes, one after another for all stages in turn (so that a period of load
+    on the machine does not affect all runs of a stage), and the best value of each metric is kept.
+    If a stage fails, its entry contains the error message instead of measurements."""
+
+    work = Work(work_directory or tempfile.mkdtemp(prefix='clevertagger-suite-'))
+    if not os.path.isdir(work.path):
+        os.makedirs(work.path)
+    try:
+        n_corpus = prepare(work, root, n_tokens, seed)
+        results = OrderedDict()
+        for i in range(processes):
+            for name in stages:
+                if log is not None:
+                    log.write('{0} ({1}/{2})...\n'.format(name, i + 1, processes))
+                    log.flush()
+                process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run-stage', name, '--work', work.path, '--repeat', str(repeat)],
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                out, err = process.communicate()
+                if process.returncode:
+                    message = err.decode('UTF-8', 'replace').strip().splitlines()
+                    entry = {'error': message[-1] if message else 'exit status {0}'.format(process.returncode)}
+                else:
+                    entry = json.loads(out.decode('UTF-8'), object_pairs_hook=OrderedDict)
+                results[name] = best_of(results[name], entry) if name in results else entry
+    finally:
+        if work_directory is None:
+            shutil.rmtree(work.path)
+
+    return OrderedDict([
+        ('version', OrderedDict([('git', version(root)), ('root', os.path.abspath(root)),
+                                 ('python', platform.python_version()), ('platform', platform.platform())])),
+        ('date', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ('parameters', OrderedDict([('tokens', n_corpus), ('seed', seed), ('repeat', repeat), ('processes', processes)])),
+        ('stages', results),
+    ])
+
+
+def format_results(results):
+    """table of results"""
+    parameters = results['parameters']
+    lines = ['{0} (Python {1}), {2} tokens, best of {3} repetitions in {4} processes'.format(results['version']['git'] or results['version']['root'],
+             results['version']['python'], parameters['tokens'], parameters['repeat'], parameters.get('processes', 1)),
+             'stage\titems/s\tp50 ms\tp99 ms\tpeak RSS MB']
+    for name, entry in results['stages'].items():
+        if 'error' in entry:
+            lines.append('{0}\tERROR: {1}'.format(name, entry['error']))
+            continue
+        rss = '{0:.1f}'.format(entry['peak_rss_kb']/1024) if entry['peak_rss_kb'] is not None else '-'
+        lines.append('{0}\t{1:.0f} {2}/s\t{3:.3f}\t{4:.3f}\t{5}'.format(name, entry['tokens_per_second'], entry['unit'],
+                                                                       entry['latency_ms']['p50'], entry['latency_ms']['p99'], rss))
+    return '\n'.join(lines) + '\n'
+
+
+# stages of the baselines for the regression check (--save-baseline, --baseline): the hot paths of analysis, feature extraction and tagging
+BASELINE_STAGES = ['create_features', 'get_true_pos', 'SMORAnalyzer.convert', 'PunktSentenceTokenizer.tokenize_fobj', 'Clevertagger.tag']
+
+# metrics that are compared with the baseline: value in the entry of a stage, and whether higher values are better
+METRICS = OrderedDict([
+    ('tokens_per_second', (lambda entry: entry['tokens_per_second'], True)),
+    ('p50_ms', (lambda entry: entry['latency_ms']['p50'], False)),
+    ('p99_ms', (lambda entry: entry['latency_ms']['p99'], False)),
+    ('peak_rss_kb', (lambda entry: entry['peak_rss_kb'], False)),
+])
+
+# default tolerances in percent; the p99 latency of short calls is noisier than the throughput
+TOLERANCES = {'tokens_per_second': 10.0, 'p50_ms': 20.0, 'p99_ms': 50.0, 'peak_rss_kb': 10.0}
+
+
+def parse_tolerances(values):
+    """tolerances (dict metric -> percent) from list of 'PERCENT' (all metrics) or 'METRIC=PERCENT' strings, starting with TOLERANCES"""
+    tolerances = dict(TOLERANCES)
+    for value in values or []:
+        metric, equals, percent = value.rpartition('=')
+        if metric and metric not in METRICS:
+            raise ValueError('unknown metric \'{0}\' (metrics: {1})'.format(metric, ', '.join(METRICS)))
+        for name in ([metric] if metric else METRICS):
+            tolerances[name] = float(percent)
+    return tolerances
+
+
+def compare(baseline, results, tolerances):
+    """compare the stages of baseline with those of results; return list of (stage, metric, baseline value, current value, change in percent, regression).
+    A change is a regression if it is worse than the tolerance of the metric; a stage that failed (or was not run) is a regression,
+    with the error message instead of a metric."""
+
+    rows = []
+    for name, base in baseline['stages'].items():
+        if 'error' in base:
+            continue
+        entry = results['stages'].get(name, {'error': 'not run'})
+        if 'error' in entry:
+            rows.append((name, 'error: ' + entry['error'], None, None, None, True))
+            continue
+        for metric, (value, higher_is_better) in METRICS.items():
+            old, new = value(base), value(entry)
+            if not old or new is None:
+                continue
+            change = 100*(new - old)/old
+            regression = -change > tolerances[metric] if higher_is_better else change > tolerances[metric]
+            rows.append((name, metric, old, new, change, regression))
+    return rows
+
+
+def format_comparison(baseline, results, rows, tolerances):
+    """table of comparison with baseline; regressions are marked with '!'"""
+
+    def describe(results):
+        return '{0} (Python {1}, {2})'.format(results['version']['git'] or results['version']['root'], results['version']['python'], results['date'])
+
+    lines = ['baseline: ' + describe(baseline), 'current:  ' + describe(results), '',
+             '  stage\tmetric\tbaseline\tcurrent\tchange\ttolerance']
+    for name, metric, old, new, change, regression in rows:
+        if old is None:
+            lines.append('! {0}\t{1}'.format(name, metric))
+        else:
+            lines.append('{0} {1}\t{2}\t{3:.3f}\t{4:.3f}\t{5:+.1f}%\t{6:.0f}%'.format('!' if regression else ' ', name, metric, old, new, change, tolerances[metric]))
+
+    regressions = sum(1 for row in rows if row[-1])
+    lines.append('')
+    if regressions:
+        lines.append('FAILED: {0} metric(s) regressed beyond tolerance (marked with !)'.format(regressions))
+    else:
+        lines.append('OK: no metric regressed beyond tolerance')
+    return '\n'.join(lines) + '\n'
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of clevertagger with a synthetic corpus and stand-ins for SMOR and Wapiti.')
+    parser.add_argument('--tokens', type=int, metavar='N',
+                    help='Size of the synthetic corpus (default: 100000, or that of the baseline).')
+    parser.add_argument('--seed', type=int,
+                    help='Seed of the corpus generator (default: 1, or that of the baseline).')
+    parser.add_argument('--repeat', type=int, metavar='N',
+                    help='Repetitions of each stage in each process; the latency of each call is the minimum of all repetitions (default: 3, or that of the baseline).')
+    parser.add_argument('--processes', type=int, metavar='N',
+                    help='Processes for each stage; each metric is the best of all processes (default: 3, or that of the baseline).')
+    parser.add_argument('-s', '--stage', action='append', choices=list(STAGES), metavar='NAME',
+                    help='Run only stage NAME (can be given several times). Stages: {0}.'.format(', '.join(STAGES)))
+    parser.add_argument('--save-baseline', metavar='FILE',
+                    help='Run the stages of the regression check ({0}), and write the results to FILE as baseline for --baseline.'.format(', '.join(BASELINE_STAGES)))
+    parser.add_argument('--baseline', metavar='FILE',
+                    help='Run the stages of the baseline FILE with its corpus, and compare the results; exit with status 1 if a metric regressed beyond its tolerance.')
+    parser.add_argument('--tolerance', action='append', metavar='[METRIC=]PERCENT',
+                    help='Tolerance for --baseline for all metrics, or for METRIC ({0}). Can be given several times. Default: {1}.'.format(
+                        ', '.join(METRICS), ', '.join('{0}={1:.0f}'.format(metric, TOLERANCES[metric]) for metric in METRICS)))
+    parser.add_argument('--root', default=os.path.dirname(benchmarks_directory), metavar='DIR',
+                    help='Tree under test, e.g. a checkout of another version (default: this repository).')
+    parser.add_argument('--json', metavar='FILE',
+                    help='Write results as JSON to FILE (\'-\' for stdout).')
+    parser.add_argument('--work', metavar='DIR',
+                    help='Keep generated corpus, stand-ins and copy of the tree in DIR (default: temporary directory).')
+    parser.add_argument('--confirm', type=int, default=1, metavar='N',
+                    help='With --baseline, run stages with regressions up to N more times before failing, to rule out disturbances by other processes (default: %(default)s).')
+    parser.add_argument('--run-stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    try:
+        args.tolerances = parse_tolerances(args.tolerance)
+    except ValueError as e:
+        parser.error('--tolerance: {0}'.format(e))
+    if args.baseline and args.save_baseline:
+        parser.error('--baseline and --save-baseline are mutually exclusive')
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_command_line()
+
+    if args.run_stage:
+        # in the process of one stage: print its measurements
+        sys.stdout.write(json.dumps(run_stage(args.run_stage, Work(args.work), args.repeat)) + '\n')
+        sys.exit(0)
+
+    stages = args.stage or (BASELINE_STAGES if args.save_baseline else list(STAGES))
+    parameters = {'tokens': 100000, 'seed': 1, 'repeat': 3, 'processes': 3}
+    baseline = None
+    if args.baseline:
+        # same stages and corpus as the baseline
+        with io.open(args.baseline, encoding='UTF-8') as fobj:
+            baseline = json.load(fobj, object_pairs_hook=OrderedDict)
+        stages = args.stage or [name for name in baseline['stages'] if name in STAGES]
+        parameters.update(baseline['parameters'])
+    for name in parameters:
+        if getattr(args, name) is not None:
+            parameters[name] = getattr(args, name)
+
+    def run(stages, work_directory=None):
+        return run_suite(args.root, stages, parameters['tokens'], parameters['seed'], parameters['repeat'], parameters['processes'], work_directory, sys.stderr)
+
+    results = run(stages, args.work)
+
+    rows = None
+    if baseline is not None:
+        rows = compare(baseline, results, args.tolerances)
+        # a regression must be confirmed by further runs of the stage (the best value of each metric over all runs is compared)
+        for i in range(args.confirm):
+            regressed = [name for name in stages if any(row[0] == name and row[-1] for row in rows)]
+            if not regressed:
+                break
+            sys.stderr.write('confirming regression of {0}\n'.format(', '.join(regressed)))
+            rerun = run(regressed)
+            for name in regressed:
+                results['stages'][name] = best_of(results['stages'][name], rerun['stages'][name])
+            rows = compare(baseline, results, args.tolerances)
+
+    if args.json == '-':
+        sys.stdout.write(json.dumps(results, indent=2) + '\n')
+    else:
+        sys.stdout.write(format_results(results))
+    for path in (args.json, args.save_baseline):
+        if path and path != '-':
+            with io.open(path, 'w', encoding='UTF-8') as fobj:
+                fobj.write(json.dumps(results, indent=2) + '\n')
+
+    if rows is not None:
+        (sys.stderr if args.json == '-' else sys.stdout).write('\n' + format_comparison(baseline, results, rows, args.tolerances))
+        if any(row[-1] for row in rows):
+            sys.exit(1)
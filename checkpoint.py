@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Checkpoints for continuing interrupted runs of feature extraction or tagging (extract_features.py --checkpoint, clevertagger --checkpoint).
+# A checkpoint is a small JSON file with the number of input bytes that have been processed completely, the number of output bytes
+# written for them, and the size of the lexicon file (checkpoint path + '.lexicon'), to which the analyses of new words are appended
+# (in the format of extract_features.py --save-lexicon).
+# On resume, the output file and the lexicon file are truncated to the sizes in the checkpoint, and the input is skipped up to its offset,
+# so no work is done twice, and no output is duplicated.
+
+from __future__ import unicode_literals
+import os
+import io
+import json
+import time
+
+
+class Checkpoint(object):
+    """State of a resumable run. With resume=True, the state is read from path (if it exists; otherwise, the run starts from the beginning).
+    save() writes a new checkpoint, at most every interval seconds unless force=True."""
+
+    def __init__(self, path, resume=False, interval=60):
+
+        self.path = path
+        self.lexicon_path = path + '.lexicon'
+        self.interval = interval
+        self.input_offset = 0
+        self.output_offset = 0
+        self.lexicon_offset = 0
+
+        if resume and os.path.exists(path):
+            with io.open(path, encoding='UTF-8') as f:
+                state = json.load(f)
+            self.input_offset = state['input_offset']
+            self.output_offset = state['output_offset']
+            self.lexicon_offset = state['lexicon_offset']
+
+        # analyses of new words are appended to the lexicon file with add_lexicon() before each save()
+        self.lexicon = io.open(self.lexicon_path, 'ab')
+        self.lexicon.truncate(self.lexicon_offset)
+        self.lexicon.seek(self.lexicon_offset)
+        self.last_save = time.time()
+
+    def lexicon_lines(self):
+        """analyses that were saved with the checkpoint, as lines of text"""
+        with io.open(self.lexicon_path, encoding='UTF-8') as f:
+            return f.readlines()
+
+    def add_lexicon(self, entries):
+        """append (word, list of POS tags) pairs to the lexicon file"""
+        self.lexicon.write(''.join('{0}\t{1}\n'.format(word, ' '.join(sorted(tags))) for word, tags in entries).encode('UTF-8'))
+
+    def open_output(self, path, buffering=-1):
+        """open output file (binary) for writing after the output of the checkpoint (which is kept, and anything after it removed)"""
+        if self.output_offset:
+            fobj = io.open(path, 'r+b', buffering=buffering)
+            fobj.truncate(self.output_offset)
+            fobj.seek(self.output_offset)
+        else:
+            fobj = io.open(path, 'wb', buffering=buffering)
+        return fobj
+
+    def due(self):
+        """True if the last checkpoint is older than the interval"""
+        return time.time() - self.last_save >= self.interval
+
+    def save(self, input_offset, fobj_out, force=False):
+        """write checkpoint after input_offset bytes of input have been processed completely, and their output has been written to fobj_out.
+        Output and lexicon are flushed to disk first, so the checkpoint never refers to data that is not there.
+        Returns False if no checkpoint was written because the last one is more recent than the interval."""
+
+        if not force and not self.due():
+            return False
+
+        fobj_out.flush()
+        os.fsync(fobj_out.fileno())
+        self.lexicon.flush()
+        os.fsync(self.lexicon.fileno())
+
+        self.input_offset = input_offset
+        self.output_offset = fobj_out.tell()
+        self.lexicon_offset = self.lexicon.tell()
+
+        state = {'input_offset': self.input_offset, 'output_offset': self.output_offset, 'lexicon_offset': self.lexicon_offset}
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'wb') as f:
+            f.write(json.dumps(state).encode('UTF-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.path)
+
+        self.last_save = time.time()
+        return True
+
+    def close(self):
+        self.lexicon.close()
+
+
+def skip_input(fobj, offset):
+    """skip the first offset bytes of binary file object fobj: seek if possible, otherwise (pipes) read and discard them"""
+
+    if not offset:
+        return
+    try:
+        fobj.seek(offset)
+        return
+    except (IOError, OSError, ValueError):
+        pass
+    while offset:
+        data = fobj.read(min(offset, 1048576))
+        if not data:
+            raise IOError('input is shorter than the offset of the checkpoint')
+        offset -= len(data)
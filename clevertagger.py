@@ -3,19 +3,44 @@
 # Copyright © 2011 University of Zürich
 # Author: Rico Sennrich <sennrich@cl.uzh.ch>
 
-from __future__ import unicode_literals
+from __future__ import unicode_literals, division
 
 DESC = """clevertagger is a German part-of-speech tagger based on a linear-chain CRF and SMOR.
 It requires tokenized and sentence-delimited input (one token per line, empty line between sentenes) in UTF-8 encoding."""
 
 import sys
 import os
+import io
+import re
+import json
+import codecs
+import socket
+import signal
 import argparse
+import hashlib
+import time
+import gc
+import errno
+import traceback
+import threading
+import heapq
 import pexpect
+from math import exp
+from collections import OrderedDict, deque
+try:
+    import socketserver
+    import queue
+except ImportError:
+    import SocketServer as socketserver
+    import Queue as queue
 from subprocess import Popen, PIPE
 
 import extract_features
-from config import CRF_BACKEND, CRF_MODEL, CRF_BACKEND_EXEC
+import postprocess
+import crf
+import lexicon
+from checkpoint import Checkpoint, skip_input
+from config import CRF_BACKEND, CRF_MODEL, CRF_BACKEND_EXEC, SMOR_MODEL, IO_BUFFER_SIZE
 
 # root directory (for relative path resolution) if file is run as script
 root_directory = sys.path[0]
@@ -24,7 +49,16 @@ if '__file__' in globals():
     root_directory = os.path.dirname(os.path.abspath(__file__))
 
 if not os.path.isabs(CRF_MODEL):
-    CRF_MODEL = os.path.join(sys.path[0], CRF_MODEL)
+    CRF_MODEL = os.path.join(root_directory, CRF_MODEL)
+
+# external compression tools for output of feature extraction (-e), and for compressed input files
+COMPRESS_COMMANDS = {'gzip': ['gzip', '-c'], 'xz': ['xz', '-c']}
+DECOMPRESS_COMMANDS = {'gzip': ['gzip', '-dc'], 'xz': ['xz', '-dc']}
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'xz': '.xz'}
+COMPRESSION_MAGIC = {'gzip': b'\x1f\x8b', 'xz': b'\xfd7zXZ\x00'}
+
+# clock for the stage timings of Clevertagger
+timer = getattr(time, 'perf_counter', time.time)
 
 def parse_command_line():
     parser = argparse.ArgumentParser(description=DESC)
@@ -36,6 +70,16 @@ def parse_command_line():
                     default=sys.stdin, metavar='FILE',
                     help='Input file. If not given, stdin is used.')
 
+    parser.add_argument('-o', '--output', type=str, metavar='FILE',
+                    help='Output file for feature extraction (-e). If not given, stdout is used.')
+
+    parser.add_argument('--compress', choices=sorted(COMPRESS_COMMANDS),
+                    help='Compress output of feature extraction (-e). Default: compress if the output file ends with .gz or .xz.')
+
+    parser.add_argument('--shards', type=int,
+                    default=0, metavar='N',
+                    help='With -e and -o FILE, extract features with N parallel pipelines, each of which writes every N-th chunk of sentences to its own file (FILE.000, FILE.001, ...; before the .gz/.xz suffix).')
+
     parser.add_argument('-m', '--model', type=str,
                     default=CRF_MODEL, metavar='FILE',
                     help='Path to CRF++/Wapiti model.')
@@ -51,6 +95,50 @@ def parse_command_line():
     parser.add_argument('--tokenize', action="store_true",
                     help='Tokenize text before tagging.')
 
+    parser.add_argument('--inprocess', action="store_true",
+                    help='Run feature extraction and postprocessing in this process instead of separate scripts; only the CRF tool (if any) is a subprocess.')
+
+    parser.add_argument('--labels-only', action="store_true",
+                    help='Let the CRF tool (Wapiti or in-process decoder) only output labels, and keep the tokens in a buffer of this process. Reduces the data passed through pipes.')
+
+    parser.add_argument('--serve', type=str, metavar='ADDRESS',
+                    help='Keep tagger in memory and serve requests at ADDRESS (path of Unix domain socket, or localhost:PORT).')
+
+    parser.add_argument('--workers', type=int,
+                    default=1, metavar='N',
+                    help='With --serve, load the tagger once and fork N worker processes that share its memory copy-on-write.')
+
+    parser.add_argument('--connect', type=str, metavar='ADDRESS',
+                    help='Send input to tagging server at ADDRESS (started with --serve), and print its output.')
+
+    parser.add_argument('-j', '--jobs', type=int,
+                    default=1, metavar='N',
+                    help='Tag input with N parallel pipelines, which are fed chunks of sentences. Output order is preserved.')
+
+    parser.add_argument('--chunk-size', type=int,
+                    default=10000, metavar='N',
+                    help='Number of sentences per chunk in parallel mode (default: %(default)s).')
+
+    parser.add_argument('--shared-lexicon', type=int,
+                    default=0, metavar='MB',
+                    help='In parallel mode, share analyzed words between pipelines through a lexicon of MB megabytes in shared memory (Python >= 3.8).')
+
+    parser.add_argument('--load-lexicon', type=str, metavar='FILE',
+                    help='Load precomputed analyses of words from FILE (see extract_features.py --save-lexicon), which are then not analyzed with SMOR. With --shared-lexicon, they are loaded into the shared lexicon once.')
+
+    parser.add_argument('--checkpoint', type=str, metavar='FILE',
+                    help='Periodically save a checkpoint to FILE (input offset, output offset and, with --shared-lexicon or -e, the lexicon of analyzed words), from which an interrupted run can be continued with --resume. Requires -o.')
+
+    parser.add_argument('--checkpoint-interval', type=float,
+                    default=60, metavar='SECONDS',
+                    help='Minimum time between two checkpoints (default: %(default)s).')
+
+    parser.add_argument('--resume', action="store_true",
+                    help='Continue after the last checkpoint in FILE (--checkpoint); the output file (-o) is kept up to the checkpoint.')
+
+    parser.add_argument('--share-smor', action="store_true",
+                    help='In parallel mode, use one SMOR daemon for all pipelines instead of one per pipeline.')
+
     return parser.parse_args()
 
 
@@ -60,41 +148,102 @@ def main(args):
         sys.stderr.write('ERROR: --nbesttags and --nbestsents are mutually exclusive options. Aborting.\n')
         exit()
 
-    if args.nbesttags > 1 and CRF_BACKEND == 'wapiti':
-        sys.stderr.write('ERROR: --nbesttags is only supported for CRF++. Aborting.\n')
+    backend = CRF_BACKEND
+    # Wapiti has no per-token n-best output; the in-process decoder can read Wapiti models and compute tag marginals instead.
+    if args.nbesttags > 1 and backend == 'wapiti':
+        backend = 'python'
+
+    if args.e and (args.serve or args.connect):
+        sys.stderr.write('ERROR: --serve and --connect are not supported for feature extraction (-e). Aborting.\n')
         exit()
 
-    if args.e:
-        e_out = sys.stdout
-    else:
-        e_out = PIPE
-    
+    if args.serve:
+        serve(args, backend)
+        return
+
+    if args.labels_only and not args.e:
+        if backend not in ('wapiti', 'python'):
+            sys.stderr.write('ERROR: --labels-only requires CRF_BACKEND \'wapiti\' or \'python\'. Aborting.\n')
+            exit()
+        if args.jobs > 1:
+            sys.stderr.write('ERROR: --labels-only is not supported with --jobs. Aborting.\n')
+            exit()
+
+    if (args.compress or args.shards or (args.output and not args.checkpoint)) and not args.e:
+        sys.stderr.write('ERROR: --compress, --shards and --output (without --checkpoint) are only supported for feature extraction (-e). Aborting.\n')
+        exit()
+
+    if args.resume and not args.checkpoint:
+        sys.stderr.write('ERROR: --resume requires --checkpoint. Aborting.\n')
+        exit()
+
+    if args.checkpoint:
+        if not args.output:
+            sys.stderr.write('ERROR: --checkpoint requires an output file (-o). Aborting.\n')
+            exit()
+        if output_compression(args) or args.shards or args.labels_only or args.connect:
+            sys.stderr.write('ERROR: --checkpoint is not supported with compressed output, --shards, --labels-only and --connect. Aborting.\n')
+            exit()
+
+    if args.shards and not args.output:
+        sys.stderr.write('ERROR: --shards requires an output file (-o). Aborting.\n')
+        exit()
+
+    e_in = args.input
+
+    # compressed input file is decompressed by gzip/xz
+    compression = input_compression(args.input)
+    if compression:
+        decompressor = Popen(DECOMPRESS_COMMANDS[compression], stdin=e_in, stdout=PIPE)
+        e_in = decompressor.stdout
+
     if args.tokenize:
-        tokenizer = Popen(['perl', os.path.join(sys.path[0], 'preprocess', 'tokenizer.perl'), '-l', 'de'], stdout=PIPE, stdin=args.input)
+        tokenizer = Popen(['perl', os.path.join(sys.path[0], 'preprocess', 'tokenizer.perl'), '-l', 'de'], stdout=PIPE, stdin=e_in)
         e_in = tokenizer.stdout
-    else:
-        e_in = args.input
-    
-    extract = Popen([os.path.join(sys.path[0], 'extract_features.py')], stdin=e_in, stdout=e_out)
+
+    if args.connect:
+        connect(args, e_in)
+        return
+
+    # checkpoints for tagging (and parallel feature extraction) are saved after each chunk of sentences
+    if args.jobs > 1 or args.shards or (args.checkpoint and not args.e):
+        main_parallel(args, backend, e_in)
+        return
+
+    # (with --inprocess and the in-process decoder, there is no CRF tool whose output could be reduced)
+    if args.labels_only and not args.e and not (args.inprocess and backend == 'python'):
+        main_labels_only(args, backend, e_in)
+        return
+
+    if args.inprocess and not args.e:
+        main_inprocess(args, backend, e_in)
+        return
     
     if args.e:
-        extract.wait()
+        # feature extraction, optionally with compression: extract_features | gzip/xz > output
+        if args.checkpoint:
+            # extract_features.py writes the output file and the checkpoints itself
+            e_out, compressor = None, None
+            cmd = extract_command(args) + ['--output', args.output, '--checkpoint', args.checkpoint,
+                                           '--checkpoint-interval', str(args.checkpoint_interval)]
+            if args.resume:
+                cmd.append('--resume')
+            extract = Popen(cmd, stdin=e_in)
+        else:
+            e_out, compressor = features_output(args)
+            extract = Popen(extract_command(args), stdin=e_in, stdout=e_out)
+            if args.output or compressor is not None:
+                e_out.close()
+        failed = extract.wait()
+        if compressor is not None:
+            failed = compressor.wait() or failed
+        if failed:
+            sys.exit(1)
 
     else:
+        extract = Popen(extract_command(args), stdin=e_in, stdout=PIPE)
 
-        if CRF_BACKEND == 'wapiti':
-            cmd = [CRF_BACKEND_EXEC, 'label', '-m', args.model]
-            if args.nbestsents > 1:
-                cmd += ['-s', '-p', '-n', str(args.nbestsents)]
-        elif CRF_BACKEND == 'crf++':
-            cmd = [CRF_BACKEND_EXEC, '-m', args.model]
-            if args.nbesttags > 1:
-                cmd += ['-v', '2']
-            elif args.nbestsents > 1:
-                cmd += ['-n', str(args.nbestsents)]
-        else:
-            sys.stderr.write('Error: invalid value \'{0}\' for option \'CRF_BACKEND\'\n'.format(CRF_BACKEND))
-            sys.exit(1)
+        cmd = crf_command(args, backend)
 
         try:
             tagging = Popen(cmd, stdin=extract.stdout, stdout=PIPE, cwd = root_directory)
@@ -102,14 +251,795 @@ def main(args):
             if e.errno == 2:
                 sys.stderr.write('Error: Executable {0} not found. Please install {0} and/or adjust CRF_BACKEND_EXEC in the clevertagger config file.\n'.format(CRF_BACKEND_EXEC))
                 sys.exit(1)
-        postprocess = Popen(['python', os.path.join(sys.path[0], 'postprocess.py'), str(args.nbesttags)], stdin=tagging.stdout, stdout=sys.stdout)
+        # postprocessing runs in this process, while feature extraction and tagging run in the subprocesses
+        fobj_out = io.open(sys.stdout.fileno(), 'wb', buffering=IO_BUFFER_SIZE, closefd=False)
+        postprocess.write_lines(postprocess.postprocess_bytes(tagging.stdout, args.nbesttags), fobj_out)
+        tagging.wait()
+
+
+def main_labels_only(args, backend, e_in):
+    """tag input with the pipeline extract_features | CRF tool, where the CRF tool only outputs labels.
+    This process copies the input into the pipeline while keeping the tokens of each sentence in a queue,
+    and merges them with the labels (instead of reading the feature columns back from the CRF tool).
+    With --inprocess, features are extracted in this process."""
+
+    fobj_in = getattr(e_in, 'buffer', e_in)
+    sentences = queue.Queue()
+    tokens = postprocess.side_buffer(fobj_in, sentences)
+
+    try:
+        tagging = Popen(crf_command(args, backend, labels_only=True), stdin=PIPE, stdout=PIPE, cwd=root_directory)
+    except OSError as e:
+        if e.errno == 2:
+            sys.stderr.write('Error: Executable {0} not found. Please install {0} and/or adjust CRF_BACKEND_EXEC in the clevertagger config file.\n'.format(CRF_BACKEND_EXEC))
+            sys.exit(1)
+        raise
+
+    if args.inprocess:
+        def feed():
+            try:
+                smor = extract_features.SMORAnalyzer()
+                load_lexicon(args, smor)
+                smor.main((line.decode('UTF-8') for line in tokens), utf8_writer(tagging.stdin))
+            finally:
+                tokens.close()
+                tagging.stdin.close()
+    else:
+        extract = Popen(extract_command(args), stdin=PIPE, stdout=tagging.stdin)
+        tagging.stdin.close()
+
+        def feed():
+            try:
+                for line in tokens:
+                    extract.stdin.write(line)
+            except (IOError, OSError):
+                # extract_features.py died; the CRF tool gets no further input, and the merge stops early
+                pass
+            finally:
+                tokens.close()
+                try:
+                    extract.stdin.close()
+                except (IOError, OSError):
+                    pass
+
+    writer = threading.Thread(target=feed)
+    writer.daemon = True
+    writer.start()
+
+    fobj_out = io.open(sys.stdout.fileno(), 'wb', buffering=IO_BUFFER_SIZE, closefd=False)
+    postprocess.write_lines(postprocess.merge_labels(tagging.stdout, iter(sentences.get, None), args.nbesttags), fobj_out)
+    writer.join()
+    if tagging.wait():
+        sys.exit(1)
+
+
+def extract_command(args, load_lexicon=True):
+    """command line of extract_features.py"""
+    cmd = [os.path.join(sys.path[0], 'extract_features.py')]
+    if args.load_lexicon and load_lexicon:
+        cmd += ['--load-lexicon', args.load_lexicon]
+    return cmd
+
+
+def load_lexicon(args, smor):
+    """load precomputed analyses (--load-lexicon) into SMORAnalyzer smor"""
+    if args.load_lexicon:
+        with io.open(args.load_lexicon, encoding='UTF-8') as f:
+            smor.load_lexicon(f)
+
+
+def features_output(args):
+    """binary file object for the output of feature extraction (-o FILE or stdout), and compressor process (or None).
+    With compression, the file object is the stdin of the compressor, which writes to the output file."""
+
+    if args.output:
+        fobj_out = open(args.output, 'wb')
+    else:
+        fobj_out = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    if not output_compression(args):
+        return fobj_out, None
+
+    compressor = Popen(COMPRESS_COMMANDS[output_compression(args)], stdin=PIPE, stdout=fobj_out)
+    if args.output:
+        fobj_out.close()
+    return compressor.stdin, compressor
+
+
+def crf_command(args, backend, labels_only=False):
+    """command line of CRF tool for tagging; with labels_only, the tool only outputs labels (Wapiti and in-process decoder)"""
+
+    if backend == 'wapiti':
+        cmd = [CRF_BACKEND_EXEC, 'label', '-m', args.model]
+        if labels_only:
+            cmd += ['-l']
+        if args.nbestsents > 1:
+            cmd += ['-s', '-p', '-n', str(args.nbestsents)]
+    elif backend == 'crf++':
+        cmd = [CRF_BACKEND_EXEC, '-m', args.model]
+        if args.nbesttags > 1:
+            cmd += ['-v', '2']
+        elif args.nbestsents > 1:
+            cmd += ['-n', str(args.nbestsents)]
+    elif backend == 'python':
+        cmd = [sys.executable, os.path.join(sys.path[0], 'crf.py'), 'label', '-m', args.model]
+        if labels_only:
+            cmd += ['-l']
+        if args.nbesttags > 1:
+            cmd += ['-p']
+        elif args.nbestsents > 1:
+            cmd += ['-n', str(args.nbestsents)]
+    else:
+        sys.stderr.write('Error: invalid value \'{0}\' for option \'CRF_BACKEND\'\n'.format(CRF_BACKEND))
+        sys.exit(1)
+
+    return cmd
+
+
+def main_inprocess(args, backend, e_in):
+    """tag input in a single process: SMOR analysis and postprocessing are library calls.
+    With the in-process decoder, no subprocess (apart from the SMOR daemon) is used;
+    otherwise, features are written to the CRF tool by a separate thread, and its output is postprocessed while it is being produced."""
+
+    # on Python 3, sys.stdin and sys.stdout are text streams in the locale encoding; use their binary buffers
+    fobj_in = utf8_reader(getattr(e_in, 'buffer', e_in))
+    fobj_out = utf8_writer(getattr(sys.stdout, 'buffer', sys.stdout))
+
+    smor = extract_features.SMORAnalyzer()
+    try:
+        load_lexicon(args, smor)
+        if backend == 'python':
+            model = crf.CRFModel(args.model)
+            for batch in read_sentences(fobj_in):
+                smor.analyze(set(word for words in batch for word in words))
+                for words in batch:
+                    result = decode(model, [smor.feature_columns(word) for word in words], args.nbestsents, args.nbesttags)
+                    fobj_out.write(format_output(words, result, args.nbestsents, args.nbesttags) + '\n\n')
+
+        else:
+            try:
+                tagging = Popen(crf_command(args, backend), stdin=PIPE, stdout=PIPE, cwd=root_directory)
+            except OSError as e:
+                if e.errno == 2:
+                    sys.stderr.write('Error: Executable {0} not found. Please install {0} and/or adjust CRF_BACKEND_EXEC in the clevertagger config file.\n'.format(CRF_BACKEND_EXEC))
+                    sys.exit(1)
+                raise
+
+            def feed():
+                tagging_in = utf8_writer(tagging.stdin)
+                smor.main(fobj_in, tagging_in)
+                tagging_in.close()
+
+            writer = threading.Thread(target=feed)
+            writer.start()
+            for line in postprocess.postprocess(utf8_reader(tagging.stdout), args.nbesttags):
+                fobj_out.write(line + '\n')
+            writer.join()
+            tagging.wait()
+
+        fobj_out.flush()
+
+    finally:
+        smor.terminate()
+        # the wrappers would close sys.stdin/sys.stdout when they are garbage-collected
+        if sys.version_info >= (3, 0):
+            fobj_in.detach()
+            fobj_out.detach()
+
+
+def read_sentences(fobj, batch_size=1000):
+    """read input with one token per line (and empty lines between sentences), and yield batches of sentences (lists of words)"""
+
+    batch = []
+    words = []
+    for line in fobj:
+        linelist = line.split()
+        if linelist:
+            words.append(linelist[0])
+            continue
+        if words:
+            batch.append(words)
+            words = []
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+    if words:
+        batch.append(words)
+    if batch:
+        yield batch
+
+
+def utf8_reader(fobj):
+    """text stream (UTF-8) for reading from fobj, which may be a text or a binary file object"""
+    if sys.version_info < (3, 0):
+        return codecs.getreader('UTF-8')(fobj)
+    if isinstance(fobj, io.TextIOBase):
+        return fobj
+    return io.TextIOWrapper(fobj, encoding='UTF-8')
+
+
+def utf8_writer(fobj):
+    """text stream (UTF-8) for writing to fobj, which may be a text or a binary file object"""
+    if sys.version_info < (3, 0):
+        return codecs.getwriter('UTF-8')(fobj)
+    if isinstance(fobj, io.TextIOBase):
+        return fobj
+    return io.TextIOWrapper(fobj, encoding='UTF-8')
+
+
+class TaggingHandler(socketserver.StreamRequestHandler):
+    """Handle one client connection: a JSON line with options, followed by input in the usual format.
+    The response is a status line ('OK' or 'ERROR message'), followed by the output in the usual format.
+    Each connection is handled in its own thread, but all threads of a server process share one tagger,
+    which tags one batch (of 100 sentences) at a time; for parallel tagging, use several workers (--workers)."""
+
+    def handle(self):
+
+        fobj_in = utf8_reader(self.rfile)
+        fobj_out = utf8_writer(self.wfile)
+        tagger = self.server.tagger
+
+        try:
+            nbestsents, nbesttags = parse_options(fobj_in.readline())
+        except ValueError as e:
+            fobj_out.write('ERROR {0}\n'.format(e))
+            fobj_out.flush()
+            return
+
+        fobj_out.write('OK\n')
+        for batch in read_sentences(fobj_in, batch_size=100):
+            # several clients may be connected at the same time; they take turns using the tagger, batch by batch
+            with self.server.lock:
+                sentences = tagger.tag([' '.join(words) for words in batch], nbestsents, nbesttags)
+            for sentence in sentences:
+                fobj_out.write(sentence + '\n\n')
+            fobj_out.flush()
+
+
+def parse_options(line):
+    """return (nbestsents, nbesttags) from the options line of a client (a JSON object); raise ValueError if it is invalid"""
+
+    try:
+        options = json.loads(line)
+    except ValueError as e:
+        raise ValueError('options are not valid JSON ({0})'.format(e))
+    if not isinstance(options, dict):
+        raise ValueError('options must be a JSON object, not {0}'.format(line.strip() or 'an empty line'))
+
+    values = []
+    for name in ('nbestsents', 'nbesttags'):
+        value = options.get(name, 1)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError('option {0} must be a positive integer, not {1}'.format(name, json.dumps(value)))
+        values.append(value)
+
+    if values[0] > 1 and values[1] > 1:
+        raise ValueError('--nbesttags and --nbestsents are mutually exclusive options')
+    return tuple(values)
+
+
+class UnixTaggingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPTaggingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def parse_address(address):
+    """return (socket family, address) for 'localhost:PORT' or 'PORT' (TCP), or path of Unix domain socket"""
+    if re.match(r'^(localhost:)?\d+$', address):
+        return socket.AF_INET, ('localhost', int(address.split(':')[-1]))
+    return socket.AF_UNIX, address
+
+
+def serve(args, backend):
+    """load tagger once, and serve tagging requests until interrupted"""
+
+    if backend not in ('wapiti', 'python'):
+        sys.stderr.write('Error: --serve requires CRF_BACKEND \'wapiti\' or \'python\'\n')
+        sys.exit(1)
+
+    family, address = parse_address(args.serve)
+
+    # with several workers, each worker starts its own Wapiti process after forking
+    tagger = Clevertagger(backend=backend, model=args.model, defer_crf=args.workers > 1)
+
+    if family == socket.AF_UNIX:
+        if os.path.exists(address):
+            os.remove(address)
+        server = UnixTaggingServer(address, TaggingHandler)
+    else:
+        server = TCPTaggingServer(address, TaggingHandler)
+    server.tagger = tagger
+    server.lock = threading.Lock()
+
+    # shut down cleanly (and remove socket file) on SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    sys.stderr.write('clevertagger: listening at {0}\n'.format(args.serve))
+    try:
+        if args.workers > 1:
+            prefork(server, tagger, args.workers)
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+
+
+def prefork(server, tagger, n_workers):
+    """fork n_workers processes that accept connections on the listening socket of server.
+    The SMOR daemon, the lexicon and (with the in-process decoder) the model are loaded once by this process,
+    and shared copy-on-write with the workers. Memory use of each worker is reported at startup and on SIGUSR1."""
+
+    # objects that exist now are never touched by the garbage collector of the workers, so their pages stay shared
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    workers = {}
+    for i in range(n_workers):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                if tagger.tagger is None:
+                    tagger.start_crf()
+                server.serve_forever()
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                # skip cleanup of this process (SMOR daemon and socket belong to the parent)
+                os._exit(status)
+        workers[pid] = i
+
+    def report(signum=None, frame=None):
+        for pid, i in sorted(workers.items(), key=lambda item: item[1]):
+            usage = memory_usage(pid)
+            if usage is None:
+                sys.stderr.write('clevertagger: worker {0} (pid {1}): memory usage not available\n'.format(i, pid))
+            else:
+                sys.stderr.write('clevertagger: worker {0} (pid {1}): RSS {2:.1f} MB, PSS {3:.1f} MB\n'.format(i, pid, usage[0]/1024, usage[1]/1024))
+
+    signal.signal(signal.SIGUSR1, report)
+    report()
+
+    try:
+        while workers:
+            try:
+                pid, status = os.wait()
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if pid in workers:
+                sys.stderr.write('clevertagger: worker {0} (pid {1}) exited with status {2}\n'.format(workers.pop(pid), pid, status))
+        sys.exit(1)
+    finally:
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+        for pid in workers:
+            os.waitpid(pid, 0)
+
+
+def memory_usage(pid):
+    """return (RSS, PSS) of process in kB, or None if /proc/PID/smaps is not available (Linux only)"""
+
+    usage = {'Rss:': 0, 'Pss:': 0}
+    for path in ['/proc/{0}/smaps_rollup'.format(pid), '/proc/{0}/smaps'.format(pid)]:
+        try:
+            with open(path) as smaps:
+                for line in smaps:
+                    fields = line.split()
+                    if fields and fields[0] in usage:
+                        usage[fields[0]] += int(fields[1])
+        except (IOError, OSError):
+            continue
+        return usage['Rss:'], usage['Pss:']
+
+    return None
+
+
+def connect(args, e_in):
+    """send input to tagging server, and write its output to stdout"""
 
-        postprocess.wait()
+    family, address = parse_address(args.connect)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except socket.error as e:
+        sys.stderr.write('Error: cannot connect to clevertagger server at {0}: {1}\n'.format(args.connect, e))
+        sys.exit(1)
+
+    options = {'nbestsents': args.nbestsents, 'nbesttags': args.nbesttags}
+    sock.sendall(json.dumps(options).encode('UTF-8') + b'\n')
+
+    # send input in separate thread, so that large inputs do not block on a full socket buffer
+    def feed():
+        fobj_in = getattr(e_in, 'buffer', e_in)
+        try:
+            while True:
+                data = fobj_in.read(65536)
+                if not data:
+                    break
+                sock.sendall(data)
+            sock.shutdown(socket.SHUT_WR)
+        except socket.error:
+            # server closed connection (error is reported by main thread)
+            pass
+
+    writer = threading.Thread(target=feed)
+    writer.daemon = True
+    writer.start()
+
+    response = sock.makefile('rb')
+    status = response.readline().decode('UTF-8')
+    if not status.startswith('OK'):
+        sys.stderr.write('Error: {0}\n'.format(status[6:].strip() or 'connection closed by server'))
+        sys.exit(1)
+
+    fobj_out = getattr(sys.stdout, 'buffer', sys.stdout)
+    while True:
+        data = response.read(65536)
+        if not data:
+            break
+        fobj_out.write(data)
+    fobj_out.flush()
+    sock.close()
+
+
+def main_parallel(args, backend, e_in):
+    """tag input with args.jobs long-lived pipelines (extract_features | CRF tool | postprocess).
+    The input is split into chunks of sentences, which are distributed round-robin over the pipelines;
+    a separate thread reassembles the output in input order by counting sentences.
+    Each pipeline has at most two chunks of input queued, which bounds memory use.
+
+    With feature extraction (-e), the pipelines only consist of extract_features, and the output is written in input order
+    to the (optionally compressed) output file. With args.shards, args.shards pipelines (extract_features [| gzip/xz]) each write
+    their output to their own file instead, so each shard holds every N-th chunk of sentences.
+
+    With args.checkpoint, a checkpoint is saved after a chunk has been written (at most every args.checkpoint_interval seconds).
+    New words of the shared lexicon (if any) are saved with it."""
+
+    smor = None
+    shared_lexicon = None
+    compressor = None
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, args.resume, args.checkpoint_interval)
+    extract_cmd = extract_command(args, load_lexicon=not args.shared_lexicon)
+    if args.share_smor:
+        smor = extract_features.SMORAnalyzer()
+        extract_cmd += ['--port', str(smor.PORT)]
+    if args.shared_lexicon:
+        shared_lexicon = lexicon.SharedLexicon(size=args.shared_lexicon*1024*1024)
+        extract_cmd += ['--lexicon', shared_lexicon.name]
+        if args.load_lexicon:
+            # precomputed analyses are loaded once, and shared by all pipelines
+            with io.open(args.load_lexicon, encoding='UTF-8') as f:
+                shared_lexicon.load(f)
+        if checkpoint is not None:
+            shared_lexicon.load(checkpoint.lexicon_lines())
+
+    if args.e:
+        commands = [extract_cmd]
+    else:
+        commands = [extract_cmd,
+                    crf_command(args, backend),
+                    ['python', os.path.join(sys.path[0], 'postprocess.py'), str(args.nbesttags)]]
+    n_pipelines = args.jobs
+    if args.shards:
+        n_pipelines = args.shards
+        if output_compression(args):
+            commands.append(COMPRESS_COMMANDS[output_compression(args)])
+
+    fobj_in = getattr(e_in, 'buffer', e_in)
+    # offset of input that is read by split_sentences()
+    start_offset = 0
+    if checkpoint is not None:
+        start_offset = checkpoint.input_offset
+        skip_input(fobj_in, start_offset)
+        fobj_out = checkpoint.open_output(args.output, IO_BUFFER_SIZE)
+    elif args.e and not args.shards:
+        fobj_out, compressor = features_output(args)
+    else:
+        fobj_out = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    # (pipeline, number of sentences, input offset after the chunk) for each chunk, in input order
+    order = queue.Queue()
+    errors = []
+
+    def write_output():
+        # words of the shared lexicon before this offset (of its data area) have been saved with a checkpoint
+        lexicon_offset = 0
+        if checkpoint is not None and shared_lexicon is not None:
+            lexicon_offset = shared_lexicon.items()[1]
+        try:
+            input_offset = None
+            while True:
+                item = order.get()
+                if item is None:
+                    break
+                pipeline, n_sentences, input_offset = item
+                fobj_out.write(pipeline.receive(n_sentences))
+                if checkpoint is not None and checkpoint.due():
+                    if shared_lexicon is not None:
+                        entries, lexicon_offset = shared_lexicon.items(lexicon_offset)
+                        checkpoint.add_lexicon(entries)
+                    checkpoint.save(start_offset + input_offset, fobj_out)
+            fobj_out.flush()
+            if checkpoint is not None and input_offset is not None:
+                if shared_lexicon is not None:
+                    checkpoint.add_lexicon(shared_lexicon.items(lexicon_offset)[0])
+                checkpoint.save(start_offset + input_offset, fobj_out, force=True)
+        except PipelineError as e:
+            errors.append(e)
+        finally:
+            if checkpoint is not None or (args.e and (args.output or compressor is not None)):
+                fobj_out.close()
+
+    pipelines = []
+    try:
+        for i in range(n_pipelines):
+            if args.shards:
+                with open(shard_path(args.output, i, output_compression(args)), 'wb') as shard:
+                    pipelines.append(Pipeline(commands, stdout=shard))
+            else:
+                pipelines.append(Pipeline(commands, args.nbestsents > 1))
+
+        writer = threading.Thread(target=write_output)
+        writer.start()
+
+        for i, (chunk, n_sentences, offset) in enumerate(split_sentences(fobj_in, args.chunk_size)):
+            if errors:
+                break
+            pipeline = pipelines[i % n_pipelines]
+            pipeline.send(chunk)
+            if not args.shards:
+                order.put((pipeline, n_sentences, offset))
+
+        for pipeline in pipelines:
+            pipeline.close()
+        order.put(None)
+        writer.join()
+
+        if not errors:
+            for pipeline in pipelines:
+                try:
+                    pipeline.wait()
+                except PipelineError as e:
+                    errors.append(e)
+        if compressor is not None and compressor.wait():
+            errors.append(PipelineError('{0} exited with return code {1}'.format(command_name(COMPRESS_COMMANDS[output_compression(args)]), compressor.returncode)))
+
+    finally:
+        for pipeline in pipelines:
+            pipeline.kill()
+        if smor is not None:
+            smor.terminate()
+        if shared_lexicon is not None:
+            shared_lexicon.unlink()
+            shared_lexicon.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    if errors:
+        sys.stderr.write('Error: {0}\n'.format(errors[0]))
+        sys.exit(1)
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Pipeline(object):
+    """A chain of processes that is fed chunks of input by one thread, and whose output is split into sentences by another thread.
+    Sentences are blocks of non-empty lines; with nbestsents, a sentence consists of all blocks up to the next one that does not start with '#N ' (N > 0).
+    If stdout (a file object) is given, the last process writes its output there instead, and receive() cannot be used."""
+
+    def __init__(self, commands, nbestsents=False, stdout=None):
+
+        self.commands = commands
+        self.nbestsents = nbestsents
+        self.processes = []
+        stdin = PIPE
+        for i, cmd in enumerate(commands):
+            last = i == len(commands) - 1
+            self.processes.append(Popen(cmd, stdin=stdin, stdout=stdout if last and stdout is not None else PIPE, cwd=root_directory))
+            if stdin is not PIPE:
+                stdin.close()
+            stdin = self.processes[-1].stdout
+
+        self.chunks = queue.Queue(maxsize=2)
+        self.sentences = queue.Queue()
+        self.threads = [threading.Thread(target=self._feed)]
+        if stdout is None:
+            self.threads.append(threading.Thread(target=self._read))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def send(self, chunk):
+        self.chunks.put(chunk)
+
+    def close(self):
+        """no more input"""
+        self.chunks.put(None)
+
+    def receive(self, n):
+        """return output of the next n sentences (bytes); raise PipelineError if the pipeline ends early"""
+        out = []
+        for i in range(n):
+            sentence = self.sentences.get()
+            if sentence is None:
+                self.sentences.put(None)
+                self.wait()
+                raise PipelineError('pipeline ({0}) ended before all sentences were tagged'.format(self.description()))
+            out.append(sentence)
+        return b''.join(out)
+
+    def wait(self):
+        """wait for all processes to end; raise PipelineError if one of them failed"""
+        failed = ['{0} exited with return code {1}'.format(command_name(cmd), process.returncode)
+                  for cmd, process in zip(self.commands, self.processes) if process.wait()]
+        if failed:
+            raise PipelineError('; '.join(failed))
+
+    def kill(self, timeout=5):
+        """give processes timeout seconds to end after their input is closed, then terminate them"""
+        deadline = time.time() + timeout
+        for process in self.processes:
+            while process.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+
+    def description(self):
+        return ' | '.join(command_name(cmd) for cmd in self.commands)
+
+    def _feed(self):
+        stdin = self.processes[0].stdin
+        failed = False
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            if failed:
+                # keep consuming chunks, so that send() does not block
+                continue
+            try:
+                stdin.write(chunk)
+            except (IOError, OSError):
+                # process died; this is reported by receive() and wait()
+                failed = True
+        try:
+            stdin.close()
+        except (IOError, OSError):
+            pass
+
+    def _read(self):
+        sentence = []
+        for block in read_blocks(self.processes[-1].stdout):
+            # further analyses of the same sentence start with '#1 ', '#2 ' etc.
+            if sentence and not (self.nbestsents and block.startswith(b'#') and not block.startswith(b'#0 ')):
+                self.sentences.put(b''.join(sentence))
+                sentence = []
+            sentence += [block, b'\n']
+        if sentence:
+            self.sentences.put(b''.join(sentence))
+        self.sentences.put(None)
+
+
+def read_blocks(fobj):
+    """yield blocks of non-empty lines (bytes, including line breaks) from fobj"""
+    block = []
+    for line in fobj:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield b''.join(block)
+            block = []
+    if block:
+        if not block[-1].endswith(b'\n'):
+            block[-1] += b'\n'
+        yield b''.join(block)
+
+
+def command_name(cmd):
+    """short name of command line for messages"""
+    if cmd[0] == 'python':
+        return os.path.basename(cmd[1])
+    return os.path.basename(cmd[0])
+
+
+def input_compression(fobj):
+    """compression method ('gzip' or 'xz') of input file, detected by its first bytes.
+    Returns None if the file is not compressed, or if it is not a regular file (stdin and pipes are not checked)."""
+    name = getattr(fobj, 'name', None)
+    try:
+        if not os.path.isfile(name):
+            return None
+    except TypeError:
+        return None
+    with open(name, 'rb') as f:
+        head = f.read(6)
+    for method, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return method
+    return None
+
+
+def output_compression(args):
+    """compression method of feature extraction output: --compress, or suffix of output file (.gz or .xz)"""
+    if args.compress:
+        return args.compress
+    for method, suffix in COMPRESSION_SUFFIXES.items():
+        if args.output and args.output.endswith(suffix):
+            return method
+    return None
+
+
+def shard_path(path, i, compression=None):
+    """path of i-th shard of output file path; the shard number goes before the suffix of the compression method"""
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
+    if suffix and path.endswith(suffix):
+        path = path[:-len(suffix)]
+    else:
+        suffix = ''
+    return '{0}.{1:03d}{2}'.format(path, i, suffix)
+
+
+def split_sentences(fobj, chunk_size):
+    """read input with one token per line (and empty lines between sentences) as bytes,
+    and yield (chunk, number of sentences, number of bytes read) for chunks of chunk_size sentences. Each chunk ends with an empty line."""
+
+    chunk = []
+    sentences = 0
+    offset = 0
+    in_sentence = False
+    for line in fobj:
+        offset += len(line)
+        if line.strip():
+            chunk.append(line)
+            in_sentence = True
+            continue
+        if not in_sentence:
+            continue
+        chunk.append(b'\n')
+        in_sentence = False
+        sentences += 1
+        if sentences >= chunk_size:
+            yield b''.join(chunk), sentences, offset
+            chunk = []
+            sentences = 0
+
+    if in_sentence:
+        if not chunk[-1].endswith(b'\n'):
+            chunk[-1] += b'\n'
+        chunk.append(b'\n')
+        sentences += 1
+    if sentences:
+        yield b''.join(chunk), sentences, offset
+
+
+# return modes of Clevertagger.tag()
+OUTPUT_MODES = ('string', 'tuples', 'arrays')
 
 
 class Clevertagger(object):
     """This class initializes a persistent object with the clevertagger model. It exposes one method tag() which can be called repeatedly.
-    This currently only supports a subset of options (1-best tagging with Wapiti and tokenized input)
+    This currently only supports a subset of options (Wapiti or the in-process decoder, and tokenized input).
+    N-best tagging (nbestsents / nbesttags) always uses the in-process decoder;
+    with backend='wapiti', the model is loaded a second time for this on first use.
 
     usage example:
 
@@ -118,8 +1048,11 @@ class Clevertagger(object):
 
     for sentence in tagger.tag(['Das ist ein Test .', 'Das auch .']):
         print sentence + '\n'
+
+    cache can be a TaggingCache object (which may be shared between taggers), or a size in bytes
+    to create a new cache of tagged sentences.
     """
-    def __init__(self):
+    def __init__(self, backend=CRF_BACKEND, model=CRF_MODEL, cache=None, defer_crf=False):
 
         try:
             self.smor = extract_features.SMORAnalyzer()
@@ -127,72 +1060,295 @@ class Clevertagger(object):
             self.smor = None
             raise
 
-        if CRF_BACKEND == 'wapiti':
-            tagger_args = ['label', '-m', CRF_MODEL]
+        if backend not in ('python', 'wapiti'):
+            sys.stderr.write('Error: unsupported value \'{0}\' for option \'CRF_BACKEND\'\n'.format(backend))
+            sys.exit(1)
+
+        self.backend = backend
+        self.model = model
+        self._decoder = None
+        self.tagger = None
+        # with defer_crf, Wapiti is only started by start_crf() (e.g. in each worker process after forking)
+        if backend == 'python' or not defer_crf:
+            self.start_crf()
+
+        if cache and not isinstance(cache, TaggingCache):
+            cache = TaggingCache(cache)
+        self.cache = cache
+        # cached results are only valid for the same CRF model and SMOR transducer; the signature is part of each cache key,
+        # so that taggers with different models can share a cache
+        self.signature = repr((backend, file_signature(model), file_signature(SMOR_MODEL)))
+
+        # if this is a dict, tag() adds the seconds spent in each stage (analysis, features, crf, output) to it (see evaluate.py)
+        self.timings = None
+
+    def tag(self, text, nbestsents=1, nbesttags=1, output='string', posset=False):
+        """tag some text. Input must be list of tokenized sentences.
+        With nbestsents > 1, each output sentence contains the N best analyses (each preceded by '#rank probability');
+        with nbesttags > 1, each token is followed by its N most probable tags and their marginal probabilities.
+
+        output='string' returns one string per sentence ('word\ttag' lines).
+        output='tuples' returns one list of (word, tag) tuples per sentence, and output='arrays' one pair of lists (words, tags).
+        With posset=True, the sorted list of candidate tags from the morphological analysis is added as third element.
+        In structured modes, a tag is a list of (tag, probability) pairs if nbesttags > 1,
+        and each sentence is a list of (probability, analysis) pairs if nbestsents > 1."""
+
+        return list(self._tag_batch(text, nbestsents, nbesttags, output, posset))
+
+    def tag_iter(self, text, batch_size=100, nbestsents=1, nbesttags=1, output='string', posset=False):
+        """tag sentences from an iterable of tokenized sentences (e.g. a file object with one sentence per line),
+        and yield each tagged sentence as soon as it is decoded. Input is consumed lazily in batches of batch_size sentences,
+        so memory use does not grow with the size of the input (apart from the lexicon of analyzed words)."""
+
+        batch = []
+        for sentence in text:
+            batch.append(sentence)
+            if len(batch) >= batch_size:
+                for sentence_out in self._tag_batch(batch, nbestsents, nbesttags, output, posset):
+                    yield sentence_out
+                batch = []
+
+        for sentence_out in self._tag_batch(batch, nbestsents, nbesttags, output, posset):
+            yield sentence_out
+
+    def _tag_batch(self, text, nbestsents, nbesttags, output, posset):
+        """analyze all words of a batch of sentences with SMOR, then tag and yield sentences one by one"""
+
+        if nbesttags > 1 and nbestsents > 1:
+            raise ValueError('nbesttags and nbestsents are mutually exclusive')
+        if output not in OUTPUT_MODES:
+            raise ValueError('invalid output mode \'{0}\'. Options: {1}'.format(output, ', '.join(OUTPUT_MODES)))
+
+        text = [sentence.split() for sentence in text]
+        if not text:
+            return
+
+        cache = self.cache
+        results = [None]*len(text)
+        if cache is not None:
+            for i, sentence in enumerate(text):
+                if sentence:
+                    results[i] = cache.get(cache.key(sentence, nbestsents, nbesttags, self.signature))
+
+        timings = self.timings is not None
+        if timings:
+            start = timer()
+
+        # preprocessing: extract features from SMOR (for sentences that are not cached)
+        self.smor.analyze(set(word for sentence, result in zip(text, results) if result is None or posset for word in sentence))
+        if timings:
+            start = self._lap('analysis', start)
+
+        for sentence, result in zip(text, results):
+            if not sentence:
+                continue
+
+            if result is not None:
+                pass
+            elif self.backend == 'python' or nbestsents > 1 or nbesttags > 1:
+                columns = [self.smor.feature_columns(word) for word in sentence]
+                if timings:
+                    start = self._lap('features', start)
+                result = decode(self.decoder(), columns, nbestsents, nbesttags)
+            else:
+                # main tagging step with wapiti, which only outputs the tags (-l)
+                preprocessed = ''.join(self.smor.create_features(word) for word in sentence)
+                if timings:
+                    start = self._lap('features', start)
+                result = tag_sentence(self.tagger, preprocessed)
+            if timings:
+                start = self._lap('crf', start)
+
+            if cache is not None:
+                cache.put(cache.key(sentence, nbestsents, nbesttags, self.signature), result)
+
+            possets = None
+            if posset:
+                possets = [self.smor.candidates(word) for word in sentence]
+
+            formatted = format_output(sentence, result, nbestsents, nbesttags, output, possets)
+            if timings:
+                self._lap('output', start)
+            yield formatted
+            # time spent by the caller between sentences is not counted
+            if timings:
+                start = timer()
+
+    def _lap(self, stage, start):
+        """add time since start to stage in self.timings; return current time"""
+        now = timer()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - start
+        return now
+
+    def start_crf(self):
+        """load model (in-process decoder), or start Wapiti"""
+        if self.backend == 'python':
+            self.tagger = crf.CRFModel(self.model)
+        else:
+            tagger_args = ['label', '-m', self.model, '-l']
             self.tagger = pexpect.spawn(CRF_BACKEND_EXEC, tagger_args, echo=False, encoding='utf-8')
             self.tagger.delaybeforesend = 0
 
             # get some initial output
             self.tagger.expect_exact('* Load model\r\n* Label sequences\r\n')
-        else:
-            sys.stderr.write('Error: unsupported value \'{0}\' for option \'CRF_BACKEND\'\n'.format(CRF_BACKEND))
-            sys.exit(1)
 
-    def tag(self, text):
-        """tag some text. Input must be list of tokenized sentences."""
+    def decoder(self):
+        """in-process decoder (crf.CRFModel) for the model of this tagger"""
+        if self.backend == 'python':
+            return self.tagger
+        if self._decoder is None:
+            self._decoder = crf.CRFModel(self.model)
+        return self._decoder
 
-        text = [sentence.split() for sentence in text]
+    def __del__(self):
+
+        if self.smor is not None:
+            self.smor.terminate()
 
-        # preprocessing: extract features from SMOR
-        self.smor.analyze(set(word for sentence in text for word in sentence))
 
-        preprocessed = []
-        for sentence in text:
-            words = []
-            for word in sentence:
-                words.append(self.smor.create_features(word))
-            preprocessed.append(''.join(words))
-
-        # main tagging step with wapiti
-        sentences = process_by_sentence(self.tagger, preprocessed)
-
-        # postprocessing: strip features and only keep input / tag
-        sentences_out = []
-        for sentence in sentences:
-            sentence_out = []
-            for line in sentence:
-                items = line.split()
-                word = items[0]
-                tag = items[14]
-                sentence_out.append(word + '\t' + tag)
-            sentences_out.append('\n'.join(sentence_out))
-
-        return sentences_out
+class TaggingCache(object):
+    """Bounded LRU cache of tagging results, keyed by a hash of the token sequence, n-best options and model signature.
+    Useful for input with many repeated sentences (boilerplate, headlines, bylines).
+    The size limit (in bytes) is based on an estimate of the memory used by each entry.
+    Results are stored as nested tuples (see frozen()), so that callers cannot modify cached entries."""
 
-    def __del__(self):
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-        if self.smor is not None:
-            self.smor.p_server.terminate()
+    def key(self, words, nbestsents=1, nbesttags=1, signature=''):
+        """cache key for sentence (list of words); signature identifies the models that produced the result"""
+        text = '\n'.join(words) + '\t{0}\t{1}\t{2}'.format(nbestsents, nbesttags, signature)
+        return hashlib.sha1(text.encode('UTF-8')).digest()
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, result):
+        if key in self.entries:
+            return
+        result = frozen(result)
+        size = estimate_size(key) + estimate_size(result)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (result, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, (old_result, old_size) = self.entries.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def frozen(obj):
+    """immutable copy of obj (nested lists/tuples of strings and numbers), with all lists converted to tuples"""
+    if isinstance(obj, (list, tuple)):
+        return tuple(frozen(item) for item in obj)
+    return obj
+
+
+def estimate_size(obj):
+    """estimate memory used by obj (nested lists/tuples of strings and numbers).
+    Strings are always counted, even if they are shared (like the tags of the in-process decoder), so the estimate errs on the high side."""
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(item) for item in obj)
+    elif isinstance(obj, (bytes, type(''), float)):
+        return sys.getsizeof(obj)
+    return 0
+
+
+def file_signature(path):
+    """(path, size, modification time) of file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_size, stat.st_mtime)
+
+
+def decode(model, sequence, nbestsents=1, nbesttags=1):
+    """tag one sentence (list of feature column lists) with the in-process decoder.
+    Returns list of tags; with nbesttags > 1, list of (tag, probability) lists;
+    with nbestsents > 1, list of (probability, list of tags) pairs."""
 
-def process_by_sentence(processor, sentences):
-    sentences_out = []
-    for sentence in sentences:
-        if not sentence:
+    labels = model.labels
+    lattice = model.lattice(sequence)
+
+    if nbestsents > 1:
+        log_z = lattice.log_partition()
+        return [(exp(score - log_z), [labels[y] for y in path]) for score, path in lattice.nbest(nbestsents)]
+
+    elif nbesttags > 1:
+        marginals, log_z = lattice.forward_backward()
+        tags = []
+        for probs in marginals:
+            nbest = heapq.nlargest(nbesttags, range(len(labels)), key=probs.__getitem__)
+            tags.append([(labels[y], probs[y]) for y in nbest])
+        return tags
+
+    score, path = lattice.viterbi()
+    return [labels[y] for y in path]
+
+
+def format_output(words, result, nbestsents=1, nbesttags=1, output='string', possets=None):
+    """format result of decode() for one sentence in output mode 'string', 'tuples' or 'arrays'.
+    Structured output never shares lists with result, which may be an entry of a TaggingCache."""
+
+    if nbestsents > 1:
+        analyses = [(prob, format_output(words, tags, output=output, possets=possets)) for prob, tags in result]
+        if output == 'string':
+            return '\n\n'.join('#{0} {1:.6f}\n{2}'.format(i, prob, analysis) for i, (prob, analysis) in enumerate(analyses))
+        return analyses
+
+    if output == 'string':
+        if nbesttags > 1:
+            result = ['\t'.join('{0}/{1:.6f}'.format(tag, prob) for tag, prob in tags) for tags in result]
+        return '\n'.join(word + '\t' + tag for word, tag in zip(words, result))
+
+    if nbesttags > 1:
+        result = [list(tags) for tags in result]
+    columns = [list(words), list(result)]
+    if possets is not None:
+        columns.append(list(possets))
+
+    if output == 'arrays':
+        return tuple(columns)
+    return list(zip(*columns))
+
+
+def tag_sentence(processor, sentence):
+    """send one preprocessed sentence to CRF tool (pexpect process), and return list of output lines"""
+    words = []
+    processor.send(sentence + '\n')
+    while True:
+        word = processor.readline().strip()
+        # hack for Wapiti stderr
+        if word.endswith('sequences labeled'):
             continue
-        words = []
-        processor.send(sentence + '\n')
-        while True:
-            word = processor.readline().strip()
-            # hack for Wapiti stderr
-            if word.endswith('sequences labeled'):
-                continue
-            elif word:
-                words.append(word)
-            else:
-                break
-        sentences_out.append(words)
+        elif word:
+            words.append(word)
+        else:
+            break
 
-    return sentences_out
+    return words
 
 if __name__ == '__main__':
     args = parse_command_line()
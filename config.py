@@ -17,12 +17,17 @@ PORT = 9010         # The default port; if busy, port will be incremented by 1 u
 GERTWOL_BIN = '/opt/bin/uis-gertwol'
 
 # Two CRF tools are currently supported: CRF++ and Wapiti
-# Options: 'crf++', 'wapiti'
+# Alternatively, 'python' uses the in-process decoder in crf.py, which reads Wapiti models and CRF++ text models (crf_learn -t),
+# and supports n-best tagging on both sentence and token level.
+# Options: 'crf++', 'wapiti', 'python'
 CRF_BACKEND = 'wapiti'
 
 # executable file of CRF tool (typically 'wapiti' for wapiti, and 'crf_test' for crf++.
 # may be relative path to clevertagger directory
 CRF_BACKEND_EXEC = 'wapiti'
 
+# buffer size (in bytes) for reading and writing in extract_features.py and postprocess.py
+IO_BUFFER_SIZE = 1048576
+
 # location of the trained model (see README for training instructions)
 CRF_MODEL = 'crfmodel'
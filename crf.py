@@ -0,0 +1,857 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# In-process linear-chain CRF decoder for models trained with Wapiti or CRF++ (text format).
+# It supports 1-best (Viterbi) decoding, n-best decoding and per-token tag marginals (forward-backward),
+# and can replace the CRF tool in the clevertagger pipeline:
+# python crf.py label -m MODEL [-n N | -p] < FEATURE_FILE
+
+from __future__ import unicode_literals, print_function, division
+import os
+import sys
+import re
+import io
+import heapq
+import codecs
+import mmap
+import struct
+import time
+import argparse
+import tempfile
+from math import exp, log
+from array import array
+
+#regex to find macros in feature templates (only %x[row,col] is supported)
+re_macro = re.compile(r'%x\[\s*(-?\d+)\s*,\s*(\d+)\s*\]')
+
+# binary model format (see write_binary): magic string, followed by header fields
+BINARY_MAGIC = b'CLVCRF01'
+BINARY_HEADER = struct.Struct(str('<8s14Q'))
+
+
+def require_binary_support():
+    """binary models are memory-mapped through memoryview.cast(), which requires Python >= 3.3"""
+    if sys.version_info < (3, 3):
+        raise RuntimeError('binary CRF models require Python >= 3.3 (text models can be used with Python 2)')
+
+
+class CRFModel(object):
+    """Linear-chain CRF model loaded from a Wapiti model file, a CRF++ text model (crf_learn -t),
+    or a binary model (crf.py convert), which is memory-mapped rather than read.
+    Feature templates are taken from the model, unless a template file (crf_config) is given."""
+
+    def __init__(self, path, templates=None):
+
+        self.labels = []
+        self.patterns = []
+
+        # observation strings are interned to integer feature IDs; the weights of feature i are
+        # self.wgt[self.offsets[i]:self.offsets[i+1]], with label indices in self.lbl.
+        # For unigram observations, self.lbl holds the label index;
+        # for bigram observations, it holds previous_label * len(labels) + label.
+        self.unigrams = {}
+        self.bigrams = {}
+        self.offsets = array(str('i'), [0])
+        self.lbl = array(str('i'))
+        self.wgt = array(str('d'))
+
+        # per-label scale factors if weights are quantized (see write_binary); the score of label y is scales[y] * sum(weights)
+        self.scales = None
+
+        self._transitions = {}
+
+        with open(path, 'rb') as model_file:
+            first_line = model_file.readline()
+            if first_line.startswith(BINARY_MAGIC):
+                self.load_binary(model_file)
+            elif first_line.startswith(b'#mdl#'):
+                self.boundary = '_x'
+                self.load_wapiti(model_file)
+            elif first_line.startswith(b'version:'):
+                self.boundary = '_B'
+                self.load_crfpp(model_file)
+            else:
+                raise ValueError('{0}: unknown model format. CRF++ models need to be saved in text format (crf_learn -t).'.format(path))
+
+        self.label_ids = dict((label, i) for i, label in enumerate(self.labels))
+
+        if templates is None:
+            plan = TemplatePlan(self.patterns, self.boundary)
+        else:
+            plan = TemplatePlan.from_file(templates, self.boundary)
+        self.index = FeatureIndex(self, plan)
+
+
+    def load_wapiti(self, model_file):
+        """read model in Wapiti text format (header line already consumed)"""
+
+        def read_quark(header):
+            if not header.startswith(b'#qrk#'):
+                raise ValueError('invalid Wapiti model: expected quark, got {0!r}'.format(header))
+            return [read_string(model_file.readline()) for i in range(int(header[5:]))]
+
+        # reader header: '#rdr#npats/ntoks[/autouni]'
+        header = model_file.readline()
+        npats = int(header[5:].split(b'/')[0])
+        self.patterns = [read_string(model_file.readline()) for i in range(npats)]
+        self.labels = read_quark(model_file.readline())
+        observations = read_quark(model_file.readline())
+
+        # Wapiti assigns feature indices in order of observations: Y for unigrams, Y*Y for bigrams
+        Y = len(self.labels)
+        uoff = [None]*len(observations)
+        boff = [None]*len(observations)
+        nftr = 0
+        for o, obs in enumerate(observations):
+            kind = obs[0].lower()
+            if kind in 'u*':
+                uoff[o] = nftr
+                nftr += Y
+            if kind in 'b*':
+                boff[o] = nftr
+                nftr += Y*Y
+
+        weights = {}
+        for line in model_file:
+            line = line.strip()
+            if not line:
+                continue
+            f, weight = line.split(b'=')
+            weights[int(f)] = float.fromhex(weight.decode('ascii'))
+
+        for o, obs in enumerate(observations):
+            if uoff[o] is not None:
+                self._add(self.unigrams, normalize(obs), weights, uoff[o], Y)
+            if boff[o] is not None:
+                self._add(self.bigrams, normalize(obs), weights, boff[o], Y*Y)
+
+
+    def load_crfpp(self, model_file):
+        """read model in CRF++ text format (first header line already consumed)"""
+
+        cost_factor = 1.0
+        for line in model_file:
+            line = line.strip()
+            if not line:
+                break
+            if line.startswith(b'cost-factor:'):
+                cost_factor = float(line.split()[1])
+
+        sections = []
+        for i in range(3):
+            section = []
+            for line in model_file:
+                line = line.rstrip(b'\r\n')
+                if not line:
+                    break
+                section.append(line.decode('UTF-8'))
+            sections.append(section)
+
+        self.labels, templates, features = sections
+        self.patterns = templates
+        features = [line.split(' ', 1) for line in features]
+
+        weights = {}
+        for f, line in enumerate(model_file):
+            weight = float(line)
+            if weight:
+                weights[f] = weight*cost_factor
+
+        Y = len(self.labels)
+        for offset, obs in features:
+            if obs.startswith('U'):
+                self._add(self.unigrams, normalize(obs), weights, int(offset), Y)
+            elif obs.startswith('B'):
+                self._add(self.bigrams, normalize(obs), weights, int(offset), Y*Y)
+
+
+    def load_binary(self, model_file):
+        """map model in binary format. Feature tables and weights stay in the page cache and are shared between processes."""
+
+        require_binary_support()
+        self._mmap = mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, n_labels, n_patterns, n_unigrams, n_bigrams, lbl_size, wgt_size,
+         meta_start, unigram_start, bigram_start, offsets_start, lbl_start, scales_start, wgt_start, end) = BINARY_HEADER.unpack_from(self._mmap)
+
+        meta = self._mmap[meta_start:unigram_start].rstrip(b'\0').decode('UTF-8').split('\n')
+        self.boundary = meta[0]
+        self.labels = meta[1:1+n_labels]
+        self.patterns = meta[1+n_labels:1+n_labels+n_patterns]
+
+        self.unigrams = SortedTable(self._mmap, unigram_start, n_unigrams, 0)
+        self.bigrams = SortedTable(self._mmap, bigram_start, n_bigrams, n_unigrams)
+
+        n_weights = (end - wgt_start) // wgt_size
+        self.offsets = typed_view(self._mmap, offsets_start, lbl_start, 'Q')
+        self.lbl = typed_view(self._mmap, lbl_start, lbl_start + n_weights*lbl_size, 'H' if lbl_size == 2 else 'I')
+        self.wgt = typed_view(self._mmap, wgt_start, end, {8: 'd', 2: 'h', 1: 'b'}[wgt_size])
+        if wgt_start > scales_start:
+            self.scales = list(typed_view(self._mmap, scales_start, wgt_start, 'd'))
+
+
+    def _add(self, table, obs, weights, offset, size):
+        """intern observation with non-zero weights in [offset, offset+size)"""
+        start = len(self.lbl)
+        for i in range(size):
+            weight = weights.get(offset+i)
+            if weight:
+                self.lbl.append(i)
+                self.wgt.append(weight)
+        if len(self.lbl) > start:
+            table[obs] = len(self.offsets) - 1
+            self.offsets.append(len(self.lbl))
+
+
+    def add_unary(self, scores, feature):
+        """add weights of unigram feature ID to list of label scores"""
+        lbl, wgt = self.lbl, self.wgt
+        for i in range(self.offsets[feature], self.offsets[feature+1]):
+            scores[lbl[i]] += wgt[i]
+
+
+    def transition(self, features):
+        """sum of bigram weights for tuple of bigram feature IDs, as Y*Y matrix indexed by [previous_label][label]"""
+
+        if features not in self._transitions:
+            Y = len(self.labels)
+            flat = [0.0]*(Y*Y)
+            for feature in features:
+                for i in range(self.offsets[feature], self.offsets[feature+1]):
+                    flat[self.lbl[i]] += self.wgt[i]
+            if self.scales is not None:
+                flat = [score*self.scales[d % Y] for d, score in enumerate(flat)]
+            self._transitions[features] = Transition([flat[yp*Y:(yp+1)*Y] for yp in range(Y)])
+        return self._transitions[features]
+
+
+    def lattice(self, sequence):
+        """build score lattice for sequence (list of column lists)"""
+        return self.index.lattice(sequence)
+
+
+class SortedTable(object):
+    """Read-only mapping from observation string to feature ID, stored as sorted string table in a memory-mapped file.
+    Layout at start: (n+1) uint64 string offsets (relative to the string data that follows), then the UTF-8 string data.
+    The string at position i has feature ID base+i.
+    Results of lookups (including misses) are memoized in a dict of up to cache_size entries, which is private to each process;
+    the binary search compares byte slices, and costs several times as much as a dict lookup."""
+
+    def __init__(self, buf, start, n, base, cache_size=500000):
+        self.buf = buf
+        self.n = n
+        self.base = base
+        self.offsets = typed_view(buf, start, start + 8*(n+1), 'Q')
+        self.data = start + 8*(n+1)
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def __len__(self):
+        return self.n
+
+    def get(self, key, default=None):
+        try:
+            value = self.cache[key]
+        except KeyError:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            value = self.cache[key] = self.search(key)
+        return default if value is None else value
+
+    def search(self, key):
+        """feature ID of key (binary search in the string table), or None"""
+        key = key.encode('UTF-8')
+        buf, offsets, data = self.buf, self.offsets, self.data
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if buf[data+offsets[mid]:data+offsets[mid+1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n and buf[data+offsets[lo]:data+offsets[lo+1]] == key:
+            return self.base + lo
+        return None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        buf, offsets, data = self.buf, self.offsets, self.data
+        for i in range(self.n):
+            yield buf[data+offsets[i]:data+offsets[i+1]].decode('UTF-8')
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+class Template(object):
+    """A compiled feature template: literal parts interleaved with (offset, column) references"""
+
+    def __init__(self, pattern, boundary):
+
+        self.pattern = normalize(pattern)
+        self.kind = self.pattern[0]
+        if self.kind not in 'ub*':
+            raise ValueError('invalid feature template: {0}'.format(pattern))
+        if '%' in re_macro.sub('', self.pattern):
+            raise ValueError('unsupported macro in feature template: {0}'.format(pattern))
+
+        parts = re_macro.split(self.pattern)
+        self.literals = parts[0::3]
+        self.refs = [(int(offset), int(column)) for offset, column in zip(parts[1::3], parts[2::3])]
+        self.boundary = boundary
+
+        # templates that only look at the current token can be cached per word type
+        self.static = all(offset == 0 for offset, column in self.refs)
+
+
+    def expand(self, sequence, t):
+        """return observation string for position t of sequence"""
+
+        out = [self.literals[0]]
+        for (offset, column), literal in zip(self.refs, self.literals[1:]):
+            pos = t + offset
+            if pos < 0:
+                out.append('{0}-{1}'.format(self.boundary, -pos))
+            elif pos >= len(sequence):
+                out.append('{0}+{1}'.format(self.boundary, pos-len(sequence)+1))
+            else:
+                out.append(sequence[pos][column])
+            out.append(literal)
+        return ''.join(out)
+
+
+class TemplatePlan(object):
+    """Feature templates (as in crf_config), compiled and grouped by how they can be evaluated"""
+
+    def __init__(self, patterns, boundary='_x'):
+
+        self.templates = [Template(pattern, boundary) for pattern in patterns]
+
+        unigrams = [template for template in self.templates if template.kind in 'u*']
+        bigrams = [template for template in self.templates if template.kind in 'b*']
+
+        # unigram templates that depend on the current token only (U02, U07, U08-U10 in crf_config)
+        self.word_unigrams = [template for template in unigrams if template.static]
+        # unigram templates that depend on neighboring tokens (U00, U01, U03-U06)
+        self.context_unigrams = [template for template in unigrams if not template.static]
+        # columns of the current token that determine word_unigrams; used as cache key
+        self.word_columns = sorted(set(column for template in self.word_unigrams for offset, column in template.refs))
+
+        self.constant_bigrams = [template for template in bigrams if not template.refs]
+        self.variable_bigrams = [template for template in bigrams if template.refs]
+
+    @classmethod
+    def from_file(cls, path, boundary='_x'):
+        """compile template file in CRF++/Wapiti format; comments and empty lines are skipped"""
+        with io.open(path, encoding='UTF-8') as template_file:
+            patterns = [line.strip() for line in template_file]
+        return cls([pattern for pattern in patterns if pattern and not pattern.startswith('#')], boundary)
+
+
+class FeatureIndex(object):
+    """Executes a TemplatePlan against a model, mapping observations to feature IDs.
+    Label scores of the word-level templates are cached per word type, so only context templates are evaluated per token."""
+
+    def __init__(self, model, plan, cache_size=200000):
+
+        self.model = model
+        self.plan = plan
+        self.cache_size = cache_size
+        self.word_cache = {}
+
+        # bigram features that fire at every position (the 'B' template) are resolved once
+        self.constant_bigrams = tuple(model.bigrams[template.pattern] for template in plan.constant_bigrams if template.pattern in model.bigrams)
+
+
+    def word_scores(self, token):
+        """label scores of word-level templates for token (list of columns)"""
+
+        key = tuple(token[column] for column in self.plan.word_columns)
+        scores = self.word_cache.get(key)
+
+        if scores is None:
+            if len(self.word_cache) >= self.cache_size:
+                self.word_cache.clear()
+
+            unigrams = self.model.unigrams
+            scores = [0.0]*len(self.model.labels)
+            for template in self.plan.word_unigrams:
+                feature = unigrams.get(template.expand([token], 0))
+                if feature is not None:
+                    self.model.add_unary(scores, feature)
+            self.word_cache[key] = scores
+
+        return scores
+
+
+    def lattice(self, sequence):
+        """build score lattice for sequence (list of column lists)"""
+
+        model = self.model
+        unigrams = model.unigrams
+        bigrams = model.bigrams
+        scales = model.scales
+
+        unary = []
+        transitions = []
+        for t, token in enumerate(sequence):
+            scores = list(self.word_scores(token))
+            for template in self.plan.context_unigrams:
+                feature = unigrams.get(template.expand(sequence, t))
+                if feature is not None:
+                    model.add_unary(scores, feature)
+            if scales is not None:
+                scores = [score*scale for score, scale in zip(scores, scales)]
+            unary.append(scores)
+
+            if t:
+                features = self.constant_bigrams
+                if self.plan.variable_bigrams:
+                    features += tuple(bigrams[obs] for obs in (template.expand(sequence, t) for template in self.plan.variable_bigrams) if obs in bigrams)
+                transitions.append(model.transition(features))
+
+        return Lattice(unary, transitions)
+
+
+class Transition(object):
+    """Transition scores between two positions, with cached row/column views and exponentials"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cols = [list(col) for col in zip(*rows)]
+        self.max = max(max(row) for row in rows)
+        self.exp_rows = [[exp(score - self.max) for score in row] for row in rows]
+        self.exp_cols = [list(col) for col in zip(*self.exp_rows)]
+
+
+class Lattice(object):
+    """Score lattice of one sequence: unary scores for each position, and transition scores between positions"""
+
+    def __init__(self, unary, transitions):
+        self.unary = unary
+        self.transitions = transitions
+
+    def __len__(self):
+        return len(self.unary)
+
+
+    def viterbi(self):
+        """return (score, best label sequence)"""
+
+        if not self.unary:
+            return 0.0, []
+
+        labels = range(len(self.unary[0]))
+        delta = self.unary[0]
+        backpointers = []
+        for unary, trans in zip(self.unary[1:], self.transitions):
+            new_delta = []
+            pointers = []
+            for y in labels:
+                candidates = [d + s for d, s in zip(delta, trans.cols[y])]
+                best = max(labels, key=candidates.__getitem__)
+                pointers.append(best)
+                new_delta.append(candidates[best] + unary[y])
+            backpointers.append(pointers)
+            delta = new_delta
+
+        y = max(labels, key=delta.__getitem__)
+        score = delta[y]
+        path = [y]
+        for pointers in reversed(backpointers):
+            y = pointers[y]
+            path.append(y)
+        path.reverse()
+
+        return score, path
+
+
+    def nbest(self, n):
+        """return list of up to n (score, label sequence) pairs, best first (k-best Viterbi)"""
+
+        if not self.unary:
+            return [(0.0, [])]
+
+        labels = range(len(self.unary[0]))
+
+        # for each position and label, the n best partial hypotheses as (score, previous label, rank of previous hypothesis)
+        chart = [[[(score, None, None)] for score in self.unary[0]]]
+        for unary, trans in zip(self.unary[1:], self.transitions):
+            previous = chart[-1]
+            chart.append([[(score + unary[y], yp, rank) for (score, yp, rank) in merge_best(previous, trans.cols[y], n)] for y in labels])
+
+        final = merge_best(chart[-1], [0.0]*len(labels), n)
+
+        results = []
+        for score, y, rank in final:
+            path = []
+            for column in reversed(chart):
+                path.append(y)
+                score_, y, rank = column[y][rank]
+            path.reverse()
+            results.append((score, path))
+
+        return results
+
+
+    def log_partition(self):
+        """return log partition function (forward pass only)"""
+
+        if not self.unary:
+            return 0.0
+        return self._forward()[3]
+
+
+    def forward_backward(self):
+        """return (per-position label marginals, log partition function).
+        Probabilities are rescaled at each position to avoid over- and underflow."""
+
+        if not self.unary:
+            return [], 0.0
+
+        labels = range(len(self.unary[0]))
+        exp_unary, alpha, norms, log_z = self._forward()
+
+        # backward pass
+        beta = [[1.0]*len(labels)]
+        for t in range(len(self.unary)-1, 0, -1):
+            eu = exp_unary[t]
+            trans = self.transitions[t-1]
+            following = [e*b for e, b in zip(eu, beta[-1])]
+            beta.append([sum(e*f for e, f in zip(trans.exp_rows[yp], following))/norms[t] for yp in labels])
+        beta.reverse()
+
+        marginals = []
+        for a, b in zip(alpha, beta):
+            probs = [x*y for x, y in zip(a, b)]
+            total = sum(probs)
+            marginals.append([p/total for p in probs])
+
+        return marginals, log_z
+
+
+    def _forward(self):
+        """scaled forward pass; return (exponentiated unary scores, normalized alphas, per-position norms, log partition function)"""
+
+        labels = range(len(self.unary[0]))
+
+        # exponentiated unary scores, shifted by maximum of each position
+        exp_unary = []
+        log_z = 0.0
+        for unary in self.unary:
+            m = max(unary)
+            exp_unary.append([exp(score - m) for score in unary])
+            log_z += m
+
+        # forward pass
+        alpha = [exp_unary[0]]
+        norms = [sum(exp_unary[0])]
+        alpha[0] = [a/norms[0] for a in alpha[0]]
+        for eu, trans in zip(exp_unary[1:], self.transitions):
+            prev = alpha[-1]
+            current = [eu[y]*sum(a*e for a, e in zip(prev, trans.exp_cols[y])) for y in labels]
+            norm = sum(current)
+            norms.append(norm)
+            alpha.append([a/norm for a in current])
+            log_z += trans.max
+
+        log_z += sum(log(norm) for norm in norms)
+
+        return exp_unary, alpha, norms, log_z
+
+
+def write_binary(model, path, threshold=0.0, bits=None):
+    """write model in binary format for memory-mapping: a header, labels and templates,
+    sorted string tables of unigram and bigram observations, feature offsets, label indices, scales and weights.
+    Feature IDs are renumbered to follow the sorted string order.
+
+    Weights with an absolute value below threshold are pruned, and features without weights are removed.
+    If bits (8 or 16) is given, weights are quantized to integers with one scale factor per label."""
+
+    require_binary_support()
+
+    def pad(blob):
+        return blob + b'\0'*(-len(blob) % 8)
+
+    Y = len(model.labels)
+    lbl_code = 'H' if Y*Y <= 65536 else 'I'
+    old_offsets = list(model.offsets)
+    old_scales = model.scales or [1.0]*Y
+
+    # collect surviving features and weights; label indices of bigram weights are taken modulo Y for scales
+    tables = []
+    entries = []
+    for table, size in [(model.unigrams, Y), (model.bigrams, Y*Y)]:
+        features = []
+        for encoded, obs in sorted((obs.encode('UTF-8'), obs) for obs in table.keys()):
+            feature = table[obs]
+            weights = [(model.lbl[i], model.wgt[i]*old_scales[model.lbl[i] % Y]) for i in range(old_offsets[feature], old_offsets[feature+1])]
+            weights = [(y, w) for (y, w) in weights if abs(w) >= threshold and w]
+            if weights:
+                features.append((encoded, weights))
+        tables.append(features)
+        entries.extend(weights for encoded, weights in features)
+
+    scales = None
+    if bits:
+        wgt_code = {8: 'b', 16: 'h'}[bits]
+        maximum = 2**(bits-1) - 1
+        scales = [0.0]*Y
+        for weights in entries:
+            for y, w in weights:
+                scales[y % Y] = max(scales[y % Y], abs(w))
+        scales = [scale/maximum or 1.0 for scale in scales]
+    else:
+        wgt_code = 'd'
+
+    offsets = array(str('Q'), [0])
+    lbl = array(str(lbl_code))
+    wgt = array(str(wgt_code))
+    string_tables = []
+    for features in tables:
+        string_offsets = array(str('Q'), [0])
+        for encoded, weights in features:
+            string_offsets.append(string_offsets[-1] + len(encoded))
+            for y, w in weights:
+                if scales is not None:
+                    w = int(round(w/scales[y % Y]))
+                    if not w:
+                        continue
+                lbl.append(y)
+                wgt.append(w)
+            offsets.append(len(lbl))
+        string_tables.append(pad(to_bytes(string_offsets) + b''.join(encoded for encoded, weights in features)))
+
+    meta = pad('\n'.join([model.boundary] + list(model.labels) + list(model.patterns)).encode('UTF-8'))
+    scale_bytes = to_bytes(array(str('d'), scales)) if scales is not None else b''
+    sections = [meta, string_tables[0], string_tables[1], pad(to_bytes(offsets)), pad(to_bytes(lbl)), scale_bytes, to_bytes(wgt)]
+
+    starts = []
+    position = BINARY_HEADER.size + (-BINARY_HEADER.size % 8)
+    for section in sections:
+        starts.append(position)
+        position += len(section)
+
+    with open(path, 'wb') as out:
+        out.write(pad(BINARY_HEADER.pack(BINARY_MAGIC, Y, len(model.patterns), len(tables[0]), len(tables[1]),
+                                         lbl.itemsize, wgt.itemsize, *(starts + [position]))))
+        for section in sections:
+            out.write(section)
+
+
+def typed_view(buf, start, end, typecode):
+    """view of buf[start:end] as array of typecode, without copying"""
+    return memoryview(buf)[start:end].cast(typecode)
+
+
+def to_bytes(arr):
+    return arr.tobytes()
+
+
+def merge_best(hypotheses, scores, n):
+    """lazily merge sorted hypothesis lists (one per previous label) into the n best extensions.
+    hypotheses[yp] is sorted best-first; scores[yp] is the score added when extending from yp."""
+
+    heap = [(-(hyps[0][0] + scores[yp]), yp, 0) for yp, hyps in enumerate(hypotheses)]
+    heapq.heapify(heap)
+
+    best = []
+    while heap and len(best) < n:
+        neg_score, yp, rank = heapq.heappop(heap)
+        best.append((-neg_score, yp, rank))
+        if rank + 1 < len(hypotheses[yp]):
+            heapq.heappush(heap, (-(hypotheses[yp][rank+1][0] + scores[yp]), yp, rank+1))
+
+    return best
+
+
+def normalize(obs):
+    """Wapiti only looks at the case-insensitive first character of a pattern to determine its type; make lookups consistent"""
+    return obs[:1].lower() + obs[1:]
+
+
+def read_string(line):
+    """read length-prefixed string ('len:string') from Wapiti model. Length is in bytes."""
+    length, rest = line.split(b':', 1)
+    return rest[:int(length)].decode('UTF-8')
+
+
+def read_sequences(fobj):
+    """read feature file (one token per line, empty line after each sequence); yield lists of lines"""
+    sequence = []
+    for line in fobj:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            sequence.append(line)
+        elif sequence:
+            yield sequence
+            sequence = []
+    if sequence:
+        yield sequence
+
+
+def format_nbest_sentences(model, prefixes, lattice, n):
+    """n-best output for one sequence in the format of CRF++ (-n N) with probabilities.
+    prefixes are the strings that precede the label on each line (input line and tab, or nothing for labels-only output)"""
+    log_z = lattice.log_partition()
+    out = []
+    for i, (score, path) in enumerate(lattice.nbest(n)):
+        out.append('# {0} {1:.6f}'.format(i, exp(score - log_z)))
+        for prefix, y in zip(prefixes, path):
+            out.append(prefix + model.labels[y])
+        out.append('')
+    return out
+
+
+def format_marginals(model, prefixes, lattice):
+    """output with tag marginals for one sequence in the format of CRF++ (-v 2); prefixes as in format_nbest_sentences()"""
+    marginals, log_z = lattice.forward_backward()
+    score, path = lattice.viterbi()
+    out = ['# {0:.6f}'.format(exp(score - log_z))]
+    for prefix, y, probs in zip(prefixes, path, marginals):
+        alternatives = '\t'.join('{0}/{1:.6f}'.format(label, p) for label, p in zip(model.labels, probs))
+        out.append('{0}{1}/{2:.6f}\t{3}'.format(prefix, model.labels[y], probs[y], alternatives))
+    out.append('')
+    return out
+
+
+def label(model, fobj_in, fobj_out, nbest=1, marginals=False, labels_only=False):
+    """label feature file and write output in the format expected by postprocess.py.
+    With labels_only, the input columns are not repeated in the output (like wapiti label -l)."""
+
+    for lines in read_sequences(fobj_in):
+        sequence = [line.split() for line in lines]
+        lattice = model.lattice(sequence)
+        if labels_only:
+            prefixes = [''] * len(lines)
+        else:
+            prefixes = [line + '\t' for line in lines]
+
+        if nbest > 1:
+            out = format_nbest_sentences(model, prefixes, lattice, nbest)
+        elif marginals:
+            out = format_marginals(model, prefixes, lattice)
+        else:
+            score, path = lattice.viterbi()
+            out = [prefix + model.labels[y] for prefix, y in zip(prefixes, path)] + ['']
+
+        fobj_out.write('\n'.join(out) + '\n')
+        fobj_out.flush()
+
+
+def evaluate(model, sequences):
+    """tag sequences (lists of column lists, gold tag in last column); return (correct, total, seconds)"""
+
+    correct = total = 0
+    start = time.time()
+    for sequence in sequences:
+        score, path = model.lattice(sequence).viterbi()
+        for token, y in zip(sequence, path):
+            correct += (model.labels[y] == token[-1])
+            total += 1
+    return correct, total, time.time() - start
+
+
+def compress(model_path, output, threshold=0.0, bits=None, gold=None):
+    """prune/quantize model, and print report comparing the original and the compressed model to stdout.
+    A text model is compared in binary format (converted without pruning or quantization into a temporary file),
+    so that the report shows the effect of compression, not that of the format."""
+
+    model = CRFModel(model_path)
+    write_binary(model, output, threshold, bits)
+
+    baseline = model_path
+    if not isinstance(model.unigrams, SortedTable):
+        handle, baseline = tempfile.mkstemp(suffix='.bin', dir=os.path.dirname(os.path.abspath(output)))
+        os.close(handle)
+        write_binary(model, baseline)
+    del model
+
+    try:
+        results = []
+        for path, name in [(baseline, model_path if baseline == model_path else model_path + ' (binary)'), (output, output)]:
+            start = time.time()
+            model = CRFModel(path)
+            load_time = time.time() - start
+            results.append((name, os.path.getsize(path), len(model.unigrams) + len(model.bigrams), len(model.wgt), load_time, model))
+    finally:
+        if baseline != model_path:
+            os.remove(baseline)
+
+    sequences = []
+    if gold:
+        with io.open(gold, encoding='UTF-8') as gold_file:
+            sequences = [[line.split() for line in lines] for lines in read_sequences(gold_file)]
+
+    print('model\tbytes\tfeatures\tweights\tload (s)\ttokens/s\taccuracy')
+    accuracies = []
+    for path, size, n_features, n_weights, load_time, model in results:
+        speed = accuracy = '-'
+        if sequences:
+            correct, total, seconds = evaluate(model, sequences)
+            accuracies.append(correct/total)
+            speed = '{0:.0f}'.format(total/seconds)
+            accuracy = '{0:.4f}'.format(correct/total)
+        print('{0}\t{1}\t{2}\t{3}\t{4:.3f}\t{5}\t{6}'.format(path, size, n_features, n_weights, load_time, speed, accuracy))
+
+    if accuracies:
+        print('accuracy delta: {0:+.4f}'.format(accuracies[1] - accuracies[0]))
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='In-process CRF decoder for clevertagger models.')
+    subparsers = parser.add_subparsers(dest='mode')
+    # subcommands are optional by default in Python 3
+    subparsers.required = True
+
+    label_parser = subparsers.add_parser('label', help='Label feature file (stdin) with CRF model.')
+    label_parser.add_argument('-m', '--model', type=str, required=True, metavar='FILE',
+                    help='Path to Wapiti model or CRF++ text model.')
+    label_parser.add_argument('-f', '--templates', type=str, metavar='FILE',
+                    help='Feature template file (crf_config). Default: templates stored in model.')
+    label_parser.add_argument('-n', '--nbest', type=int, default=1, metavar='N',
+                    help='Print N best analyses for each sequence, with probabilities.')
+    label_parser.add_argument('-p', '--marginals', action='store_true',
+                    help='Print marginal probability of each label for each token.')
+    label_parser.add_argument('-l', '--labels', action='store_true',
+                    help='Only print labels (and probabilities), not the input columns.')
+
+    convert_parser = subparsers.add_parser('convert', help='Convert Wapiti model or CRF++ text model into binary format.')
+    convert_parser.add_argument('model', type=str, metavar='MODEL',
+                    help='Path to Wapiti model or CRF++ text model.')
+    convert_parser.add_argument('output', type=str, metavar='OUTPUT',
+                    help='Path of binary model.')
+
+    compress_parser = subparsers.add_parser('compress', help='Prune and/or quantize model, write it in binary format, and report size, speed and accuracy.')
+    compress_parser.add_argument('model', type=str, metavar='MODEL',
+                    help='Path to model (any supported format).')
+    compress_parser.add_argument('output', type=str, metavar='OUTPUT',
+                    help='Path of compressed binary model.')
+    compress_parser.add_argument('--prune', type=float, default=0.0, metavar='THRESHOLD',
+                    help='Remove weights whose absolute value is below THRESHOLD (default: %(default)s).')
+    compress_parser.add_argument('--bits', type=int, choices=[8, 16],
+                    help='Quantize weights to 8 or 16 bit integers with per-label scale factors.')
+    compress_parser.add_argument('--gold', type=str, metavar='FILE',
+                    help='Held-out feature file with gold tags in last column (output of clevertagger -e) to measure speed and accuracy.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    if sys.version_info < (3, 0):
+        sys.stdin = codecs.getreader('UTF-8')(sys.stdin)
+        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
+
+    args = parse_command_line()
+
+    if args.mode == 'label':
+        label(CRFModel(args.model, args.templates), sys.stdin, sys.stdout, args.nbest, args.marginals, args.labels)
+    elif args.mode == 'convert':
+        write_binary(CRFModel(args.model), args.output)
+    elif args.mode == 'compress':
+        compress(args.model, args.output, args.prune, args.bits, args.gold)
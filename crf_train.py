@@ -0,0 +1,677 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# CRF trainer for clevertagger models. It reads feature files (output of clevertagger -e; gold tag in the last column),
+# expands the feature templates (crf_config), and minimizes the negative log-likelihood with L1/L2 regularization
+# with L-BFGS (OWL-QN if L1 is used), like wapiti train. The gradient is computed by forward-backward with NumPy,
+# in parallel by worker processes that each hold a shard of the training sentences.
+# The model is written in Wapiti format, and can be used with Wapiti or crf.py (CRF_BACKEND 'python').
+# Requires NumPy.
+# python crf_train.py -p crf_config [--nthread N] FEATURE_FILE [FEATURE_FILE ...] MODEL
+
+from __future__ import unicode_literals, print_function, division
+import os
+import sys
+import io
+import time
+import argparse
+import multiprocessing
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import crf
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError('crf_train.py requires NumPy')
+
+
+def open_features(path):
+    """open feature file for reading as text; files compressed with gzip or xz (clevertagger -e --compress) are decompressed"""
+    if path.endswith('.gz'):
+        import gzip
+        return io.TextIOWrapper(gzip.open(path), encoding='UTF-8')
+    if path.endswith('.xz'):
+        import lzma
+        return io.TextIOWrapper(lzma.open(path), encoding='UTF-8')
+    return io.open(path, encoding='UTF-8')
+
+
+class Batch(object):
+    """Sentences of similar length, padded to the same length and stored as NumPy arrays.
+    Sentences are sorted by length (longest first), so the sentences that are still active at position t are a prefix of the batch."""
+
+    def __init__(self, sequences, n_labels):
+
+        sequences = sorted(sequences, key=lambda sequence: -len(sequence[0]))
+        S = len(sequences)
+        T = len(sequences[0][0])
+        Y = n_labels
+
+        self.lengths = np.array([len(gold) for gold, u_ids, u_pos, b_ids, b_pos in sequences])
+        # active[t]: number of sentences that are longer than t
+        self.active = np.array([np.count_nonzero(self.lengths > t) for t in range(T + 1)])
+        self.n_tokens = int(self.lengths.sum())
+
+        gold = np.zeros((S, T), dtype=np.intp)
+        u_ids, u_idx, b_ids, b_idx = [], [], [], []
+        for s, (labels, uid, upos, bid, bpos) in enumerate(sequences):
+            gold[s, :len(labels)] = labels
+            u_ids.append(np.frombuffer(uid, dtype=np.int32))
+            u_idx.append(np.frombuffer(upos, dtype=np.int32) + s*T)
+            b_ids.append(np.frombuffer(bid, dtype=np.int32))
+            b_idx.append(np.frombuffer(bpos, dtype=np.int32) - 1 + s*(T-1))
+
+        # unigram features: weight row u_ids[i] fires at token u_idx[i] (flat index into S*T)
+        self.u_ids = np.concatenate(u_ids).astype(np.intp)
+        self.u_idx = np.concatenate(u_idx).astype(np.intp)
+        # bigram features with references to the input (not the constant 'B' template): edge b_idx[i] (flat index into S*(T-1))
+        self.b_ids = np.concatenate(b_ids).astype(np.intp)
+        self.b_idx = np.concatenate(b_idx).astype(np.intp)
+
+        # np.add.at() is slow; sums over groups of features are computed with np.add.reduceat() instead.
+        # u_idx is sorted, so the features of each token are contiguous; for the gradient, the features are sorted by ID
+        self.u_tokens, self.u_token_starts = group_starts(self.u_idx)
+        self.u_order = np.argsort(self.u_ids, kind='stable')
+        self.u_features, self.u_feature_starts = group_starts(self.u_ids[self.u_order])
+
+        mask = np.arange(T) < self.lengths[:, None]
+        self.token_mask = mask
+        self.tokens = np.flatnonzero(mask)
+        self.gold = gold.ravel()[self.tokens]
+
+        edge_mask = mask[:, 1:]
+        self.edges = np.flatnonzero(edge_mask)
+        self.gold_previous = gold[:, :-1].ravel()[self.edges]
+        self.gold_current = gold[:, 1:].ravel()[self.edges]
+        # gold label pairs, for the constant bigram features
+        self.pair_counts = np.zeros((Y, Y))
+        np.add.at(self.pair_counts, (self.gold_previous, self.gold_current), 1)
+
+        self.shape = (S, T, Y)
+
+
+def group_starts(values):
+    """for sorted values, return the distinct values and the index of the first occurrence of each"""
+    if not len(values):
+        return values, values
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    return values[starts], starts
+
+
+class Layout(object):
+    """Position of the weights in the parameter vector: a matrix of unigram weights (observation x label),
+    followed by the bigram weights (observation x previous label x label)."""
+
+    def __init__(self, n_labels, n_unigrams, n_bigrams, constant_bigrams):
+        self.n_labels = n_labels
+        self.n_unigrams = n_unigrams
+        self.n_bigrams = n_bigrams
+        # bigram observations that fire at every position ('B' template)
+        self.constant_bigrams = np.array(constant_bigrams, dtype=np.intp)
+        self.size = n_unigrams*n_labels + n_bigrams*n_labels*n_labels
+
+    def split(self, vector):
+        """views of the unigram and bigram weights in vector"""
+        Y = self.n_labels
+        unigrams = vector[:self.n_unigrams*Y].reshape(self.n_unigrams, Y)
+        bigrams = vector[self.n_unigrams*Y:].reshape(self.n_bigrams, Y, Y)
+        return unigrams, bigrams
+
+
+class TrainingData(object):
+    """Training sentences, with the observations of the feature templates interned to unigram/bigram IDs.
+    If whitelist (a set of observations, see prune_features.py) is given, other observations are ignored."""
+
+    def __init__(self, patterns, boundary='_x', whitelist=None):
+
+        self.patterns = patterns
+        self.whitelist = whitelist
+        self.plan = crf.TemplatePlan(patterns, boundary)
+        self.labels = []
+        self.label_ids = {}
+        # observation strings in order of first occurrence, with their unigram and bigram IDs
+        self.observations = []
+        self.unigram_ids = {}
+        self.bigram_ids = {}
+        self.constant_bigrams = []
+        self.n_columns = 0
+        # per sentence: gold labels, unigram IDs and positions, bigram IDs and positions (arrays)
+        self.sequences = []
+
+
+    def intern(self, table, obs):
+        """return ID of obs in table (unigram or bigram IDs), or None if obs is not in the whitelist"""
+        feature = table.get(obs)
+        if feature is None:
+            if self.whitelist is not None and obs not in self.whitelist:
+                return None
+            feature = table[obs] = len(table)
+            if obs not in self.unigram_ids or obs not in self.bigram_ids:
+                self.observations.append(obs)
+        return feature
+
+
+    def read(self, fobj):
+        """add sentences of feature file"""
+
+        plan = self.plan
+        bigram_templates = plan.constant_bigrams + plan.variable_bigrams
+        # unigram IDs of the word-level templates, per word type (as in crf.FeatureIndex)
+        word_cache = {}
+        for lines in crf.read_sequences(fobj):
+            sequence = [line.split() for line in lines]
+            self.n_columns = len(sequence[0]) - 1
+            labels = array(str('i'))
+            u_ids, u_pos, b_ids, b_pos = array(str('i')), array(str('i')), array(str('i')), array(str('i'))
+            for t, token in enumerate(sequence):
+                label = token[-1]
+                if label not in self.label_ids:
+                    self.label_ids[label] = len(self.labels)
+                    self.labels.append(label)
+                labels.append(self.label_ids[label])
+
+                key = tuple(token[column] for column in plan.word_columns)
+                word_ids = word_cache.get(key)
+                if word_ids is None:
+                    word_ids = [self.intern(self.unigram_ids, template.expand([token], 0)) for template in plan.word_unigrams]
+                    word_ids = word_cache[key] = [feature for feature in word_ids if feature is not None]
+                u_ids.extend(word_ids)
+                for template in plan.context_unigrams:
+                    feature = self.intern(self.unigram_ids, template.expand(sequence, t))
+                    if feature is not None:
+                        u_ids.append(feature)
+                u_pos.extend([t]*(len(u_ids) - len(u_pos)))
+
+                for template in bigram_templates if t else ():
+                    feature = self.intern(self.bigram_ids, template.expand(sequence, t))
+                    if feature is None:
+                        continue
+                    if template.refs:
+                        b_ids.append(feature)
+                        b_pos.append(t)
+                    elif feature not in self.constant_bigrams:
+                        self.constant_bigrams.append(feature)
+            self.sequences.append((labels, u_ids.tobytes(), u_pos.tobytes(), b_ids.tobytes(), b_pos.tobytes()))
+
+
+    def layout(self):
+        return Layout(len(self.labels), len(self.unigram_ids), len(self.bigram_ids), self.constant_bigrams)
+
+
+    def shards(self, n, batch_tokens=4096):
+        """group sentences of similar length into batches of at most batch_tokens (padded) tokens,
+        and distribute the batches over n shards with about the same number of tokens"""
+
+        order = sorted(range(len(self.sequences)), key=lambda i: len(self.sequences[i][0]))
+        batches = []
+        current = []
+        for i in order:
+            length = len(self.sequences[i][0])
+            if current and (len(current) + 1)*length > batch_tokens:
+                batches.append(Batch([self.sequences[j] for j in current], len(self.labels)))
+                current = []
+            current.append(i)
+        if current:
+            batches.append(Batch([self.sequences[j] for j in current], len(self.labels)))
+
+        shards = [[] for i in range(n)]
+        sizes = [0]*n
+        for batch in sorted(batches, key=lambda batch: -batch.n_tokens):
+            i = sizes.index(min(sizes))
+            shards[i].append(batch)
+            sizes[i] += batch.n_tokens
+        return shards
+
+
+def batch_objective(batch, layout, unigrams, bigrams, unigram_gradient, bigram_gradient):
+    """negative log-likelihood of the sentences in batch; adds its gradient to unigram_gradient and bigram_gradient"""
+
+    S, T, Y = batch.shape
+    constant = bigrams[layout.constant_bigrams].sum(0) if len(layout.constant_bigrams) else np.zeros((Y, Y))
+
+    unary = np.zeros((S*T, Y))
+    if len(batch.u_ids):
+        unary[batch.u_tokens] = np.add.reduceat(unigrams[batch.u_ids], batch.u_token_starts)
+
+    # transition scores: one matrix for all positions, unless there are bigram features that depend on the input
+    variable = None
+    if len(batch.b_ids) and T > 1:
+        variable = np.zeros((S*(T-1), Y, Y))
+        np.add.at(variable, batch.b_idx, bigrams[batch.b_ids])
+        variable += constant
+
+    gold_score = unary[batch.tokens, batch.gold].sum()
+    if variable is None:
+        gold_score += (batch.pair_counts*constant).sum()
+    else:
+        gold_score += variable[batch.edges, batch.gold_previous, batch.gold_current].sum()
+
+    # scaled forward-backward: scores are shifted by their maximum before exponentiation,
+    # and the forward probabilities are normalized at each position (the norms are also used for the backward pass)
+    unary = unary.reshape(S, T, Y)
+    shift = unary.max(2)
+    exp_unary = np.exp(unary - shift[:, :, None])
+    log_z = shift.sum()
+    if variable is None:
+        transition_shift = constant.max()
+        exp_transition = np.exp(constant - transition_shift)
+        log_z += transition_shift*len(batch.edges)
+    else:
+        transition_shift = variable.max((1, 2))
+        exp_transition = np.exp(variable - transition_shift[:, None, None]).reshape(S, T-1, Y, Y)
+        log_z += transition_shift[batch.edges].sum()
+
+    active = batch.active
+    alpha = np.zeros((S, T, Y))
+    norms = np.ones((S, T))
+    current = exp_unary[:, 0]
+    norms[:, 0] = current.sum(1)
+    alpha[:, 0] = current/norms[:, 0, None]
+    for t in range(1, T):
+        k = active[t]
+        if variable is None:
+            current = alpha[:k, t-1].dot(exp_transition)
+        else:
+            current = np.einsum('sp,spy->sy', alpha[:k, t-1], exp_transition[:k, t-1])
+        current *= exp_unary[:k, t]
+        norms[:k, t] = current.sum(1)
+        alpha[:k, t] = current/norms[:k, t, None]
+    log_z += np.log(norms).sum()
+
+    beta = np.ones((S, T, Y))
+    for t in range(T-2, -1, -1):
+        k = active[t+1]
+        following = exp_unary[:k, t+1]*beta[:k, t+1]
+        if variable is None:
+            current = following.dot(exp_transition.T)
+        else:
+            current = np.einsum('spy,sy->sp', exp_transition[:k, t], following)
+        beta[:k, t] = current/norms[:k, t+1, None]
+
+    # unigram gradient: expected minus observed label counts at each token where an observation fires
+    marginals = (alpha*beta).reshape(S*T, Y)
+    marginals[batch.tokens, batch.gold] -= 1.0
+    if len(batch.u_ids):
+        unigram_gradient[batch.u_features] += np.add.reduceat(marginals[batch.u_idx[batch.u_order]], batch.u_feature_starts)
+
+    # bigram gradient: edge marginals are alpha[t-1, p] * transition[p, y] * exp_unary[t, y] * beta[t, y] / norms[t]
+    if T > 1:
+        following = exp_unary[:, 1:]*beta[:, 1:]/norms[:, 1:, None]
+        following *= batch.token_mask[:, 1:, None]
+        previous = alpha[:, :-1].reshape(S*(T-1), Y)
+        following = following.reshape(S*(T-1), Y)
+        if variable is None:
+            edge_counts = previous.T.dot(following)*exp_transition - batch.pair_counts
+            bigram_gradient[layout.constant_bigrams] += edge_counts
+        else:
+            edges = previous[:, :, None]*exp_transition.reshape(S*(T-1), Y, Y)*following[:, None, :]
+            edges[batch.edges, batch.gold_previous, batch.gold_current] -= 1.0
+            bigram_gradient[layout.constant_bigrams] += edges.sum(0)
+            np.add.at(bigram_gradient, batch.b_ids, edges[batch.b_idx])
+
+    return log_z - gold_score
+
+
+def shard_objective(batches, layout, weights, gradient):
+    """negative log-likelihood of a shard; its gradient is written to gradient (a vector of the size of weights)"""
+
+    gradient[:] = 0.0
+    unigrams, bigrams = layout.split(weights)
+    unigram_gradient, bigram_gradient = layout.split(gradient)
+    return sum(batch_objective(batch, layout, unigrams, bigrams, unigram_gradient, bigram_gradient) for batch in batches)
+
+
+def worker(batches, layout, shared_weights, shared_gradient, connection):
+    """compute objective and gradient of a shard whenever the parent process asks for it (until it sends None)"""
+
+    weights = np.frombuffer(shared_weights)
+    gradient = np.frombuffer(shared_gradient)
+    while connection.recv() is not None:
+        connection.send(shard_objective(batches, layout, weights, gradient))
+
+
+class Objective(object):
+    """Regularized negative log-likelihood of the training data (without the L1 term, which is handled by the optimizer).
+    With several shards, each is evaluated by a worker process; weights and gradients are exchanged through shared memory."""
+
+    def __init__(self, shards, layout, rho2=0.0):
+
+        self.layout = layout
+        self.rho2 = rho2
+        self.evaluations = 0
+        self.shards = shards
+        self.workers = []
+
+        if len(shards) > 1:
+            self.shared_weights = multiprocessing.RawArray('d', layout.size)
+            self.weights = np.frombuffer(self.shared_weights)
+            self.gradients = []
+            for batches in shards:
+                shared_gradient = multiprocessing.RawArray('d', layout.size)
+                parent, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=worker, args=(batches, layout, self.shared_weights, shared_gradient, child))
+                process.daemon = True
+                process.start()
+                child.close()
+                self.workers.append((process, parent))
+                self.gradients.append(np.frombuffer(shared_gradient))
+        else:
+            self.gradient = np.zeros(layout.size)
+
+
+    def __call__(self, x):
+        """return (objective, gradient) at x"""
+
+        self.evaluations += 1
+        if self.workers:
+            self.weights[:] = x
+            for process, connection in self.workers:
+                connection.send(True)
+            value = sum(connection.recv() for process, connection in self.workers)
+            gradient = np.sum(self.gradients, axis=0)
+        else:
+            value = shard_objective(self.shards[0] if self.shards else [], self.layout, x, self.gradient)
+            gradient = self.gradient.copy()
+
+        if self.rho2:
+            value += 0.5*self.rho2*x.dot(x)
+            gradient += self.rho2*x
+        return value, gradient
+
+
+    def close(self):
+        for process, connection in self.workers:
+            connection.send(None)
+            connection.close()
+            process.join()
+        self.workers = []
+
+
+def pseudo_gradient(x, gradient, rho1):
+    """gradient of the objective with L1 term (OWL-QN): at zero weights, the one-sided derivative that decreases the objective, or 0"""
+
+    if not rho1:
+        return gradient
+    pg = np.where(x > 0, gradient + rho1, gradient - rho1)
+    zero = (x == 0)
+    right = gradient + rho1
+    left = gradient - rho1
+    pg[zero] = np.where(right[zero] < 0, right[zero], np.where(left[zero] > 0, left[zero], 0.0))
+    return pg
+
+
+class LBFGS(object):
+    """Limited-memory BFGS with the OWL-QN extension for L1 regularization (Andrew and Gao 2007).
+    The state (weights, correction pairs, objective history) can be saved and restored between iterations."""
+
+    def __init__(self, objective, x, rho1=0.0, history=5, maxiter=0, stopwin=5, stopeps=0.02):
+
+        self.objective = objective
+        self.x = x
+        self.rho1 = rho1
+        self.history = history
+        self.maxiter = maxiter
+        self.stopwin = stopwin
+        self.stopeps = stopeps
+
+        self.iteration = 0
+        self.s = []
+        self.y = []
+        self.values = []
+
+
+    def value(self, loss, x):
+        return loss + self.rho1*np.abs(x).sum() if self.rho1 else loss
+
+
+    def direction(self, pg):
+        """two-loop recursion: approximate inverse Hessian times -pg"""
+
+        q = -pg
+        alphas = []
+        for s, y in reversed(list(zip(self.s, self.y))):
+            a = s.dot(q)/y.dot(s)
+            q -= a*y
+            alphas.append(a)
+        if self.s:
+            q *= self.s[-1].dot(self.y[-1])/self.y[-1].dot(self.y[-1])
+        for (s, y), a in zip(zip(self.s, self.y), reversed(alphas)):
+            b = y.dot(q)/y.dot(s)
+            q += (a - b)*s
+        return q
+
+
+    def converged(self):
+        """stop if the objective has decreased by less than stopeps percent over the last stopwin iterations"""
+        if len(self.values) <= self.stopwin:
+            return False
+        old = self.values[-1 - self.stopwin]
+        return 100*(old - self.values[-1])/abs(self.values[-1]) < self.stopeps
+
+
+    def run(self, callback=None):
+        """optimize until convergence or maxiter; callback(self) is called after each iteration"""
+
+        loss, gradient = self.objective(self.x)
+        value = self.value(loss, self.x)
+        if not self.values:
+            self.values.append(value)
+
+        while not self.maxiter or self.iteration < self.maxiter:
+
+            pg = pseudo_gradient(self.x, gradient, self.rho1)
+            if not pg.any():
+                break
+
+            d = self.direction(pg)
+            if self.rho1:
+                # OWL-QN: the direction must not leave the orthant of the descent direction
+                d[d*pg >= 0] = 0.0
+            if d.dot(pg) >= 0:
+                # not a descent direction: restart from steepest descent
+                self.s, self.y = [], []
+                d = -pg
+
+            orthant = np.where(self.x != 0, np.sign(self.x), -np.sign(pg)) if self.rho1 else None
+            step = 1.0 if self.s else 1.0/np.sqrt(pg.dot(pg))
+
+            # backtracking line search (Armijo condition)
+            for i in range(40):
+                x = self.x + step*d
+                if self.rho1:
+                    x[np.sign(x) != orthant] = 0.0
+                new_loss, new_gradient = self.objective(x)
+                new_value = self.value(new_loss, x)
+                if new_value <= value + 1e-4*pg.dot(x - self.x):
+                    break
+                step *= 0.5
+            else:
+                sys.stderr.write('line search failed; stopping\n')
+                break
+
+            s = x - self.x
+            y = new_gradient - gradient
+            if s.dot(y) > 1e-10:
+                self.s.append(s)
+                self.y.append(y)
+                if len(self.s) > self.history:
+                    del self.s[0], self.y[0]
+
+            self.x, loss, gradient, value = x, new_loss, new_gradient, new_value
+            self.iteration += 1
+            self.values.append(value)
+            if callback is not None:
+                callback(self)
+            if self.converged():
+                break
+
+        return self.x
+
+
+    def save(self, path, fingerprint):
+        """write state to path (NumPy .npz), through a temporary file that is renamed, so an interrupted save keeps the previous state"""
+
+        n = len(self.s)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, x=self.x, s=np.array(self.s).reshape(n, len(self.x)), y=np.array(self.y).reshape(n, len(self.x)),
+                     iteration=self.iteration, values=np.array(self.values), fingerprint=np.array(fingerprint))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+
+    def load(self, path, fingerprint):
+        """restore state saved with save(); the fingerprint must match (same training data and templates)"""
+
+        with np.load(path) as state:
+            if list(state['fingerprint']) != list(fingerprint):
+                raise ValueError('{0}: checkpoint does not match training data'.format(path))
+            self.x = state['x']
+            self.s = list(state['s'])
+            self.y = list(state['y'])
+            self.iteration = int(state['iteration'])
+            self.values = list(state['values'])
+
+
+def write_model(path, data, layout, x):
+    """write model in Wapiti text format; observations without non-zero weights are left out"""
+
+    Y = layout.n_labels
+    unigrams, bigrams = layout.split(x)
+    used_unigrams = unigrams.any(1)
+    used_bigrams = bigrams.reshape(layout.n_bigrams, Y*Y).any(1)
+
+    def string(s):
+        return '{0}:{1}'.format(len(s.encode('UTF-8')), s)
+
+    observations = []
+    for obs in data.observations:
+        u = data.unigram_ids.get(obs)
+        b = data.bigram_ids.get(obs)
+        u = u if u is not None and used_unigrams[u] else None
+        b = b if b is not None and used_bigrams[b] else None
+        if u is not None or b is not None:
+            observations.append((obs, u, b))
+
+    with io.open(path, 'w', encoding='UTF-8') as out:
+        out.write('#mdl#2#{0}\n'.format(int(np.count_nonzero(x))))
+        out.write('#rdr#{0}/{1}/0\n'.format(len(data.patterns), data.n_columns))
+        out.writelines(string(pattern) + ',\n' for pattern in data.patterns)
+        out.write('#qrk#{0}\n'.format(Y))
+        out.writelines(string(label) + '\n' for label in data.labels)
+        out.write('#qrk#{0}\n'.format(len(observations)))
+        out.writelines(string(obs) + '\n' for obs, u, b in observations)
+
+        # feature indices as assigned by Wapiti (and crf.py): Y per unigram observation, Y*Y per bigram observation, in order of observations
+        feature = 0
+        for obs, u, b in observations:
+            if u is not None:
+                for i in np.flatnonzero(unigrams[u]):
+                    out.write('{0}={1}\n'.format(feature + i, float(unigrams[u, i]).hex()))
+                feature += Y
+            if b is not None:
+                weights = bigrams[b].ravel()
+                for i in np.flatnonzero(weights):
+                    out.write('{0}={1}\n'.format(feature + i, float(weights[i]).hex()))
+                feature += Y*Y
+
+
+def read_patterns(path):
+    """feature templates of template file (crf_config); comments and empty lines are skipped"""
+    with io.open(path, encoding='UTF-8') as template_file:
+        patterns = [line.strip() for line in template_file]
+    return [pattern for pattern in patterns if pattern and not pattern.startswith('#')]
+
+
+def train(feature_files, patterns, model_path, nthread=1, rho1=0.5, rho2=0.0001, maxiter=0, history=5, stopwin=5, stopeps=0.02,
+          checkpoint=None, resume=False, whitelist=None):
+    """train model on feature files, and write it to model_path. Returns the optimizer (with the final weights and objective values).
+    whitelist is the path of a file with the observations to use (one per line; see prune_features.py)."""
+
+    require_numpy()
+
+    start = time.time()
+    if whitelist is not None:
+        with io.open(whitelist, encoding='UTF-8') as whitelist_file:
+            whitelist = set(line.rstrip('\r\n') for line in whitelist_file)
+    data = TrainingData(patterns, whitelist=whitelist)
+    for path in feature_files:
+        with open_features(path) as fobj:
+            data.read(fobj)
+    layout = data.layout()
+    shards = data.shards(nthread)
+    n_tokens = sum(len(sequence[0]) for sequence in data.sequences)
+    sys.stderr.write('{0} sentences, {1} tokens, {2} labels, {3} observations, {4} weights ({5:.1f} s)\n'.format(
+        len(data.sequences), n_tokens, layout.n_labels, len(data.observations), layout.size, time.time() - start))
+    data.sequences = None
+
+    fingerprint = [layout.n_labels, layout.n_unigrams, layout.n_bigrams, n_tokens]
+    objective = Objective(shards, layout, rho2)
+    try:
+        optimizer = LBFGS(objective, np.zeros(layout.size), rho1, history, maxiter, stopwin, stopeps)
+        if resume and checkpoint and os.path.exists(checkpoint):
+            optimizer.load(checkpoint, fingerprint)
+            sys.stderr.write('resuming after iteration {0}\n'.format(optimizer.iteration))
+
+        def progress(optimizer):
+            sys.stderr.write('iteration {0}: objective {1:.2f}, {2} active weights, {3:.1f} s\n'.format(
+                optimizer.iteration, optimizer.values[-1], np.count_nonzero(optimizer.x), time.time() - start))
+            if checkpoint:
+                optimizer.save(checkpoint, fingerprint)
+
+        optimizer.run(progress)
+    finally:
+        objective.close()
+
+    write_model(model_path, data, layout, optimizer.x)
+    sys.stderr.write('done: {0} iterations, {1} evaluations, {2:.1f} s\n'.format(optimizer.iteration, objective.evaluations, time.time() - start))
+    return optimizer
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Train CRF model for clevertagger on feature files (output of clevertagger -e).')
+    parser.add_argument('features', nargs='+', metavar='FEATURE_FILE',
+                    help='Feature file(s) with gold tag in last column; may be compressed with gzip or xz (.gz, .xz).')
+    parser.add_argument('model', metavar='MODEL',
+                    help='Path of the trained model (Wapiti format).')
+    parser.add_argument('-p', '--pattern', default='crf_config', metavar='FILE',
+                    help='Feature template file (default: %(default)s).')
+    parser.add_argument('--nthread', type=int, default=1, metavar='N',
+                    help='Number of worker processes that compute the gradient (default: %(default)s).')
+    parser.add_argument('--rho1', type=float, default=0.5, metavar='R',
+                    help='L1 regularization (default: %(default)s).')
+    parser.add_argument('--rho2', type=float, default=0.0001, metavar='R',
+                    help='L2 regularization (default: %(default)s).')
+    parser.add_argument('--maxiter', type=int, default=0, metavar='N',
+                    help='Maximum number of iterations; 0 means no limit (default: %(default)s).')
+    parser.add_argument('--histsz', type=int, default=5, metavar='N',
+                    help='Number of correction pairs kept by L-BFGS (default: %(default)s).')
+    parser.add_argument('--stopwin', type=int, default=5, metavar='N',
+                    help='Window (in iterations) for the stopping criterion (default: %(default)s).')
+    parser.add_argument('--stopeps', type=float, default=0.02, metavar='PERCENT',
+                    help='Stop if the objective decreases by less than PERCENT over the window (default: %(default)s).')
+    parser.add_argument('--whitelist', metavar='FILE',
+                    help='Only use the observations in FILE (one per line), e.g. the frequent ones selected by prune_features.py.')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                    help='Save the optimizer state to FILE after each iteration.')
+    parser.add_argument('--resume', action='store_true',
+                    help='Continue training from the state in the checkpoint file (--checkpoint).')
+
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_command_line()
+    train(args.features, read_patterns(args.pattern), args.model, args.nthread, args.rho1, args.rho2, args.maxiter, args.histsz,
+          args.stopwin, args.stopeps, args.checkpoint, args.resume, args.whitelist)
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Evaluate a clevertagger model on a gold standard in the format of sample_training_file.txt (one token and its tag per line,
+# empty line after each sentence). The gold text is tagged with the Clevertagger class (SMOR analysis, feature extraction, CRF),
+# and the report combines accuracy (all tokens, tokens that are not in the training data, per tag, confusions)
+# with performance (tokens/s, latency of each call of tag(), and the time spent in each stage).
+# python evaluate.py [--training TRAINING_FILE] [--json REPORT.json] GOLD_FILE
+
+from __future__ import unicode_literals, print_function, division
+import sys
+import io
+import json
+import argparse
+from math import ceil
+from collections import defaultdict
+
+import clevertagger
+from config import CRF_BACKEND
+
+timer = clevertagger.timer
+
+
+def read_gold(fobj):
+    """yield (words, tags) for each sentence of file in training format"""
+    words, tags = [], []
+    for line in fobj:
+        columns = line.split()
+        if columns:
+            words.append(columns[0])
+            tags.append(columns[-1])
+        elif words:
+            yield words, tags
+            words, tags = [], []
+    if words:
+        yield words, tags
+
+
+def read_vocabulary(path):
+    """set of words in training file"""
+    with io.open(path, encoding='UTF-8') as fobj:
+        return set(word for words, tags in read_gold(fobj) for word in words)
+
+
+def percentile(values, p):
+    """p-th percentile of sorted list values (nearest rank)"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, int(ceil(p/100*len(values))))) - 1]
+
+
+def accuracy_report(pairs):
+    """counts and accuracy of list of (gold, predicted) pairs"""
+    correct = sum(1 for gold, predicted in pairs if gold == predicted)
+    return {'tokens': len(pairs), 'correct': correct, 'accuracy': correct/len(pairs) if pairs else 0.0}
+
+
+def evaluate(tagger, sentences, vocabulary=None, batch_size=1):
+    """tag sentences (list of (words, gold tags)) with tagger, batch_size sentences per call of tag(); return report (dict)"""
+
+    tagger.timings = {}
+    latencies = []
+    predicted = []
+    start = timer()
+    for i in range(0, len(sentences), batch_size):
+        batch = [' '.join(words) for words, tags in sentences[i:i+batch_size]]
+        call_start = timer()
+        predicted.extend(tags for words, tags in tagger.tag(batch, output='arrays'))
+        latencies.append(timer() - call_start)
+    seconds = timer() - start
+    timings, tagger.timings = tagger.timings, None
+
+    pairs = []
+    oov_pairs = []
+    known_pairs = []
+    confusion = defaultdict(lambda: defaultdict(int))
+    for (words, gold_tags), tags in zip(sentences, predicted):
+        for word, gold, tag in zip(words, gold_tags, tags):
+            pairs.append((gold, tag))
+            confusion[gold][tag] += 1
+            if vocabulary is not None:
+                (known_pairs if word in vocabulary else oov_pairs).append((gold, tag))
+
+    n_tokens = len(pairs)
+    report = accuracy_report(pairs)
+    report['sentences'] = len(sentences)
+    if vocabulary is not None:
+        report['oov'] = accuracy_report(oov_pairs)
+        report['known'] = accuracy_report(known_pairs)
+
+    tags = {}
+    for tag in sorted(set(gold for gold, tag in pairs) | set(tag for gold, tag in pairs)):
+        gold_count = sum(confusion[tag].values())
+        predicted_count = sum(confusion[gold].get(tag, 0) for gold in confusion)
+        correct = confusion[tag].get(tag, 0)
+        precision = correct/predicted_count if predicted_count else 0.0
+        recall = correct/gold_count if gold_count else 0.0
+        tags[tag] = {'gold': gold_count, 'predicted': predicted_count, 'correct': correct, 'precision': precision, 'recall': recall,
+                     'f1': 2*precision*recall/(precision + recall) if precision + recall else 0.0}
+    report['tags'] = tags
+    report['confusion'] = dict((gold, dict(row)) for gold, row in confusion.items())
+
+    latencies.sort()
+    report['performance'] = {
+        'seconds': seconds,
+        'tokens_per_second': n_tokens/seconds if seconds else 0.0,
+        'sentences_per_second': len(sentences)/seconds if seconds else 0.0,
+        'batch_size': batch_size,
+        'latency_ms': dict([('mean', 1000*sum(latencies)/len(latencies) if latencies else 0.0)] +
+                           [('p{0}'.format(p), 1000*percentile(latencies, p)) for p in (50, 90, 99)] +
+                           [('max', 1000*latencies[-1] if latencies else 0.0)]),
+        'stages': timings,
+    }
+    return report
+
+
+def format_report(report, n_confusions=10):
+    """human-readable summary of report"""
+
+    lines = ['tokens: {0}, sentences: {1}'.format(report['tokens'], report['sentences']),
+             'accuracy: {0:.4f}'.format(report['accuracy'])]
+    if 'oov' in report:
+        lines.append('OOV accuracy: {0:.4f} ({1} tokens); known words: {2:.4f} ({3} tokens)'.format(
+            report['oov']['accuracy'], report['oov']['tokens'], report['known']['accuracy'], report['known']['tokens']))
+
+    lines.append('')
+    lines.append('tag\tgold\tpredicted\tprecision\trecall\tF1')
+    for tag, entry in sorted(report['tags'].items(), key=lambda item: -item[1]['gold']):
+        lines.append('{0}\t{1}\t{2}\t{3:.4f}\t{4:.4f}\t{5:.4f}'.format(tag, entry['gold'], entry['predicted'], entry['precision'], entry['recall'], entry['f1']))
+
+    errors = sorted(((n, gold, tag) for gold, row in report['confusion'].items() for tag, n in row.items() if gold != tag), reverse=True)
+    if errors:
+        lines.append('')
+        lines.append('most frequent confusions (gold -> predicted):')
+        lines.extend('{0}\t{1} -> {2}'.format(n, gold, tag) for n, gold, tag in errors[:n_confusions])
+
+    performance = report['performance']
+    lines.append('')
+    lines.append('{0:.0f} tokens/s, {1:.0f} sentences/s ({2:.2f} s)'.format(performance['tokens_per_second'], performance['sentences_per_second'], performance['seconds']))
+    lines.append('latency per call of tag() with {0} sentence(s): mean {1:.2f} ms, p50 {2:.2f} ms, p90 {3:.2f} ms, p99 {4:.2f} ms, max {5:.2f} ms'.format(
+        performance['batch_size'], *(performance['latency_ms'][key] for key in ('mean', 'p50', 'p90', 'p99', 'max'))))
+    lines.append('time per stage: ' + ', '.join('{0} {1:.2f} s'.format(stage, seconds) for stage, seconds in sorted(performance['stages'].items())))
+    return '\n'.join(lines) + '\n'
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Evaluate accuracy and speed of clevertagger on a gold standard (format of sample_training_file.txt).')
+    parser.add_argument('gold', metavar='GOLD_FILE',
+                    help='Tagged text: one token and its tag per line, empty line after each sentence.')
+    parser.add_argument('--training', metavar='FILE',
+                    help='Training file of the model (same format); words that are not in it are counted as OOV.')
+    parser.add_argument('-m', '--model', default=clevertagger.CRF_MODEL, metavar='FILE',
+                    help='CRF model (default: CRF_MODEL in config.py).')
+    parser.add_argument('--backend', default=CRF_BACKEND, choices=['wapiti', 'python'],
+                    help='CRF backend (default: CRF_BACKEND in config.py).')
+    parser.add_argument('--batch-size', type=int, default=1, metavar='N',
+                    help='Sentences per call of tag(); latencies are measured per call (default: %(default)s).')
+    parser.add_argument('--json', metavar='FILE',
+                    help='Write full report (including confusion matrix) as JSON to FILE (\'-\' for stdout).')
+    parser.add_argument('--confusions', type=int, default=10, metavar='N',
+                    help='Number of confusions in the summary (default: %(default)s).')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = parse_command_line()
+
+    with io.open(args.gold, encoding='UTF-8') as fobj:
+        sentences = list(read_gold(fobj))
+    vocabulary = read_vocabulary(args.training) if args.training else None
+
+    start = timer()
+    tagger = clevertagger.Clevertagger(backend=args.backend, model=args.model)
+    startup = timer() - start
+
+    report = evaluate(tagger, sentences, vocabulary, args.batch_size)
+    report['performance']['startup_seconds'] = startup
+
+    if args.json == '-':
+        sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    else:
+        sys.stdout.write(format_report(report, args.confusions))
+        sys.stdout.write('startup: {0:.2f} s\n'.format(startup))
+        if args.json:
+            with io.open(args.json, 'w', encoding='UTF-8') as fobj:
+                fobj.write(json.dumps(report, indent=2, sort_keys=True) + '\n')
@@ -9,11 +9,14 @@ import os
 import re
 import socket
 import time
+import io
 import codecs
+import signal
+import argparse
 from subprocess import Popen, PIPE
 from collections import defaultdict
 from smor_getpos import get_true_pos
-from config import SFST_BIN, SMOR_MODEL, PORT, SMOR_ENCODING
+from config import SFST_BIN, SMOR_MODEL, PORT, SMOR_ENCODING, IO_BUFFER_SIZE
 
 class MorphAnalyzer():
     """Base class for morphological analysis and feature extraction"""
@@ -32,13 +35,17 @@ class MorphAnalyzer():
         #regex to check if word is alphanumeric
         #we don't use str.isalnum() because we want to treat hyphenated words as alphanumeric
         self.alphnum = re.compile(r'^(?:\w|\d|-)+$', re.U)
+
+        #feature columns of each word type (UTF-8 bytes) for bytes-native feature extraction (see create_features_bytes());
+        #an entry takes about 300 bytes, and the cache is cleared when it has reached feature_cache_size entries
+        self.feature_cache = {}
+        self.feature_cache_size = 500000
         
         
     def create_features(self, line):
         """Create list of features for each word"""
         
         truth = ''
-        pos = []
         linelist = line.split()
         
         if not linelist:
@@ -50,7 +57,48 @@ class MorphAnalyzer():
         #if input is already tagged, tag is added to end (for training / error analysis)
         if len(linelist) > 1:
             truth = linelist[1]
-        
+
+        outstring = '\t'.join(self.feature_columns(word))
+
+        if truth:
+            outstring += '\t'+truth
+            
+        return outstring+'\n'
+
+
+    def create_features_bytes(self, line):
+        """Like create_features(), but for a line of UTF-8 bytes. Tokens stay bytes;
+        only the first occurrence of each word type is decoded to compute its features, which are then cached.
+        bytes.split() only splits at ASCII whitespace; lines with a token that str.split() would split further
+        (at a no-break space, U+2009, U+001F, ...) are decoded and passed to create_features(), so both give the same output."""
+
+        linelist = line.split()
+
+        if not linelist:
+            return b'\n'
+
+        word = linelist[0]
+        features = self.feature_cache.get(word)
+        if features is None:
+            text = word.decode('UTF-8')
+            if text.split() != [text]:
+                return self.create_features(line.decode('UTF-8')).encode('UTF-8')
+            if len(self.feature_cache) >= self.feature_cache_size:
+                self.feature_cache.clear()
+            features = '\t'.join(self.feature_columns(text)).encode('UTF-8')
+            self.feature_cache[word] = features
+
+        if len(linelist) > 1:
+            truth = linelist[1]
+            if len(truth.decode('UTF-8').split()) != 1:
+                return self.create_features(line.decode('UTF-8')).encode('UTF-8')
+            return features + b'\t' + truth + b'\n'
+        return features + b'\n'
+
+
+    def feature_columns(self, word):
+        """Create features of word as list of columns (word, lowercased word, case, alphanumeric, 10 POS tags)"""
+
         #feature: is word uppercased?
         if word[0].isupper():
             feature_upper = 'uc'
@@ -64,21 +112,39 @@ class MorphAnalyzer():
             feature_alnum = 'n'
 
         #feature: list of possible part of speech tags
+        pos = self.candidates(word)+['ZZZ']*10
+
+        return [word, word.lower(), feature_upper, feature_alnum] + pos[:10]
+
+
+    def candidates(self, word):
+        """Sorted list of possible part of speech tags of word (including those of its spelling variations)"""
+
+        pos = []
         if word in self.posset:
             pos = self.posset[word]
         for alternative in spelling_variations(word):
             if alternative in self.posset:
                 pos = self.posset[alternative].union(pos)
 
-        pos = sorted(pos)+['ZZZ']*10
-        posstring = '\t'.join(pos[:10])
+        return sorted(pos)
 
-        outstring = ("{w}\t{wlower}\t{upper}\t{alnum}\t{pos}".format(w=word, wlower=word.lower(), upper=feature_upper, pos=posstring, alnum=feature_alnum))
 
-        if truth:
-            outstring += '\t'+truth
-            
-        return outstring+'\n'
+    def load_lexicon(self, fobj):
+        """add analyses from a text file object with one word per line, followed by a tab and its space-separated POS tags
+        (as written by save_lexicon() or smor_getpos.py). These words are not analyzed again."""
+
+        for line in fobj:
+            word, tab, tags = line.rstrip('\r\n').partition('\t')
+            if word:
+                self.posset[word].update(tags.split())
+
+
+    def save_lexicon(self, fobj):
+        """write analyses of all words seen so far to a text file object (format of load_lexicon())"""
+
+        for word, tags in self.posset.items():
+            fobj.write('{0}\t{1}\n'.format(word, ' '.join(sorted(tags))))
 
 
 
@@ -181,15 +247,26 @@ class GertwolAnalyzer(MorphAnalyzer):
 
 class SMORAnalyzer(MorphAnalyzer):
 
-    def __init__(self):
+    def __init__(self, port=None, lexicon=None):
         MorphAnalyzer.__init__(self)
 
+        # optional lexicon.SharedLexicon with analyses that are shared with other processes
+        self.lexicon = lexicon
+
+        # if this is a list, new words are added to it by analyze() (for checkpoints)
+        self.analyzed = None
+
         #regex to get coarse POS tag from SMOR output
         self.re_mainclass = re.compile(r'<\+(.*?)>')
-        self.PORT = PORT
 
-        # start server, and make sure it accepts connection
-        self.p_server = self.server()
+        if port is None:
+            self.PORT = PORT
+            # start server, and make sure it accepts connection
+            self.p_server = self.server()
+        else:
+            # use server that is already running (and shared with other processes)
+            self.PORT = port
+            self.p_server = None
 
     def server(self):
         """Start a socket server. If socket is busy, look for available socket"""
@@ -237,9 +314,7 @@ class SMORAnalyzer(MorphAnalyzer):
         """convert SMOR output into list of POS tags"""
         
         word = ''
-        for line in analyses.split(b'\n'):
-
-            line = line.decode(SMOR_ENCODING)
+        for line in analyses.decode(SMOR_ENCODING).split('\n'):
 
             if line.startswith('>'):
                 word = line[2:]
@@ -261,8 +336,8 @@ class SMORAnalyzer(MorphAnalyzer):
                 self.posset[word].add(pos2)
 
 
-    def analyze(self, lines):
-        """get all new words from input lines and send them to SMOR server for analysis"""
+    def new_words(self, lines):
+        """get all new words (and their spelling variations) from input lines, and reserve an entry for them in posset"""
 
         todo = []
         for line in lines:
@@ -283,30 +358,117 @@ class SMORAnalyzer(MorphAnalyzer):
                         self.posset[alternative] = set([])
                         todo.append(alternative)
 
+        return todo
+
+
+    def analyze(self, lines):
+        """get all new words from input lines and send them to SMOR server for analysis"""
+
+        todo = self.new_words(lines)
+        if self.analyzed is not None:
+            self.analyzed.extend(todo)
+
+        if self.lexicon is not None:
+            todo = [word for word in todo if not self.from_lexicon(word)]
+
         analyses = self.client(todo)
         self.convert(analyses)
 
+        if self.lexicon is not None and todo:
+            self.lexicon.add_many((word, self.posset[word]) for word in todo)
 
 
-    def main(self):
-        """send lines in batches to SMOR server for analysis, and create output for each batch"""
+    def from_lexicon(self, word):
+        """copy analysis of word from shared lexicon into posset; return False if word is not in shared lexicon"""
+        tags = self.lexicon.get(word)
+        if tags is None:
+            return False
+        self.posset[word].update(tags)
+        return True
+
+
+
+    def main(self, fobj_in=None, fobj_out=None, checkpoint=None):
+        """send lines in batches to SMOR server for analysis, and create output for each batch.
+        If checkpoint is given, it is called (without arguments) after the output of each batch has been written and flushed."""
+
+        if fobj_in is None:
+            fobj_in = sys.stdin
+        if fobj_out is None:
+            fobj_out = sys.stdout
 
         try:
             buf = []
-            for i, line in enumerate(sys.stdin):
+            for i, line in enumerate(fobj_in):
                 buf.append(line)
 
                 if i and not i % 10000:
                     self.analyze(buf)
-                    for line in buf:
-                        sys.stdout.write(self.create_features(line))
+                    fobj_out.write(''.join(self.create_features(line) for line in buf))
                     buf = []
+                    if checkpoint is not None:
+                        fobj_out.flush()
+                        checkpoint()
 
             self.analyze(buf)
-            for line in buf:
-                sys.stdout.write(self.create_features(line))
+            fobj_out.write(''.join(self.create_features(line) for line in buf))
+            fobj_out.flush()
+            if checkpoint is not None:
+                checkpoint()
 
         finally:
+            self.terminate()
+
+
+    def main_bytes(self, fobj_in, fobj_out, checkpoint=None):
+        """like main(), but with binary file objects and UTF-8 input/output, without decoding and encoding each token.
+        Only words that have not been seen before are decoded for analysis."""
+
+        try:
+            buf = []
+            for i, line in enumerate(fobj_in):
+                buf.append(line)
+
+                if i and not i % 10000:
+                    self.analyze_bytes(buf)
+                    fobj_out.write(b''.join(self.create_features_bytes(line) for line in buf))
+                    buf = []
+                    if checkpoint is not None:
+                        fobj_out.flush()
+                        checkpoint()
+
+            self.analyze_bytes(buf)
+            fobj_out.write(b''.join(self.create_features_bytes(line) for line in buf))
+            fobj_out.flush()
+            if checkpoint is not None:
+                checkpoint()
+
+        finally:
+            self.terminate()
+
+
+    def analyze_bytes(self, lines):
+        """analyze new words from input lines (UTF-8 bytes)"""
+
+        feature_cache = self.feature_cache
+        words = set()
+        for line in lines:
+            linelist = line.split(None, 1)
+            if linelist and linelist[0] not in feature_cache:
+                words.add(linelist[0])
+
+        # a token with non-ASCII whitespace is split like in create_features() (see create_features_bytes())
+        texts = []
+        for word in words:
+            text = word.decode('UTF-8').split()
+            if text:
+                texts.append(text[0])
+        self.analyze(texts)
+
+
+    def terminate(self):
+        """stop socket server (unless it is shared with other processes)"""
+        if self.p_server is not None:
             self.p_server.terminate()
 
 
@@ -349,12 +511,102 @@ def spelling_variations(word):
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Extract features for clevertagger from tokenized text (stdin).')
+    parser.add_argument('--port', type=int, metavar='PORT',
+                    help='Use fst-infl2-daemon that is already running at PORT instead of starting a new one.')
+    parser.add_argument('--lexicon', type=str, metavar='NAME',
+                    help='Share analyses with other processes through the shared memory lexicon NAME (see lexicon.py).')
+    parser.add_argument('--load-lexicon', type=str, metavar='FILE', action='append', default=[],
+                    help='Load precomputed analyses (word, tab, space-separated POS tags; e.g. written by --save-lexicon or smor_getpos.py) before analyzing words with SMOR. Can be given several times.')
+    parser.add_argument('--save-lexicon', type=str, metavar='FILE',
+                    help='Write analyses of all words to FILE at the end.')
+    parser.add_argument('--output', type=str, metavar='FILE',
+                    help='Write output to FILE instead of stdout.')
+    parser.add_argument('--checkpoint', type=str, metavar='FILE',
+                    help='Periodically write a checkpoint (input offset, output offset and lexicon of analyzed words) to FILE. Requires --output.')
+    parser.add_argument('--checkpoint-interval', type=float, default=60, metavar='SECONDS',
+                    help='Minimum time between two checkpoints (default: %(default)s).')
+    parser.add_argument('--resume', action='store_true',
+                    help='Continue after the last checkpoint in FILE (--checkpoint): skip processed input, and keep the output written before it.')
+    parser.add_argument('--text', action='store_true',
+                    help='Decode and encode every token, even if SMOR uses UTF-8 (by default, UTF-8 tokens are processed as bytes).')
+    parser.add_argument('--buffer-size', type=int, default=IO_BUFFER_SIZE, metavar='BYTES',
+                    help='Buffer size for reading and writing (default: %(default)s).')
+    args = parser.parse_args()
+
+    if (args.checkpoint or args.resume) and not (args.checkpoint and args.output):
+        parser.error('--checkpoint and --resume require --checkpoint FILE and --output FILE')
+
+    # with UTF-8, tokens stay bytes from input to output
+    bytes_mode = SMOR_ENCODING.lower().replace('-', '') == 'utf8' and not args.text
+
     if sys.version_info < (3, 0):
         sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
-        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-        sys.stdin = codecs.getreader('UTF-8')(sys.stdin)
 
-    Analyzer = SMORAnalyzer()
+    # large binary buffers for stdin/stdout (text mode decodes/encodes them with io.TextIOWrapper instead of codecs)
+    fobj_in = io.open(sys.stdin.fileno(), 'rb', buffering=args.buffer_size, closefd=False)
+    checkpoint = None
+    if args.checkpoint:
+        from checkpoint import Checkpoint, skip_input
+        checkpoint = Checkpoint(args.checkpoint, args.resume, args.checkpoint_interval)
+        skip_input(fobj_in, checkpoint.input_offset)
+        fobj_out = checkpoint.open_output(args.output, args.buffer_size)
+    elif args.output:
+        fobj_out = io.open(args.output, 'wb', buffering=args.buffer_size)
+    else:
+        fobj_out = io.open(sys.stdout.fileno(), 'wb', buffering=args.buffer_size, closefd=False)
+
+    # on SIGTERM, exit through Analyzer.main(), which stops the SMOR daemon
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+    shared_lexicon = None
+    if args.lexicon:
+        from lexicon import SharedLexicon
+        shared_lexicon = SharedLexicon(args.lexicon)
+
+    Analyzer = SMORAnalyzer(args.port, shared_lexicon)
     #Analyzer = GertwolAnalyzer()
 
-    Analyzer.main()
+    try:
+        for path in args.load_lexicon:
+            with io.open(path, encoding='UTF-8') as f:
+                Analyzer.load_lexicon(f)
+
+        save_checkpoint = None
+        if checkpoint is not None:
+            Analyzer.load_lexicon(checkpoint.lexicon_lines())
+            Analyzer.analyzed = []
+            # number of input bytes read so far; when a batch is finished, all lines that have been read belong to it
+            input_offset = [checkpoint.input_offset]
+
+            def count_bytes(lines):
+                for line in lines:
+                    input_offset[0] += len(line)
+                    yield line
+
+            def save_checkpoint(force=False):
+                checkpoint.add_lexicon((word, Analyzer.posset[word]) for word in Analyzer.analyzed)
+                del Analyzer.analyzed[:]
+                checkpoint.save(input_offset[0], fobj_out, force)
+
+            fobj_in = count_bytes(fobj_in)
+
+        if bytes_mode:
+            Analyzer.main_bytes(fobj_in, fobj_out, save_checkpoint)
+        elif checkpoint is not None:
+            # (the text wrapper must stay alive until the last checkpoint, because it closes fobj_out when it is deleted)
+            text_out = io.TextIOWrapper(fobj_out, encoding='UTF-8')
+            Analyzer.main((line.decode('UTF-8') for line in fobj_in), text_out, save_checkpoint)
+        else:
+            Analyzer.main(io.TextIOWrapper(fobj_in, encoding='UTF-8'), io.TextIOWrapper(fobj_out, encoding='UTF-8'))
+        if checkpoint is not None:
+            save_checkpoint(force=True)
+        if args.save_lexicon:
+            with io.open(args.save_lexicon, 'w', encoding='UTF-8') as f:
+                Analyzer.save_lexicon(f)
+    finally:
+        Analyzer.terminate()
+        if shared_lexicon is not None:
+            shared_lexicon.close()
+        if checkpoint is not None:
+            checkpoint.close()
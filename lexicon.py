@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Lexicon of morphological analyses (word -> POS tags) in shared memory.
+# Parallel feature extraction processes (clevertagger --jobs N --shared-lexicon MB) look up words here before querying SMOR,
+# and add their new analyses, so each word is analyzed only once, and the lexicon is stored only once.
+# Requires Python >= 3.8 (multiprocessing.shared_memory).
+
+from __future__ import unicode_literals
+import os
+import mmap
+import struct
+import fcntl
+import tempfile
+from zlib import crc32
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# header: magic string, number of slots, number of entries, used bytes of data area
+HEADER = struct.Struct(str('<8sQQQ'))
+MAGIC = b'CLVLEX01'
+# record in data area: length of word, length of tags (bytes), followed by word and space-separated tags (UTF-8)
+RECORD = struct.Struct(str('<HH'))
+
+# bytes of shared memory per slot of the hash table (8 bytes for the slot, the rest for the record)
+BYTES_PER_SLOT = 64
+# maximum load factor of the hash table
+MAX_LOAD = 0.7
+
+
+class SharedLexicon(object):
+    """Open-addressing hash table (linear probing) in a shared memory block.
+    Slots hold the offset of a record in the data area (plus one; 0 means empty).
+
+    Readers do not lock: a record is written completely before its slot is set, so a slot is either empty or points to a complete record.
+    Writers are serialized by an exclusive lock (fcntl.flock) on a lock file, so any process that knows the name can add words.
+    If the lexicon is full, further words are not added (and are analyzed by each process, as without a shared lexicon).
+
+    Create a new lexicon with SharedLexicon(size=BYTES), and attach to it from other processes with SharedLexicon(name).
+    The creator should call unlink() when the lexicon is no longer needed."""
+
+    def __init__(self, name=None, size=0):
+
+        if shared_memory is None:
+            raise RuntimeError('shared lexicon requires Python >= 3.8 (multiprocessing.shared_memory)')
+
+        self.shm = None
+        self.mmap = None
+        if name is None:
+            n_slots = max(size // BYTES_PER_SLOT, 16)
+            data_size = max(size - HEADER.size - 8*n_slots, 1024)
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER.size + 8*n_slots + data_size)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, n_slots, 0, 0)
+            self.name = self.shm.name
+            self.buf = self.shm.buf
+        else:
+            # other processes map the block directly: SharedMemory(name) would register it with the resource tracker
+            # of this process, which removes the block when this process ends (before Python 3.13)
+            fd = os.open(os.path.join('/dev/shm', name.lstrip('/')), os.O_RDWR)
+            try:
+                self.mmap = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+            self.name = name
+            self.buf = memoryview(self.mmap)
+
+        magic, self.n_slots, n_entries, data_used = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{0} is not a shared lexicon'.format(name))
+
+        self.slots = self.buf[HEADER.size:HEADER.size + 8*self.n_slots].cast(str('Q'))
+        self.data_start = HEADER.size + 8*self.n_slots
+        self.data_size = len(self.buf) - self.data_start
+        self.max_entries = int(self.n_slots*MAX_LOAD)
+
+        self.lock_path = os.path.join(tempfile.gettempdir(), self.name.lstrip('/') + '.lock')
+        self.lock_file = open(self.lock_path, 'a')
+
+
+    def __len__(self):
+        return HEADER.unpack_from(self.buf, 0)[2]
+
+
+    def _find(self, key):
+        """return (slot index, tags) for word (bytes); tags is None if the word is not in the lexicon"""
+
+        buf, slots, n_slots, data_start = self.buf, self.slots, self.n_slots, self.data_start
+        i = crc32(key) % n_slots
+        while True:
+            offset = slots[i]
+            if not offset:
+                return i, None
+            position = data_start + offset - 1
+            word_length, tags_length = RECORD.unpack_from(buf, position)
+            position += RECORD.size
+            if word_length == len(key) and buf[position:position+word_length] == key:
+                position += word_length
+                return i, bytes(buf[position:position+tags_length]).decode('UTF-8').split()
+            i = (i + 1) % n_slots
+
+
+    def get(self, word):
+        """return list of POS tags of word, or None if the word is not in the lexicon"""
+        return self._find(word.encode('UTF-8'))[1]
+
+
+    def add_many(self, items):
+        """add (word, tags) pairs under lock; return number of added words"""
+
+        added = 0
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            magic, n_slots, n_entries, data_used = HEADER.unpack_from(self.buf, 0)
+            for word, tags in items:
+                key = word.encode('UTF-8')
+                value = ' '.join(sorted(tags)).encode('UTF-8')
+                size = RECORD.size + len(key) + len(value)
+                if n_entries >= self.max_entries or data_used + size > self.data_size:
+                    break
+                i, existing = self._find(key)
+                if existing is not None:
+                    continue
+
+                position = self.data_start + data_used
+                RECORD.pack_into(self.buf, position, len(key), len(value))
+                position += RECORD.size
+                self.buf[position:position+len(key)] = key
+                position += len(key)
+                self.buf[position:position+len(value)] = value
+
+                # publish record only after it is complete
+                self.slots[i] = data_used + 1
+                data_used += size
+                n_entries += 1
+                added += 1
+
+            HEADER.pack_into(self.buf, 0, MAGIC, n_slots, n_entries, data_used)
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+        return added
+
+
+    def add(self, word, tags):
+        """add word with list of POS tags; return False if the word is already in the lexicon, or if the lexicon is full"""
+        return self.add_many([(word, tags)]) == 1
+
+
+    def load(self, lines):
+        """add analyses from lines of text in the format of extract_features.py --save-lexicon (word, tab, space-separated POS tags);
+        return number of added words"""
+        entries = (line.rstrip('\r\n').partition('\t') for line in lines)
+        return self.add_many((word, tags.split()) for word, tab, tags in entries if word)
+
+
+    def items(self, start=0):
+        """return list of (word, list of POS tags) for all records from offset start of the data area, and the offset after the last record.
+        Records are stored in the order in which they were added, so items(offset) returns the words added since the call that returned offset."""
+
+        buf, data_start = self.buf, self.data_start
+        data_used = HEADER.unpack_from(buf, 0)[3]
+        items = []
+        position = start
+        while position < data_used:
+            word_length, tags_length = RECORD.unpack_from(buf, data_start + position)
+            word_start = data_start + position + RECORD.size
+            tags_start = word_start + word_length
+            items.append((bytes(buf[word_start:tags_start]).decode('UTF-8'), bytes(buf[tags_start:tags_start+tags_length]).decode('UTF-8').split()))
+            position += RECORD.size + word_length + tags_length
+        return items, position
+
+
+    def close(self):
+        """detach from the shared memory block"""
+        if self.buf is None:
+            return
+        if getattr(self, 'slots', None) is not None:
+            self.slots.release()
+            self.slots = None
+            self.lock_file.close()
+        if self.shm is not None:
+            self.buf = None
+            self.shm.close()
+        else:
+            self.buf.release()
+            self.buf = None
+            self.mmap.close()
+
+
+    def unlink(self):
+        """remove shared memory block and lock file (call once, in the creating process, before close())"""
+        self.shm.unlink()
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
@@ -7,41 +7,168 @@
 
 from __future__ import unicode_literals, print_function
 import sys
-import codecs
+import io
+import heapq
+import argparse
+from config import IO_BUFFER_SIZE
 
-i_nbest = int(sys.argv[1])
 tag_position = 14
 
-if sys.version_info < (3, 0):
-    sys.stdin = codecs.getreader('UTF-8')(sys.stdin)
-    sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-
-
-for line in sys.stdin:
-    
-    linelist = line.split()
-    
-    if not linelist: #empty lines
-        print('')
-        continue
- 
-    #n-best tagging (sentence level)
-    if line.startswith('#') and len(linelist) == 3:
-        print("{0}{1} {2}".format(linelist[0], linelist[1], linelist[2]))
-        continue
-   
-    #only print word and tag
-    if i_nbest == 1:
-        print("{0}\t{1}".format(linelist[0], linelist[tag_position]))
-        
-    #print word and n-best list
-    elif i_nbest > 1:
-        if line.startswith("#") and len(linelist) < 10:
+
+def nbest_alternatives(alternatives, i_nbest):
+    """return the i_nbest most probable of a list of 'tag/prob' strings, in descending order of probability.
+    Uses partial selection (heapq.nlargest) instead of sorting all alternatives."""
+    return heapq.nlargest(i_nbest, alternatives, key=lambda item: float(item.rpartition('/')[2]))
+
+
+def postprocess(lines, i_nbest):
+    """convert output lines of CRF tool into output lines of clevertagger (without line breaks).
+    lines can be any iterable of strings (e.g. a file object), and output lines are yielded as soon as they are converted."""
+
+    for line in lines:
+
+        #usual 1-best output: only cut out word (first column) and tag (last column)
+        if i_nbest == 1 and line.count('\t') == tag_position:
+            yield line[:line.index('\t')] + line[line.rindex('\t'):].rstrip()
             continue
-        
-        alts = [item.split('/') for item in linelist[tag_position+1:]]
-        nbest = sorted(alts, key=lambda x: float(x[1]), reverse=True)[:i_nbest]
-        nbest_str = '\t'.join(tag+'/'+str(prob) for (tag, prob) in nbest)
-        
-        print("{0}\t{1}".format(linelist[0], nbest_str))
 
+        linelist = line.split()
+
+        if not linelist: #empty lines
+            yield ''
+            continue
+
+        #n-best tagging (sentence level)
+        if line.startswith('#') and len(linelist) == 3:
+            yield "{0}{1} {2}".format(linelist[0], linelist[1], linelist[2])
+            continue
+
+        #only print word and tag
+        if i_nbest == 1:
+            yield "{0}\t{1}".format(linelist[0], linelist[tag_position])
+
+        #print word and n-best list
+        elif i_nbest > 1:
+            if line.startswith("#") and len(linelist) < 10:
+                continue
+
+            yield "{0}\t{1}".format(linelist[0], '\t'.join(nbest_alternatives(linelist[tag_position+1:], i_nbest)))
+
+
+def postprocess_bytes(lines, i_nbest):
+    """like postprocess(), but for lines of UTF-8 bytes (without decoding them if i_nbest is 1)"""
+
+    if i_nbest > 1:
+        for line in postprocess((line.decode('UTF-8') for line in lines), i_nbest):
+            yield line.encode('UTF-8')
+        return
+
+    for line in lines:
+
+        if line.count(b'\t') == tag_position:
+            yield line[:line.index(b'\t')] + line[line.rindex(b'\t'):].rstrip()
+            continue
+
+        linelist = line.split()
+
+        if not linelist:
+            yield b''
+        elif line.startswith(b'#') and len(linelist) == 3:
+            yield linelist[0] + linelist[1] + b' ' + linelist[2]
+        else:
+            yield linelist[0] + b'\t' + linelist[tag_position]
+
+
+def side_buffer(lines, sentences):
+    """yield input lines (one token per line, empty line between sentences) unchanged,
+    and put the words of each sentence (list of first columns) into the queue sentences, followed by None at the end of the input.
+    Used to keep the tokens while the CRF tool only outputs labels (see merge_labels())."""
+
+    words = []
+    try:
+        for line in lines:
+            linelist = line.split(None, 1)
+            if linelist:
+                words.append(linelist[0])
+            elif words:
+                sentences.put(words)
+                words = []
+            yield line
+        if words:
+            sentences.put(words)
+    finally:
+        sentences.put(None)
+
+
+def merge_labels(lines, sentences, i_nbest=1):
+    """convert output of a CRF tool that only prints labels (wapiti label -l, crf.py label -l) into output lines of clevertagger.
+    lines are UTF-8 bytes; sentences is an iterator over the words (UTF-8 bytes) of each input sentence, in input order.
+    With n-best tagging (sentence level), analyses with rank > 0 belong to the same sentence as the previous one."""
+
+    words = None
+    new_sentence = True
+    i = 0
+    for line in lines:
+
+        linelist = line.split()
+
+        if not linelist:
+            new_sentence = True
+            yield b''
+            continue
+
+        if line.startswith(b'#'):
+            #n-best tagging (sentence level)
+            if len(linelist) == 3:
+                if linelist[1] != b'0':
+                    new_sentence = False
+                    i = 0
+                yield linelist[0] + linelist[1] + b' ' + linelist[2]
+            continue
+
+        if new_sentence:
+            words = next(sentences, None)
+            if words is None:
+                raise ValueError('CRF output has more sentences than the input')
+            new_sentence = False
+            i = 0
+        if i >= len(words):
+            raise ValueError('CRF output has more labels than words in sentence: {0}'.format(b' '.join(words).decode('UTF-8')))
+
+        if i_nbest == 1:
+            yield words[i] + b'\t' + linelist[0]
+        else:
+            alternatives = nbest_alternatives([item.decode('UTF-8') for item in linelist[1:]], i_nbest)
+            yield words[i] + b'\t' + '\t'.join(alternatives).encode('UTF-8')
+        i += 1
+
+
+def write_lines(lines, fobj_out, batch_size=10000):
+    """write lines (bytes, without line breaks) to binary file object, batch_size lines per write() call"""
+
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            batch.append(b'')
+            fobj_out.write(b'\n'.join(batch))
+            batch = []
+    if batch:
+        batch.append(b'')
+        fobj_out.write(b'\n'.join(batch))
+    fobj_out.flush()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Convert output of CRF tool into clevertagger output.')
+    parser.add_argument('nbest', type=int, metavar='N',
+                    help='Number of tags to print per token (if CRF output contains tag probabilities).')
+    parser.add_argument('--buffer-size', type=int, default=IO_BUFFER_SIZE, metavar='BYTES',
+                    help='Buffer size for reading and writing (default: %(default)s).')
+    args = parser.parse_args()
+
+    fobj_in = io.open(sys.stdin.fileno(), 'rb', buffering=args.buffer_size, closefd=False)
+    fobj_out = io.open(sys.stdout.fileno(), 'wb', buffering=args.buffer_size, closefd=False)
+
+    write_lines(postprocess_bytes(fobj_in, args.nbest), fobj_out)
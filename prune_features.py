@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Count the observations (instantiated feature templates) of feature files (output of clevertagger -e) in bounded memory,
+# and write a whitelist of the observations that occur at least MIN_COUNT times, for crf_train.py --whitelist.
+# Most observations of the word-context templates (U00-U06 in crf_config) occur only once; leaving them out
+# makes the model smaller, and training faster.
+# Counts are estimated with a count-min sketch (--memory MB), which may overestimate, but never underestimates counts:
+# some rare observations may be kept, but no frequent ones are lost.
+# The feature files are read twice (counting, then selection), so they can't be read from stdin.
+# python prune_features.py -p crf_config --min-count 2 --whitelist WHITELIST FEATURE_FILE [FEATURE_FILE ...]
+
+from __future__ import unicode_literals, print_function, division
+import os
+import io
+import sys
+import time
+import struct
+import hashlib
+import argparse
+import tempfile
+import shutil
+from array import array
+from collections import defaultdict
+
+import crf
+from crf_train import open_features, read_patterns
+
+
+class CountMinSketch(object):
+    """Count-min sketch with conservative update: depth rows of width 32-bit counters.
+    The estimate of a count is the minimum of the counters of the key in all rows."""
+
+    def __init__(self, width, depth=4, cache_size=200000):
+        self.width = width
+        self.depth = depth
+        self.rows = [array(str('I'), [0])*width for i in range(depth)]
+        # counter indexes of frequent keys (cleared when full)
+        self.cache = {}
+        self.cache_size = cache_size
+
+    def indexes(self, key):
+        """counter index of key (a string) in each row (double hashing with two 64-bit hashes)"""
+        indexes = self.cache.get(key)
+        if indexes is None:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            h1, h2 = struct.unpack(str('<QQ'), hashlib.sha1(key.encode('UTF-8')).digest()[:16])
+            indexes = self.cache[key] = [(h1 + i*h2) % self.width for i in range(self.depth)]
+        return indexes
+
+    def add(self, key):
+        """increment count of key; only the counters that are at the minimum are incremented (conservative update)"""
+        indexes = self.indexes(key)
+        counts = [row[i] for row, i in zip(self.rows, indexes)]
+        minimum = min(counts)
+        for row, i, count in zip(self.rows, indexes, counts):
+            if count == minimum:
+                row[i] = count + 1
+
+    def count(self, key):
+        return min(row[i] for row, i in zip(self.rows, self.indexes(key)))
+
+
+def observations(plan, fobj, cache_size=200000):
+    """yield (template, observation) for all tokens of feature file. Constant bigram templates ('B') are always kept and are not counted.
+    The observations of word-level templates are cached per word type (as in crf.FeatureIndex)."""
+
+    context_templates = plan.context_unigrams + plan.variable_bigrams
+    word_cache = {}
+    for lines in crf.read_sequences(fobj):
+        sequence = [line.split() for line in lines]
+        for t, token in enumerate(sequence):
+            key = tuple(token[column] for column in plan.word_columns)
+            word_observations = word_cache.get(key)
+            if word_observations is None:
+                if len(word_cache) >= cache_size:
+                    word_cache.clear()
+                word_observations = word_cache[key] = [(template, template.expand([token], 0)) for template in plan.word_unigrams]
+            for item in word_observations:
+                yield item
+            for template in context_templates:
+                if template.kind == 'b' and not t:
+                    continue
+                yield template, template.expand(sequence, t)
+
+
+def count(feature_files, plan, sketch):
+    """first pass: add all observations to the sketch; return number of observations"""
+    n = 0
+    for path in feature_files:
+        with open_features(path) as fobj:
+            for template, obs in observations(plan, fobj):
+                sketch.add(obs)
+                n += 1
+    return n
+
+
+def select(feature_files, plan, sketch, min_count, whitelist):
+    """second pass: write observations with an estimated count of at least min_count to whitelist (once each).
+    Return statistics per template: occurrences, estimated number of distinct observations, kept observations, kept occurrences.
+    The number of distinct observations is estimated as the sum of 1/count over all occurrences."""
+
+    stats = defaultdict(lambda: [0, 0.0, 0, 0])
+    kept = set()
+    for path in feature_files:
+        with open_features(path) as fobj:
+            for template, obs in observations(plan, fobj):
+                n = sketch.count(obs)
+                entry = stats[template.pattern]
+                entry[0] += 1
+                entry[1] += 1/n
+                if n >= min_count:
+                    entry[3] += 1
+                    if obs not in kept:
+                        kept.add(obs)
+                        entry[2] += 1
+                        whitelist.write(obs + '\n')
+    for template in plan.templates:
+        if not template.refs:
+            whitelist.write(template.pattern + '\n')
+    return stats
+
+
+def compare_training(feature_files, patterns, whitelist_path, iterations, nthread):
+    """train for some iterations with and without whitelist; return list of (name, seconds, model size in bytes, weights)"""
+
+    import crf_train
+
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for name, whitelist in [('all observations', None), ('whitelist', whitelist_path)]:
+            model_path = os.path.join(directory, 'model')
+            start = time.time()
+            optimizer = crf_train.train(feature_files, patterns, model_path, nthread=nthread, maxiter=iterations, whitelist=whitelist)
+            results.append((name, time.time() - start, os.path.getsize(model_path), len(optimizer.x)))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser(description='Write whitelist of frequent observations of feature files for crf_train.py --whitelist.')
+    parser.add_argument('features', nargs='+', metavar='FEATURE_FILE',
+                    help='Feature file(s) (output of clevertagger -e); may be compressed with gzip or xz (.gz, .xz).')
+    parser.add_argument('-p', '--pattern', default='crf_config', metavar='FILE',
+                    help='Feature template file (default: %(default)s).')
+    parser.add_argument('-w', '--whitelist', required=True, metavar='FILE',
+                    help='Output file: observations to keep, one per line.')
+    parser.add_argument('--min-count', type=int, default=2, metavar='N',
+                    help='Keep observations that occur at least N times (default: %(default)s).')
+    parser.add_argument('--memory', type=int, default=256, metavar='MB',
+                    help='Memory for the count-min sketch (default: %(default)s). More memory gives more exact counts.')
+    parser.add_argument('--compare', type=int, default=0, metavar='ITERATIONS',
+                    help='Report training time and model size for ITERATIONS iterations of crf_train.py with and without the whitelist (requires NumPy).')
+    parser.add_argument('--nthread', type=int, default=1, metavar='N',
+                    help='Worker processes for --compare (default: %(default)s).')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = parse_command_line()
+    patterns = read_patterns(args.pattern)
+    plan = crf.TemplatePlan(patterns)
+
+    depth = 4
+    sketch = CountMinSketch(args.memory*1048576//(4*depth), depth)
+    start = time.time()
+    total = count(args.features, plan, sketch)
+    with io.open(args.whitelist, 'w', encoding='UTF-8') as whitelist:
+        stats = select(args.features, plan, sketch, args.min_count, whitelist)
+
+    sys.stdout.write('{0} observations counted in {1:.1f} s\n'.format(total, time.time() - start))
+    sys.stdout.write('template\toccurrences\tdistinct (est.)\tkept\tkept occurrences\n')
+    totals = [0, 0.0, 0, 0]
+    for template in plan.templates:
+        if template.pattern in stats:
+            entry = stats[template.pattern]
+            totals = [a + b for a, b in zip(totals, entry)]
+            sys.stdout.write('{0}\t{1}\t{2:.0f}\t{3}\t{4}\n'.format(template.pattern, *entry))
+    sys.stdout.write('total\t{0}\t{1:.0f}\t{2}\t{3}\n'.format(*totals))
+    if totals[1]:
+        sys.stdout.write('kept {0:.1%} of the observations (min. count {1})\n'.format(totals[2]/totals[1], args.min_count))
+
+    if args.compare:
+        results = compare_training(args.features, patterns, args.whitelist, args.compare, args.nthread)
+        sys.stdout.write('training\tseconds\tmodel bytes\tweights\n')
+        for name, seconds, size, n_weights in results:
+            sys.stdout.write('{0}\t{1:.2f}\t{2}\t{3}\n'.format(name, seconds, size, n_weights))
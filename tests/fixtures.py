@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic test data shared by several test modules.
+
+from __future__ import unicode_literals
+
+
+def feature_file(rng, word, labels, n_sentences, max_length):
+    """feature file in training format (word, case column, gold tag; empty line after each sentence),
+    with n_sentences sentences of 1 to max_length tokens; word(rng) draws a word, and the tag is drawn from labels"""
+    lines = []
+    for i in range(n_sentences):
+        for j in range(rng.randint(1, max_length)):
+            token = word(rng)
+            lines.append('{0}\t{1}\t{2}'.format(token, 'uc' if token[0].isupper() else 'lc', rng.choice(labels)))
+        lines.append('')
+    return '\n'.join(lines) + '\n'
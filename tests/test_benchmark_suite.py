@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the regression check of benchmarks/suite.py (comparison with a baseline), and for the stand-in SMOR daemon.
+
+from __future__ import unicode_literals, division
+import os
+import sys
+import copy
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import suite
+import fake_smor
+
+
+def results(tokens_per_second, p50, p99, rss):
+    entry = {'unit': 'tokens', 'items': 1000, 'calls': 10, 'seconds': 1000/tokens_per_second, 'tokens_per_second': tokens_per_second,
+             'latency_ms': {'p50': p50, 'p99': p99, 'max': p99}, 'peak_rss_kb': rss}
+    return {'version': {'git': 'abc', 'root': '.', 'python': '3', 'platform': 'test'}, 'date': '2026-01-01 00:00:00',
+            'parameters': {'tokens': 1000, 'seed': 1, 'repeat': 3, 'processes': 3}, 'stages': {'create_features': entry}}
+
+
+class CompareTest(unittest.TestCase):
+
+    def test_tolerances(self):
+        tolerances = suite.parse_tolerances(['5', 'p99_ms=40'])
+        self.assertEqual(tolerances['tokens_per_second'], 5)
+        self.assertEqual(tolerances['p99_ms'], 40)
+        self.assertEqual(suite.parse_tolerances(None), suite.TOLERANCES)
+        self.assertRaises(ValueError, suite.parse_tolerances, ['speed=5'])
+
+    def test_regressions(self):
+        baseline = results(1000.0, 1.0, 2.0, 30000)
+        tolerances = suite.parse_tolerances(['10'])
+
+        # within tolerance, or better
+        rows = suite.compare(baseline, results(950.0, 1.05, 1.0, 20000), tolerances)
+        self.assertEqual(len(rows), 4)
+        self.assertFalse(any(row[-1] for row in rows))
+        self.assertIn('OK', suite.format_comparison(baseline, results(950.0, 1.05, 1.0, 20000), rows, tolerances))
+
+        # throughput 20% lower and p99 latency 50% higher
+        current = results(800.0, 1.0, 3.0, 30000)
+        rows = suite.compare(baseline, current, tolerances)
+        self.assertEqual([row[1] for row in rows if row[-1]], ['tokens_per_second', 'p99_ms'])
+        report = suite.format_comparison(baseline, current, rows, tolerances)
+        self.assertIn('! create_features\ttokens_per_second\t1000.000\t800.000\t-20.0%\t10%', report)
+        self.assertIn('FAILED: 2 metric(s)', report)
+
+    def test_failed_stage(self):
+        baseline = results(1000.0, 1.0, 2.0, 30000)
+        current = copy.deepcopy(baseline)
+        current['stages']['create_features'] = {'error': 'ImportError: no module'}
+        rows = suite.compare(baseline, current, suite.TOLERANCES)
+        self.assertEqual(rows, [('create_features', 'error: ImportError: no module', None, None, None, True)])
+        del current['stages']['create_features']
+        self.assertTrue(suite.compare(baseline, current, suite.TOLERANCES)[0][-1])
+
+    def test_best_of(self):
+        entry = suite.best_of(results(1000.0, 1.0, 2.0, 30000)['stages']['create_features'], results(1200.0, 1.5, 1.5, 31000)['stages']['create_features'])
+        self.assertEqual((entry['tokens_per_second'], entry['latency_ms']['p50'], entry['latency_ms']['p99'], entry['peak_rss_kb']), (1200.0, 1.0, 1.5, 30000))
+
+
+class FakeSMORTest(unittest.TestCase):
+
+    def test_respond(self):
+        analyses = {'Haus': ['Haus<+NN><Neut><Nom><Sg>'], 'kommen': ['kommen<+V><Inf>', 'kommen<+V><1><Pl><Pres><Ind>']}
+        response = fake_smor.respond(analyses, 'kommen\nHäuser\nHaus'.encode('UTF-8'))
+        self.assertEqual(response.decode('UTF-8'), '> kommen\nkommen<+V><Inf>\nkommen<+V><1><Pl><Pres><Ind>\n'
+                                                   '> Häuser\nno result for Häuser\n> Haus\nHaus<+NN><Neut><Nom><Sg>\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
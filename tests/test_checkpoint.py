@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for checkpoints (checkpoint.py): offsets of input, output and lexicon on resume, and skipping of processed input.
+
+from __future__ import unicode_literals
+import os
+import io
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import checkpoint
+
+
+LINES = ['Wort{0}\n'.format(i).encode('UTF-8') if i % 7 else b'\n' for i in range(100)]
+
+
+def process(path, output, resume=False, crash_after=None):
+    """process LINES in batches of 10 lines (output: upper-cased lines), with a checkpoint after each batch, like extract_features.py.
+    With crash_after=N, stop after N batches, with some more output written after the last checkpoint."""
+
+    state = checkpoint.Checkpoint(path, resume, interval=0)
+    fobj_in = io.BytesIO(b''.join(LINES))
+    checkpoint.skip_input(fobj_in, state.input_offset)
+    fobj_out = state.open_output(output)
+    try:
+        offset = state.input_offset
+        batch = []
+        for i, line in enumerate(fobj_in):
+            offset += len(line)
+            batch.append(line)
+            if len(batch) == 10:
+                fobj_out.write(b''.join(batch).upper())
+                state.add_lexicon([(line.strip().decode('UTF-8'), ['NN']) for line in batch if line.strip()])
+                if crash_after is not None and i // 10 + 1 >= crash_after:
+                    fobj_out.write(b'PARTIAL OUTPUT\n')
+                    state.add_lexicon([('unsaved', ['NN'])])
+                    state.lexicon.flush()
+                    return
+                state.save(offset, fobj_out)
+                batch = []
+        fobj_out.write(b''.join(batch).upper())
+        state.add_lexicon([(line.strip().decode('UTF-8'), ['NN']) for line in batch if line.strip()])
+        state.save(offset, fobj_out, force=True)
+    finally:
+        fobj_out.close()
+        state.close()
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint')
+        self.output = os.path.join(self.directory, 'output')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with io.open(path, 'rb') as fobj:
+            return fobj.read()
+
+    def test_resume(self):
+        """an interrupted run continued with resume gives the same output and lexicon as an uninterrupted run"""
+        process(self.path, self.output)
+        expected = self.read(self.output)
+        expected_lexicon = self.read(self.path + '.lexicon')
+        self.assertEqual(expected, b''.join(LINES).upper())
+        os.remove(self.path)
+        os.remove(self.path + '.lexicon')
+
+        process(self.path, self.output, crash_after=3)
+        state = checkpoint.Checkpoint(self.path, resume=True)
+        state.close()
+        self.assertEqual(state.input_offset, len(b''.join(LINES[:20])))
+        self.assertEqual(state.output_offset, len(b''.join(LINES[:20])))
+        self.assertTrue(self.read(self.output).endswith(b'PARTIAL OUTPUT\n'))
+
+        process(self.path, self.output, resume=True)
+        self.assertEqual(self.read(self.output), expected)
+        # (without the words added after the last checkpoint)
+        self.assertEqual(self.read(self.path + '.lexicon'), expected_lexicon)
+
+    def test_without_resume(self):
+        """without resume, an existing checkpoint is ignored, and the output is overwritten"""
+        process(self.path, self.output, crash_after=3)
+        process(self.path, self.output)
+        self.assertEqual(self.read(self.output), b''.join(LINES).upper())
+
+    def test_interval(self):
+        state = checkpoint.Checkpoint(self.path, interval=3600)
+        with io.open(self.output, 'wb') as fobj_out:
+            fobj_out.write(b'abc')
+            self.assertFalse(state.save(10, fobj_out))
+            self.assertFalse(os.path.exists(self.path))
+            self.assertTrue(state.save(10, fobj_out, force=True))
+        state.close()
+        state = checkpoint.Checkpoint(self.path, resume=True)
+        state.close()
+        self.assertEqual((state.input_offset, state.output_offset, state.lexicon_offset), (10, 3, 0))
+
+
+class SkipInputTest(unittest.TestCase):
+
+    def test_seekable(self):
+        fobj = io.BytesIO(b'0123456789')
+        checkpoint.skip_input(fobj, 4)
+        self.assertEqual(fobj.read(), b'456789')
+
+    def test_pipe(self):
+        read_end, write_end = os.pipe()
+        data = b'x'*3000000 + b'rest'
+
+        def write():
+            with io.open(write_end, 'wb') as fobj:
+                fobj.write(data)
+
+        writer = threading.Thread(target=write)
+        with io.open(read_end, 'rb', buffering=0) as fobj:
+            writer.start()
+            checkpoint.skip_input(fobj, 3000000)
+            self.assertEqual(fobj.read(), b'rest')
+        writer.join()
+
+    def test_short_input(self):
+        read_end, write_end = os.pipe()
+        os.write(write_end, b'0123')
+        os.close(write_end)
+        with io.open(read_end, 'rb', buffering=0) as fobj:
+            self.assertRaises(IOError, checkpoint.skip_input, fobj, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,345 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the Clevertagger class with the in-process decoder (on the synthetic model of test_crf.py, without SMOR):
+# output modes and the cache of tagged sentences (TaggingCache), the tagging server (--serve),
+# startup and shutdown of AsyncClevertagger; splitting of the input into chunks, and Pipeline (--jobs).
+
+from __future__ import unicode_literals
+import os
+import io
+import sys
+import copy
+import shutil
+import socket
+import threading
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crf
+import clevertagger
+from test_crf import columns, write_model
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    import async_clevertagger
+
+
+class CannedAnalyzer(object):
+    """stands in for extract_features.SMORAnalyzer; columns are those of the synthetic model"""
+
+    def analyze(self, words):
+        pass
+
+    def feature_columns(self, word):
+        return columns(word)
+
+    def candidates(self, word):
+        return ['NN']
+
+    def new_words(self, words):
+        return []
+
+    def terminate(self):
+        pass
+
+
+def make_tagger(model, cache=None):
+    """Clevertagger with the in-process decoder, which does not start SMOR"""
+    tagger = object.__new__(clevertagger.Clevertagger)
+    tagger.smor = CannedAnalyzer()
+    tagger.backend = 'python'
+    tagger.model = model
+    tagger._decoder = None
+    tagger.tagger = crf.CRFModel(model)
+    tagger.cache = clevertagger.TaggingCache(cache) if cache else None
+    tagger.signature = repr(('python', clevertagger.file_signature(model), None))
+    tagger.timings = None
+    return tagger
+
+
+class TaggingCacheTest(unittest.TestCase):
+
+    def entry_size(self, key, result):
+        return clevertagger.estimate_size(key) + clevertagger.estimate_size(clevertagger.frozen(result))
+
+    def test_lru(self):
+        keys = [clevertagger.TaggingCache(0).key([word]) for word in ['a', 'b', 'c']]
+        result = ['NN', 'VVFIN']
+        cache = clevertagger.TaggingCache(2*self.entry_size(keys[0], result))
+        cache.put(keys[0], result)
+        cache.put(keys[1], result)
+        # a lookup makes 'a' the most recently used entry, so 'b' is evicted
+        self.assertEqual(cache.get(keys[0]), ('NN', 'VVFIN'))
+        cache.put(keys[2], result)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), ('NN', 'VVFIN'))
+        self.assertEqual(cache.get(keys[2]), ('NN', 'VVFIN'))
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['evictions']), (2, 3, 1, 1))
+        self.assertLessEqual(stats['bytes'], cache.max_bytes)
+
+    def test_byte_budget(self):
+        cache = clevertagger.TaggingCache(5000)
+        for i in range(200):
+            cache.put(cache.key(['Wort{0}'.format(i)]), ['NN'])
+            self.assertLessEqual(cache.bytes, 5000)
+        self.assertTrue(0 < len(cache.entries) < 200)
+        self.assertEqual(cache.bytes, sum(size for result, size in cache.entries.values()))
+
+        # entries larger than the whole cache are not stored
+        key = cache.key(['lang'])
+        cache.put(key, ['NN']*1000)
+        self.assertIsNone(cache.get(key))
+        self.assertLessEqual(cache.bytes, 5000)
+
+    def test_key(self):
+        cache = clevertagger.TaggingCache(100000)
+        key = cache.key(['Das', 'Haus'], signature='model1')
+        self.assertEqual(key, cache.key(['Das', 'Haus'], signature='model1'))
+        self.assertNotEqual(key, cache.key(['Das', 'Haus'], signature='model2'))
+        self.assertNotEqual(key, cache.key(['Das', 'Haus'], nbestsents=2, signature='model1'))
+        self.assertNotEqual(key, cache.key(['Das', 'Haus'], nbesttags=2, signature='model1'))
+        self.assertNotEqual(key, cache.key(['Das Haus'], signature='model1'))
+
+        cache.put(key, ['ART', 'NN'])
+        self.assertIsNone(cache.get(cache.key(['Das', 'Haus'], signature='model2')))
+        self.assertEqual(cache.get(key), ('ART', 'NN'))
+
+    def test_immutable(self):
+        cache = clevertagger.TaggingCache(100000)
+        key = cache.key(['Das', 'Haus'], nbesttags=2)
+        result = [[('ART', 0.9), ('PDS', 0.1)], [('NN', 1.0)]]
+        cache.put(key, result)
+        result[0].append(('XY', 0.0))
+        entry = cache.get(key)
+        self.assertEqual(entry, ((('ART', 0.9), ('PDS', 0.1)), (('NN', 1.0),)))
+        with self.assertRaises(TypeError):
+            entry[0][0] = 'XY'
+
+
+class OutputTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, 'model')
+        write_model(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_modify_output(self):
+        """changing structured output must not change the result of the next call (which comes from the cache)"""
+        tagger = make_tagger(self.path, cache=100000)
+        sentences = ['Das Haus ist', 'ein Haus']
+
+        for output, nbestsents, nbesttags in [('arrays', 1, 1), ('tuples', 1, 1), ('arrays', 1, 2), ('arrays', 2, 1), ('tuples', 2, 1)]:
+            tagger.cache.clear()
+            hits = tagger.cache.hits
+            kwargs = dict(nbestsents=nbestsents, nbesttags=nbesttags, output=output, posset=True)
+            expected = copy.deepcopy(tagger.tag(sentences, **kwargs))
+            for i in range(2):
+                result = tagger.tag(sentences, **kwargs)
+                self.assertEqual(result, expected)
+                for sentence in result:
+                    analyses = [analysis for prob, analysis in sentence] if nbestsents > 1 else [sentence]
+                    for analysis in analyses:
+                        if output == 'arrays':
+                            words, tags, possets = analysis
+                            tags[0] = 'XY'
+                            words.append('XY')
+                            possets.append('XY')
+                            if nbesttags > 1:
+                                tags[1].append(('XY', 1.0))
+                        else:
+                            analysis.append(('XY', 'XY', []))
+                            analysis[0][2].append('XY')
+            self.assertEqual(tagger.tag(sentences, **kwargs), expected)
+            self.assertEqual(tagger.cache.hits - hits, 6)
+
+
+
+class ServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, 'model')
+        write_model(cls.path)
+        cls.server = clevertagger.UnixTaggingServer(os.path.join(cls.tmpdir, 'socket'), clevertagger.TaggingHandler)
+        cls.server.tagger = make_tagger(cls.path)
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmpdir)
+
+    def request(self, data):
+        """send data to the server and return its response"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.server.server_address)
+        sock.sendall(data.encode('UTF-8'))
+        sock.shutdown(socket.SHUT_WR)
+        response = sock.makefile('rb').read().decode('UTF-8')
+        sock.close()
+        return response
+
+    def test_tag(self):
+        response = self.request('{"nbestsents": 1}\nDas\nHaus\n\nein\nHaus\n\n')
+        status, output = response.split('\n', 1)
+        self.assertEqual(status, 'OK')
+        self.assertEqual(output.strip().split('\n\n'), self.server.tagger.tag(['Das Haus', 'ein Haus']))
+
+    def test_invalid_options(self):
+        for options in ['{"nbesttags": 2, "nbestsents": 2}', 'nbest', '', '[2]', '{"nbesttags": "2"}', '{"nbestsents": 0}', '{"nbesttags": 1.5}']:
+            response = self.request(options + '\nDas\nHaus\n\n')
+            self.assertTrue(response.startswith('ERROR '), (options, response))
+            self.assertEqual(response.count('\n'), 1)
+        # the server keeps working
+        self.assertTrue(self.request('{}\nDas\n\n').startswith('OK\n'))
+
+
+# stand-ins for the processes of a pipeline: copy input to output (after a delay), or turn each sentence into two n-best analyses
+# (in the output format of postprocess.py)
+COPY = """
+import sys, time
+time.sleep(float(sys.argv[1]))
+for line in iter(sys.stdin.buffer.readline, b''):
+    sys.stdout.buffer.write(line)
+"""
+NBEST = """
+import sys
+for block in sys.stdin.buffer.read().split(b'\\n\\n')[:-1]:
+    sys.stdout.buffer.write(b'#0 0.6\\n' + block + b'\\n\\n#1 0.4\\n' + block + b'\\n\\n')
+"""
+
+
+def python(script, *args):
+    return [sys.executable, '-c', script] + list(args)
+
+
+class ParallelTest(unittest.TestCase):
+
+    def test_split_sentences(self):
+        data = b'\n\nDas\nHaus\n\n\nist\n\nein\nTest'
+        chunks = list(clevertagger.split_sentences(io.BytesIO(data), 2))
+        self.assertEqual(chunks, [(b'Das\nHaus\n\nist\n\n', 2, data.index(b'ein')), (b'ein\nTest\n\n', 1, len(data))])
+
+        # the offset of each chunk is where the input after it starts (for checkpoints)
+        for chunk_size in (1, 2, 5):
+            previous = 0
+            for chunk, n_sentences, offset in clevertagger.split_sentences(io.BytesIO(data), chunk_size):
+                self.assertEqual(n_sentences, chunk.count(b'\n\n'))
+                self.assertEqual([line for line in chunk.split(b'\n') if line], [line for line in data[previous:offset].split(b'\n') if line])
+                previous = offset
+            self.assertEqual(previous, len(data))
+
+        self.assertEqual(list(clevertagger.split_sentences(io.BytesIO(b'\n\n'), 2)), [])
+
+    def test_order(self):
+        """sentences come back in input order, although the first pipeline is slower than the others"""
+        data = b''.join('Wort{0}\nund\nWort{1}\n\n'.format(i, i+1).encode('UTF-8') for i in range(40))
+        pipelines = [clevertagger.Pipeline([python(COPY, delay), python(COPY, '0')]) for delay in ('0.3', '0', '0')]
+        try:
+            order = []
+            for i, (chunk, n_sentences, offset) in enumerate(clevertagger.split_sentences(io.BytesIO(data), 3)):
+                pipeline = pipelines[i % len(pipelines)]
+                pipeline.send(chunk)
+                order.append((pipeline, n_sentences))
+            for pipeline in pipelines:
+                pipeline.close()
+            output = b''.join(pipeline.receive(n_sentences) for pipeline, n_sentences in order)
+            for pipeline in pipelines:
+                pipeline.wait()
+        finally:
+            for pipeline in pipelines:
+                pipeline.kill()
+        self.assertEqual(output, data)
+
+    def test_nbest_sentences(self):
+        """with nbestsents, all analyses of a sentence are received together"""
+        pipeline = clevertagger.Pipeline([python(NBEST)], nbestsents=True)
+        try:
+            pipeline.send(b'Das\nHaus\n\nist\n\n')
+            pipeline.close()
+            self.assertEqual(pipeline.receive(1), b'#0 0.6\nDas\nHaus\n\n#1 0.4\nDas\nHaus\n\n')
+            self.assertEqual(pipeline.receive(1), b'#0 0.6\nist\n\n#1 0.4\nist\n\n')
+            pipeline.wait()
+        finally:
+            pipeline.kill()
+
+    def test_failure(self):
+        pipeline = clevertagger.Pipeline([python(COPY, '0'), python('import sys; sys.exit(3)')])
+        try:
+            pipeline.send(b'Das\nHaus\n\n')
+            pipeline.close()
+            with self.assertRaises(clevertagger.PipelineError) as context:
+                pipeline.receive(1)
+            self.assertIn('exited with return code 3', str(context.exception))
+        finally:
+            pipeline.kill()
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'AsyncClevertagger requires Python >= 3.7')
+class AsyncTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, 'model')
+        write_model(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def start(self, tagger):
+        """start worker of tagger like AsyncClevertagger.start(), with the in-process decoder and without SMOR"""
+        tagger.smor = CannedAnalyzer()
+        tagger.tagger = crf.CRFModel(self.path)
+        tagger._queue = asyncio.Queue()
+        tagger._worker = asyncio.ensure_future(tagger._work())
+
+    def test_not_started(self):
+        async def run():
+            tagger = async_clevertagger.AsyncClevertagger(backend='python', model=self.path)
+            with self.assertRaises(RuntimeError):
+                await tagger.tag(['Das Haus'])
+            self.start(tagger)
+            result = await tagger.tag(['Das Haus', 'ein Haus ist'])
+            await tagger.close()
+            with self.assertRaises(RuntimeError):
+                await tagger.tag(['Das Haus'])
+            return result
+
+        result = asyncio.run(run())
+        self.assertEqual([len(sentence.split('\n')) for sentence in result], [2, 3])
+
+    def test_close_pending(self):
+        """close() fails calls of tag() that are being tagged or still queued, instead of leaving them waiting"""
+        async def run():
+            tagger = async_clevertagger.AsyncClevertagger(backend='python', model=self.path, max_batch=1)
+            self.start(tagger)
+            calls = [asyncio.ensure_future(tagger.tag([sentence])) for sentence in ['Das Haus', 'ein Haus', 'der Haus ist']]
+            # let the worker take the first sentence
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            await tagger.close()
+            return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 5)
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIsInstance(result, RuntimeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
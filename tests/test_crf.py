@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Regression tests for the in-process CRF decoder (crf.py): decoding results are compared
+# to brute-force enumeration of all label sequences on a tiny synthetic Wapiti model.
+
+from __future__ import unicode_literals, division
+import os
+import sys
+import io
+import shutil
+import random
+import tempfile
+import contextlib
+import itertools
+import unittest
+from math import exp, log
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crf
+
+LABELS = ['NN', 'ART', 'VVFIN']
+PATTERNS = ['u:w=%x[0,0]', 'u:p=%x[-1,0]', 'u:c=%x[0,1]/%x[1,1]', 'b', 'b:%x[0,1]']
+WORDS = ['Das', 'ist', 'ein', 'Haus', 'der']
+SENTENCES = [['Das'], ['Das', 'Haus'], ['ein', 'Haus', 'ist'], ['der', 'Haus', 'ist', 'Das'], ['ist', 'ist', 'ein', 'der', 'Haus']]
+
+
+def columns(word):
+    return [word, 'uc' if word[0].isupper() else 'lc']
+
+
+def write_model(path, seed=1):
+    """write Wapiti text model with random weights for all observations of SENTENCES"""
+
+    rng = random.Random(seed)
+    templates = [crf.Template(pattern, '_x') for pattern in PATTERNS]
+    observations = []
+    for words in SENTENCES + [WORDS]:
+        sequence = [columns(word) for word in words]
+        for t in range(len(sequence)):
+            for template in templates:
+                obs = template.expand(sequence, t)
+                if obs not in observations:
+                    observations.append(obs)
+
+    def string(s):
+        return '{0}:{1}'.format(len(s.encode('UTF-8')), s)
+
+    Y = len(LABELS)
+    lines = ['#mdl#2#0', '#rdr#{0}/2/0'.format(len(PATTERNS))]
+    lines += [string(pattern) + ',' for pattern in PATTERNS]
+    lines += ['#qrk#{0}'.format(Y)] + [string(label) for label in LABELS]
+    lines += ['#qrk#{0}'.format(len(observations))] + [string(obs) for obs in observations]
+    feature = 0
+    for obs in observations:
+        size = Y if obs[0] == 'u' else Y*Y
+        for i in range(size):
+            if rng.random() < 0.7:
+                lines.append('{0}={1}'.format(feature + i, rng.gauss(0, 1).hex()))
+        feature += size
+
+    with open(path, 'w') as model_file:
+        model_file.write('\n'.join(lines) + '\n')
+
+
+def enumerate_paths(lattice):
+    """all (score, path) pairs of lattice, best first"""
+    Y = len(lattice.unary[0])
+    T = len(lattice)
+    results = []
+    for path in itertools.product(range(Y), repeat=T):
+        score = sum(lattice.unary[t][path[t]] for t in range(T))
+        score += sum(lattice.transitions[t-1].rows[path[t-1]][path[t]] for t in range(1, T))
+        results.append((score, list(path)))
+    results.sort(key=lambda result: -result[0])
+    return results
+
+
+class DecoderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'model')
+        write_model(cls.path)
+        cls.model = crf.CRFModel(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def lattices(self, model=None):
+        model = model or self.model
+        return [model.lattice([columns(word) for word in words]) for words in SENTENCES]
+
+    def test_viterbi(self):
+        for lattice in self.lattices():
+            best = enumerate_paths(lattice)[0]
+            score, path = lattice.viterbi()
+            self.assertAlmostEqual(score, best[0], places=9)
+            self.assertEqual(path, best[1])
+
+    def test_nbest(self):
+        for lattice in self.lattices():
+            paths = enumerate_paths(lattice)
+            nbest = lattice.nbest(5)
+            self.assertEqual(len(nbest), min(5, len(paths)))
+            for (score, path), (expected_score, expected_path) in zip(nbest, paths):
+                self.assertAlmostEqual(score, expected_score, places=9)
+                self.assertEqual(path, expected_path)
+
+    def test_partition_and_marginals(self):
+        for lattice in self.lattices():
+            paths = enumerate_paths(lattice)
+            log_z = log(sum(exp(score) for score, path in paths))
+            self.assertAlmostEqual(lattice.log_partition(), log_z, places=9)
+
+            marginals, log_z_fb = lattice.forward_backward()
+            self.assertAlmostEqual(log_z_fb, log_z, places=9)
+            for t, probs in enumerate(marginals):
+                for y, prob in enumerate(probs):
+                    expected = sum(exp(score - log_z) for score, path in paths if path[t] == y)
+                    self.assertAlmostEqual(prob, expected, places=9)
+
+    @unittest.skipIf(sys.version_info < (3, 3), 'binary models require Python >= 3.3')
+    def test_binary_model(self):
+        path = os.path.join(self.directory, 'model.bin')
+        crf.write_binary(self.model, path)
+        binary = crf.CRFModel(path)
+        self.assertEqual(binary.labels, self.model.labels)
+        for lattice, binary_lattice in zip(self.lattices(), self.lattices(binary)):
+            self.assertEqual(lattice.viterbi()[1], binary_lattice.viterbi()[1])
+            self.assertAlmostEqual(lattice.log_partition(), binary_lattice.log_partition(), places=9)
+
+        # lookups give the same feature IDs with and without the memo, and after it has been cleared
+        binary.unigrams.cache_size = 5
+        for table, text_table in [(binary.unigrams, self.model.unigrams), (binary.bigrams, self.model.bigrams)]:
+            for i in range(2):
+                for obs in sorted(text_table) + ['u:w=Baum', 'b:zz']:
+                    self.assertEqual(table.get(obs), table.search(obs))
+                    self.assertEqual(obs in table, obs in text_table)
+            self.assertLessEqual(len(table.cache), table.cache_size)
+        self.assertEqual(sorted(binary.unigrams.keys()), sorted(self.model.unigrams))
+
+    @unittest.skipIf(sys.version_info < (3, 4), 'contextlib.redirect_stdout requires Python >= 3.4')
+    def test_compress_report(self):
+        """a text model is compared with the compressed model in (uncompressed) binary format"""
+        directory = tempfile.mkdtemp(dir=self.directory)
+        path = os.path.join(directory, 'model.bin')
+        crf.write_binary(self.model, path)
+        output = os.path.join(directory, 'model.small.bin')
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            crf.compress(self.path, output, threshold=0.5, bits=8)
+
+        rows = [line.split('\t') for line in report.getvalue().splitlines()[1:]]
+        self.assertEqual([row[0] for row in rows], [self.path + ' (binary)', output])
+        self.assertEqual(int(rows[0][1]), os.path.getsize(path))
+        self.assertLess(int(rows[1][1]), int(rows[0][1]))
+        # the temporary binary model is removed
+        self.assertEqual(sorted(os.listdir(directory)), ['model.bin', 'model.small.bin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
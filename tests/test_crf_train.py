@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the CRF trainer (crf_train.py): the gradient is compared to finite differences, the objective to the
+# log-likelihood computed by the decoder (crf.py) from the written model, and checkpointed training to uninterrupted training.
+
+from __future__ import unicode_literals, division
+import os
+import io
+import sys
+import shutil
+import random
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crf
+import crf_train
+import fixtures
+np = crf_train.np
+
+LABELS = ['NN', 'ART', 'VVFIN']
+WORDS = ['Das', 'ist', 'ein', 'Haus', 'der', 'schön']
+PATTERNS = ['u:w=%x[0,0]', 'u:p=%x[-1,0]', 'u:c=%x[0,1]/%x[1,1]', 'b', 'b:%x[0,1]', '*:s=%x[0,1]']
+
+
+@unittest.skipIf(np is None, 'crf_train.py requires NumPy')
+class TrainerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.text = fixtures.feature_file(random.Random(1), lambda rng: rng.choice(WORDS), LABELS, 12, 6)
+        cls.path = os.path.join(cls.directory, 'features')
+        with io.open(cls.path, 'w', encoding='UTF-8') as fobj:
+            fobj.write(cls.text)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def data(self):
+        data = crf_train.TrainingData(PATTERNS)
+        data.read(io.StringIO(self.text))
+        return data, data.layout()
+
+    def test_gradient(self):
+        data, layout = self.data()
+        x = np.random.RandomState(0).randn(layout.size)
+        for n in [1, 3]:
+            objective = crf_train.Objective(data.shards(n, batch_tokens=8), layout, rho2=0.1)
+            try:
+                value, gradient = objective(x)
+                numeric = np.zeros(layout.size)
+                for i in range(layout.size):
+                    e = np.zeros(layout.size)
+                    e[i] = 1e-6
+                    numeric[i] = (objective(x + e)[0] - objective(x - e)[0])/2e-6
+            finally:
+                objective.close()
+            self.assertLess(abs(numeric - gradient).max(), 1e-5)
+
+    def test_objective_matches_decoder(self):
+        data, layout = self.data()
+        x = np.random.RandomState(1).randn(layout.size)
+        objective = crf_train.Objective(data.shards(1), layout)
+        value, gradient = objective(x)
+
+        model_path = os.path.join(self.directory, 'random_model')
+        crf_train.write_model(model_path, data, layout, x)
+        model = crf.CRFModel(model_path)
+        expected = 0.0
+        for lines in crf.read_sequences(io.StringIO(self.text)):
+            sequence = [line.split() for line in lines]
+            lattice = model.lattice(sequence)
+            gold = [model.label_ids[token[-1]] for token in sequence]
+            score = sum(lattice.unary[t][y] for t, y in enumerate(gold))
+            score += sum(lattice.transitions[t-1].rows[gold[t-1]][gold[t]] for t in range(1, len(gold)))
+            expected += lattice.log_partition() - score
+        self.assertAlmostEqual(value, expected, places=6)
+
+    def test_checkpoint(self):
+        model_path = os.path.join(self.directory, 'model')
+        checkpoint = os.path.join(self.directory, 'checkpoint')
+        full = crf_train.train([self.path], PATTERNS, model_path, rho1=0.1, maxiter=8, stopeps=0)
+        crf_train.train([self.path], PATTERNS, model_path, rho1=0.1, maxiter=4, stopeps=0, checkpoint=checkpoint)
+        resumed = crf_train.train([self.path], PATTERNS, model_path, nthread=2, rho1=0.1, maxiter=8, stopeps=0, checkpoint=checkpoint, resume=True)
+        self.assertEqual(resumed.iteration, 8)
+        self.assertTrue(np.allclose(full.x, resumed.x))
+        self.assertLess(full.values[-1], full.values[0])
+
+        # the trained model fits the training data better than chance
+        model = crf.CRFModel(model_path)
+        sequences = [[line.split() for line in lines] for lines in crf.read_sequences(io.StringIO(self.text))]
+        correct, total, seconds = crf.evaluate(model, sequences)
+        self.assertGreater(correct/total, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
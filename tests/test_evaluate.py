@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the evaluation report of evaluate.py, with a stand-in for the Clevertagger class.
+
+from __future__ import unicode_literals, division
+import os
+import io
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import evaluate
+
+GOLD = """Das ART
+Haus NN
+ist VAFIN
+schön ADJD
+. $.
+
+Der ART
+Test NN
+läuft VVFIN
+. $.
+"""
+
+# tags of the stand-in tagger; 'ist' and 'läuft' are wrong
+PREDICTED = {'Das': 'ART', 'Haus': 'NN', 'ist': 'VVFIN', 'schön': 'ADJD', '.': '$.', 'Der': 'ART', 'Test': 'NN', 'läuft': 'ADJD'}
+
+
+class Tagger(object):
+
+    def __init__(self):
+        self.timings = None
+        self.calls = 0
+
+    def tag(self, text, output='string'):
+        self.calls += 1
+        self.timings['crf'] = self.timings.get('crf', 0.0) + 0.001
+        return [(sentence.split(), [PREDICTED[word] for word in sentence.split()]) for sentence in text]
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def test_report(self):
+        sentences = list(evaluate.read_gold(io.StringIO(GOLD)))
+        tagger = Tagger()
+        report = evaluate.evaluate(tagger, sentences, vocabulary=set(['Das', 'Haus', 'ist', '.', 'Der']))
+
+        self.assertEqual(tagger.calls, 2)
+        self.assertEqual((report['tokens'], report['sentences'], report['correct']), (9, 2, 7))
+        self.assertEqual((report['oov']['tokens'], report['oov']['correct']), (3, 2))
+        self.assertEqual((report['known']['tokens'], report['known']['correct']), (6, 5))
+        self.assertEqual(report['confusion']['VAFIN'], {'VVFIN': 1})
+        self.assertEqual(report['confusion']['VVFIN'], {'ADJD': 1})
+        self.assertEqual(report['tags']['ADJD']['precision'], 0.5)
+        self.assertEqual(report['tags']['ADJD']['recall'], 1.0)
+        self.assertAlmostEqual(report['performance']['stages']['crf'], 0.002)
+        self.assertIsNone(tagger.timings)
+        self.assertIn('OOV accuracy: 0.6667', evaluate.format_report(report))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(evaluate.percentile(values, 50), 50)
+        self.assertEqual(evaluate.percentile(values, 99), 99)
+        self.assertEqual(evaluate.percentile(values, 100), 100)
+        self.assertEqual(evaluate.percentile([7], 50), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for feature extraction (extract_features.py) with canned analyses instead of SMOR:
+# the bytes-native path must give the same output as the text path.
+
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract_features
+
+
+class CannedAnalyzer(extract_features.MorphAnalyzer):
+
+    def __init__(self, analyses):
+        extract_features.MorphAnalyzer.__init__(self)
+        for word, tags in analyses.items():
+            self.posset[word].update(tags)
+
+
+ANALYSES = {'Haus': ['NN'], 'ist': ['VAFIN'], 'ein': ['ART', 'PTKVZ'], 'Häuser': ['NN']}
+
+
+class BytesTest(unittest.TestCase):
+
+    def test_same_output(self):
+        lines = ['Haus\n', 'Haus\tNN\n', 'Häuser\n', 'ein ART\n', '\n', '  \n', 'unbekannt\n', 'Haus\r\n',
+                 # whitespace that str.split() splits at, but bytes.split() does not
+                 'Haus\u00a0x\n', '\u00a0\n', 'Haus\u2009NN\n', 'ein\tART\u3000X\n', 'a\x1fb\n', 'ist\u00a0\n']
+        analyzer = CannedAnalyzer(ANALYSES)
+        for line in lines:
+            expected = analyzer.create_features(line)
+            # twice: the second time, the features of the word come from the cache
+            for i in range(2):
+                self.assertEqual(analyzer.create_features_bytes(line.encode('UTF-8')).decode('UTF-8'), expected, repr(line))
+
+    def test_cache_size(self):
+        analyzer = CannedAnalyzer(ANALYSES)
+        analyzer.feature_cache_size = 10
+        for i in range(25):
+            word = 'Wort{0}'.format(i % 15)
+            self.assertEqual(analyzer.create_features_bytes(word.encode('UTF-8') + b'\n').decode('UTF-8'),
+                             analyzer.create_features(word + '\n'))
+            self.assertLessEqual(len(analyzer.feature_cache), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
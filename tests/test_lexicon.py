@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the shared memory lexicon (lexicon.py): lookups from a second process, concurrent appends, full lexicon.
+
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lexicon
+
+
+def add_words(name, offset):
+    shared = lexicon.SharedLexicon(name)
+    for i in range(500):
+        shared.add('Wort{0}'.format((i*7 + offset) % 800), ['NN'] if i % 2 else [])
+    shared.close()
+
+
+@unittest.skipIf(lexicon.shared_memory is None, 'shared lexicon requires Python >= 3.8')
+class SharedLexiconTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = lexicon.SharedLexicon(size=256*1024)
+
+    def tearDown(self):
+        self.lexicon.unlink()
+        self.lexicon.close()
+
+    def test_add_and_get(self):
+        self.assertTrue(self.lexicon.add('Größe', ['NN', 'ADJA']))
+        self.assertFalse(self.lexicon.add('Größe', ['NN']))
+        self.assertTrue(self.lexicon.add('und', []))
+        self.assertEqual(self.lexicon.get('Größe'), ['ADJA', 'NN'])
+        self.assertEqual(self.lexicon.get('und'), [])
+        self.assertIsNone(self.lexicon.get('Haus'))
+        self.assertEqual(len(self.lexicon), 2)
+
+    def test_load_and_items(self):
+        self.assertEqual(self.lexicon.load(['Größe\tNN ADJA\n', 'und\t\n', '\n']), 2)
+        items, offset = self.lexicon.items()
+        self.assertEqual(items, [('Größe', ['ADJA', 'NN']), ('und', [])])
+        self.lexicon.add('Haus', ['NN'])
+        self.assertEqual(self.lexicon.items(offset)[0], [('Haus', ['NN'])])
+
+    def test_concurrent_processes(self):
+        processes = [multiprocessing.Process(target=add_words, args=(self.lexicon.name, offset)) for offset in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        words = set('Wort{0}'.format((i*7 + offset) % 800) for offset in range(4) for i in range(500))
+        self.assertEqual(len(self.lexicon), len(words))
+        for word in words:
+            self.assertIsNotNone(self.lexicon.get(word))
+
+    def test_full(self):
+        small = lexicon.SharedLexicon(size=2048)
+        try:
+            added = small.add_many(('Wort{0}'.format(i), ['NN']) for i in range(1000))
+            self.assertLess(added, 1000)
+            self.assertEqual(len(small), added)
+            self.assertFalse(small.add('Haus', ['NN']))
+        finally:
+            small.unlink()
+            small.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
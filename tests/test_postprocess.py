@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for postprocess.py: conversion of CRF output, and the side buffer of tokens for labels-only CRF output
+# (side_buffer(), merge_labels()).
+
+from __future__ import unicode_literals
+import os
+import sys
+import unittest
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import postprocess
+
+
+def buffered(data):
+    """run data (bytes) through side_buffer(); return the lines it yields and the sentences it queued"""
+    sentences = queue.Queue()
+    lines = list(postprocess.side_buffer(data.splitlines(True), sentences))
+    queued = []
+    while True:
+        words = sentences.get_nowait()
+        queued.append(words)
+        if words is None:
+            return lines, queued
+
+
+def merged(labels, sentences, i_nbest=1):
+    return list(postprocess.merge_labels(labels.splitlines(True), iter(sentences), i_nbest))
+
+
+class SideBufferTest(unittest.TestCase):
+
+    def test_sentences(self):
+        data = 'Das\nHaus\n\nHäuser\tNN\n\n\nist\n'.encode('UTF-8')
+        lines, queued = buffered(data)
+        self.assertEqual(b''.join(lines), data)
+        self.assertEqual(queued, [[b'Das', b'Haus'], ['Häuser'.encode('UTF-8')], [b'ist'], None])
+
+    def test_no_final_empty_line(self):
+        for data in [b'Das\nHaus', b'Das\nHaus\n']:
+            lines, queued = buffered(data)
+            self.assertEqual(b''.join(lines), data)
+            self.assertEqual(queued, [[b'Das', b'Haus'], None])
+
+    def test_end_marker_on_error(self):
+        """None is queued even if reading the input fails, so merge_labels() does not wait forever"""
+        def failing():
+            yield b'Das\n'
+            raise IOError('read error')
+        sentences = queue.Queue()
+        self.assertRaises(IOError, list, postprocess.side_buffer(failing(), sentences))
+        self.assertIsNone(sentences.get_nowait())
+
+
+class MergeLabelsTest(unittest.TestCase):
+
+    def test_merge(self):
+        output = merged(b'ART\nNN\n\nVAFIN\n\n', [[b'Das', b'Haus'], [b'ist']])
+        self.assertEqual(output, [b'Das\tART', b'Haus\tNN', b'', b'ist\tVAFIN', b''])
+
+    def test_no_final_empty_line(self):
+        output = merged(b'ART\nNN\n\nVAFIN', [[b'Das', b'Haus'], [b'ist']])
+        self.assertEqual(output, [b'Das\tART', b'Haus\tNN', b'', b'ist\tVAFIN'])
+
+    def test_nbest_sentences(self):
+        """analyses with rank > 0 reuse the words of the previous sentence"""
+        labels = b'# 0 0.700000\nART\nNN\n\n# 1 0.300000\nPDS\nNN\n\n# 0 1.000000\nVAFIN\n\n'
+        output = merged(labels, [[b'Das', b'Haus'], [b'ist']])
+        self.assertEqual(output, [b'#0 0.700000', b'Das\tART', b'Haus\tNN', b'',
+                                  b'#1 0.300000', b'Das\tPDS', b'Haus\tNN', b'',
+                                  b'#0 1.000000', b'ist\tVAFIN', b''])
+
+    def test_nbest_tags(self):
+        labels = b'# 0.800000\nART/0.9\tART/0.9\tPDS/0.1\nNN/1.0\tNN/1.0\tPDS/0.0\n\n'
+        output = merged(labels, [[b'Das', b'Haus']], i_nbest=2)
+        self.assertEqual(output, [b'Das\tART/0.9\tPDS/0.1', b'Haus\tNN/1.0\tPDS/0.0', b''])
+
+    def test_more_labels_than_words(self):
+        with self.assertRaises(ValueError) as context:
+            merged(b'ART\nNN\nVAFIN\n\n', [[b'Das', b'Haus']])
+        self.assertIn('more labels than words in sentence: Das Haus', str(context.exception))
+
+    def test_more_sentences_than_input(self):
+        with self.assertRaises(ValueError) as context:
+            merged(b'ART\nNN\n\nVAFIN\n\n', [[b'Das', b'Haus']])
+        self.assertIn('more sentences than the input', str(context.exception))
+
+    def test_side_buffer(self):
+        """tokens from side_buffer(), labels from a CRF tool that got the same input"""
+        data = 'Das\nHaus\n\nHäuser\n'.encode('UTF-8')
+        lines, queued = buffered(data)
+        output = merged(b'ART\nNN\n\nNN\n\n', iter(queued[:-1]))
+        self.assertEqual(output, [b'Das\tART', b'Haus\tNN', b'', 'Häuser\tNN'.encode('UTF-8'), b''])
+
+
+class PostprocessTest(unittest.TestCase):
+
+    def test_text_and_bytes(self):
+        columns = ['Haus', 'haus', 'uc', 'y', 'NN'] + ['ZZZ']*9
+        lines = ['\t'.join(columns + ['NN']) + '\n', ' '.join(columns + ['NE']) + '\n', '\n', '# 0 0.500000\n']
+        expected = ['Haus\tNN', 'Haus\tNE', '', '#0 0.500000']
+        self.assertEqual(list(postprocess.postprocess(lines, 1)), expected)
+        self.assertEqual(list(postprocess.postprocess_bytes([line.encode('UTF-8') for line in lines], 1)),
+                         [line.encode('UTF-8') for line in expected])
+
+    def test_nbest_tags(self):
+        line = '\t'.join(['Haus', 'haus', 'uc', 'y', 'NN'] + ['ZZZ']*9 + ['NN/0.7', 'NE/0.2', 'NN/0.7', 'ADJA/0.1']) + '\n'
+        self.assertEqual(list(postprocess.postprocess([line], 2)), ['Haus\tNN/0.7\tNE/0.2'])
+        self.assertEqual(list(postprocess.postprocess_bytes([line.encode('UTF-8')], 2)), [b'Haus\tNN/0.7\tNE/0.2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Tests for the observation counts and whitelist of prune_features.py, and their use in crf_train.py.
+
+from __future__ import unicode_literals, division
+import os
+import io
+import sys
+import shutil
+import random
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crf
+import crf_train
+import prune_features
+import fixtures
+
+PATTERNS = ['u:w=%x[0,0]', 'u:p=%x[-1,0]/%x[0,0]', 'u:c=%x[0,1]', 'b']
+
+
+def zipf_word(rng):
+    return 'w{0}'.format(int(rng.paretovariate(1.0)))
+
+
+class PruneTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'features')
+        with io.open(cls.path, 'w', encoding='UTF-8') as fobj:
+            fobj.write(fixtures.feature_file(random.Random(1), zipf_word, ['NN', 'ADJA'], 50, 8))
+        cls.plan = crf.TemplatePlan(PATTERNS)
+        with io.open(cls.path, encoding='UTF-8') as fobj:
+            cls.counts = Counter(obs for template, obs in prune_features.observations(cls.plan, fobj))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_sketch(self):
+        # a small sketch overestimates some counts, but never underestimates them
+        sketch = prune_features.CountMinSketch(64, 3)
+        prune_features.count([self.path], self.plan, sketch)
+        for obs, n in self.counts.items():
+            self.assertGreaterEqual(sketch.count(obs), n)
+
+    def test_whitelist(self):
+        sketch = prune_features.CountMinSketch(100000)
+        prune_features.count([self.path], self.plan, sketch)
+        whitelist_path = os.path.join(self.directory, 'whitelist')
+        with io.open(whitelist_path, 'w', encoding='UTF-8') as whitelist:
+            stats = prune_features.select([self.path], self.plan, sketch, 2, whitelist)
+        with io.open(whitelist_path, encoding='UTF-8') as whitelist:
+            kept = set(line.rstrip('\n') for line in whitelist)
+
+        self.assertEqual(kept, set(obs for obs, n in self.counts.items() if n >= 2) | set(['b']))
+        self.assertEqual(sum(entry[0] for entry in stats.values()), sum(self.counts.values()))
+        self.assertAlmostEqual(sum(entry[1] for entry in stats.values()), len(self.counts))
+
+        if crf_train.np is not None:
+            data = crf_train.TrainingData(PATTERNS, whitelist=kept)
+            with io.open(self.path, encoding='UTF-8') as fobj:
+                data.read(fobj)
+            self.assertEqual(set(data.observations), kept)
+
+
+if __name__ == '__main__':
+    unittest.main()